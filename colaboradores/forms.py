@@ -63,4 +63,17 @@ class ColaboradorForm(forms.ModelForm):
             raise forms.ValidationError("ERRO: Esta matrícula já está cadastrada.")
 
         # Se passou em tudo, retorna o valor limpo (só números)
-        return matricula
\ No newline at end of file
+        return matricula
+
+# Formulário da importação em lote (arquivo CSV ou XLSX)
+class ImportacaoColaboradoresForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo (.csv ou .xlsx)',
+        widget=forms.ClearableFileInput(attrs={'id': 'arquivo', 'accept': '.csv,.xlsx'}),
+    )
+    atualizar = forms.BooleanField(
+        label='Atualizar colaboradores que já existem (mesma matrícula)',
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'id': 'atualizar'}),
+    )
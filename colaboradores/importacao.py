@@ -0,0 +1,285 @@
+import codecs
+import csv
+import io
+import unicodedata
+from itertools import chain
+
+from django.db import IntegrityError, transaction
+
+from core import busca, cache
+from emprestimos.models import Emprestimo
+from .models import Colaborador
+
+# Linhas validadas e gravadas por vez (uma consulta de matrículas por lote)
+TAMANHO_LOTE = 1000
+
+# Quantos erros ficam guardados no resultado (o total é sempre contado)
+LIMITE_ERROS = 500
+
+# Nomes aceitos no cabeçalho para cada campo (sem acento e em minúsculas)
+COLUNAS = {
+    'nome_completo': ('nome_completo', 'nome completo', 'nome'),
+    'matricula': ('matricula',),
+    'funcao': ('funcao', 'cargo'),
+    'status': ('status', 'situacao'),
+}
+OBRIGATORIAS = ('nome_completo', 'matricula', 'funcao')
+
+MAX_NOME = Colaborador._meta.get_field('nome_completo').max_length
+MAX_FUNCAO = Colaborador._meta.get_field('funcao').max_length
+STATUS_VALIDOS = {valor.lower(): valor for valor, _ in Colaborador.STATUS_CHOICES}
+
+
+class ErroImportacao(Exception):
+    ##
+    ## Problema com o arquivo como um todo (formato, cabeçalho, dependência).
+    ## Erros de uma linha só não levantam exceção: vão para o relatório.
+    ##
+    pass
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.linhas = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros = []  # (linha, matrícula, mensagem), até LIMITE_ERROS
+
+    def registrar_erro(self, linha, matricula, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < LIMITE_ERROS:
+            self.erros.append((linha, matricula, mensagem))
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return texto.strip().lower().replace('-', '_')
+
+
+def _texto(valor):
+    # Células do Excel podem vir como número (ex: matrícula 123 -> 123.0)
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _codificacao_csv(arquivo):
+    ##
+    ## Confere o arquivo inteiro (em blocos, sem carregar tudo) antes de
+    ## importar: um erro de decodificação no meio deixaria parte das
+    ## linhas gravadas. Não sendo UTF-8, é o padrão do Excel no Windows.
+    ##
+    decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for bloco in iter(lambda: arquivo.read(64 * 1024), b''):
+            decodificador.decode(bloco)
+        decodificador.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+    finally:
+        arquivo.seek(0)
+
+
+def _ler_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding=_codificacao_csv(arquivo), newline='')
+    try:
+        cabecalho = texto.readline()
+        # Excel em português costuma salvar CSV com ';'
+        separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+        yield from csv.reader(chain([cabecalho], texto), delimiter=separador)
+    except UnicodeDecodeError:
+        raise ErroImportacao("Não foi possível ler o arquivo CSV. Salve-o em UTF-8 e envie de novo.")
+    finally:
+        texto.detach()
+
+
+def _ler_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroImportacao("Para importar arquivos XLSX instale o pacote openpyxl (pip install openpyxl).")
+    # read_only: lê a planilha linha a linha, sem carregar tudo na memória
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for linha in planilha.active.iter_rows(values_only=True):
+            yield [_texto(valor) for valor in linha]
+    finally:
+        planilha.close()
+
+
+def ler_linhas(arquivo, nome_arquivo):
+    ##
+    ## Lê o arquivo (CSV ou XLSX) em streaming e devolve, uma por vez,
+    ## (número da linha, {campo: valor}). Linhas vazias são ignoradas.
+    ##
+    if nome_arquivo.lower().endswith('.xlsx'):
+        linhas = _ler_xlsx(arquivo)
+    elif nome_arquivo.lower().endswith('.csv'):
+        linhas = _ler_csv(arquivo)
+    else:
+        raise ErroImportacao("Formato não suportado. Envie um arquivo .csv ou .xlsx.")
+
+    cabecalho = [_normalizar(coluna) for coluna in next(linhas, [])]
+    posicoes = {}
+    for campo, nomes in COLUNAS.items():
+        for posicao, coluna in enumerate(cabecalho):
+            if coluna in nomes:
+                posicoes[campo] = posicao
+                break
+    faltando = [campo for campo in OBRIGATORIAS if campo not in posicoes]
+    if faltando:
+        raise ErroImportacao(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}.")
+
+    for numero, linha in enumerate(linhas, start=2):
+        if not any(_texto(valor) for valor in linha):
+            continue
+        yield numero, {
+            campo: _texto(linha[posicao]) if posicao < len(linha) else ''
+            for campo, posicao in posicoes.items()
+        }
+
+
+def validar_linha(dados):
+    ##
+    ## Mesmas regras do ColaboradorForm, sem consultar o banco
+    ## (a unicidade da matrícula é verificada por lote).
+    ## Retorna (colaborador, None) ou (None, mensagem de erro).
+    ##
+    nome, matricula, funcao = dados['nome_completo'], dados['matricula'], dados['funcao']
+    status = dados.get('status') or 'Ativo'
+
+    if not nome:
+        return None, "O nome completo é obrigatório."
+    if len(nome) > MAX_NOME:
+        return None, f"O nome completo deve ter no máximo {MAX_NOME} caracteres."
+    if not matricula.isdigit():
+        return None, "A matrícula deve conter apenas números."
+    if not funcao:
+        return None, "A função é obrigatória."
+    if len(funcao) > MAX_FUNCAO:
+        return None, f"A função deve ter no máximo {MAX_FUNCAO} caracteres."
+    if status.lower() not in STATUS_VALIDOS:
+        return None, f"Status inválido: '{status}'. Use Ativo ou Inativo."
+
+    return Colaborador(
+        nome_completo=nome, matricula=matricula, funcao=funcao, status=STATUS_VALIDOS[status.lower()]
+    ), None
+
+
+def importar_colaboradores(arquivo, nome_arquivo, atualizar=True, ao_errar=None, progresso=None):
+    ##
+    ## Importa colaboradores de um CSV/XLSX em lotes de TAMANHO_LOTE linhas.
+    ##   - atualizar=True: matrícula já cadastrada atualiza nome, função e status
+    ##   - atualizar=False: matrícula já cadastrada vira erro no relatório
+    ## 'ao_errar(linha, matricula, mensagem)' recebe cada erro assim que
+    ## ele acontece (o comando grava o relatório completo em arquivo).
+    ## Cada lote é gravado na própria transação: as linhas válidas entram
+    ## mesmo que outras tenham erro.
+    ##
+    resultado = ResultadoImportacao()
+
+    def erro(linha, matricula, mensagem):
+        resultado.registrar_erro(linha, matricula, mensagem)
+        if ao_errar:
+            ao_errar(linha, matricula, mensagem)
+
+    vistas = {}  # matrícula -> linha em que apareceu no arquivo
+    lote = []
+    for numero, dados in ler_linhas(arquivo, nome_arquivo):
+        resultado.linhas += 1
+        colaborador, mensagem = validar_linha(dados)
+        if colaborador and colaborador.matricula in vistas:
+            colaborador, mensagem = None, f"Matrícula repetida no arquivo (já aparece na linha {vistas[dados['matricula']]})."
+        if mensagem:
+            erro(numero, dados['matricula'], mensagem)
+            continue
+
+        vistas[colaborador.matricula] = numero
+        lote.append((numero, colaborador))
+        if len(lote) >= TAMANHO_LOTE:
+            _gravar_lote(lote, atualizar, resultado, erro)
+            lote = []
+            if progresso:
+                progresso(resultado)
+
+    if lote:
+        _gravar_lote(lote, atualizar, resultado, erro)
+    return resultado
+
+
+def _gravar_lote(lote, atualizar, resultado, erro):
+    ##
+    ## Grava o lote na própria transação. Se outro usuário cadastrou uma
+    ## das matrículas entre a consulta e o INSERT, o banco recusa o lote
+    ## inteiro (IntegrityError) e nada dele fica gravado: regrava linha a
+    ## linha e só as linhas em conflito vão para o relatório.
+    ##
+    try:
+        _gravar(lote, atualizar, resultado, erro)
+    except IntegrityError:
+        for numero, colaborador in lote:
+            try:
+                _gravar([(numero, colaborador)], atualizar, resultado, erro)
+            except IntegrityError:
+                erro(numero, colaborador.matricula, "ERRO: Esta matrícula foi cadastrada ao mesmo tempo por outro usuário.")
+
+
+@transaction.atomic
+def _gravar(lote, atualizar, resultado, erro):
+    matriculas = [colaborador.matricula for _, colaborador in lote]
+
+    # Uma consulta por lote para saber quais matrículas já existem
+    existentes = {
+        matricula: (pk, nome, funcao)
+        for matricula, pk, nome, funcao in Colaborador.objects.filter(
+            matricula__in=matriculas
+        ).values_list('matricula', 'id', 'nome_completo', 'funcao')
+    }
+
+    recusadas = []
+    if not atualizar:
+        recusadas = [(numero, c) for numero, c in lote if c.matricula in existentes]
+        lote = [(numero, c) for numero, c in lote if c.matricula not in existentes]
+
+    # INSERT ... ON CONFLICT (matricula) DO UPDATE: um comando para o lote todo
+    if lote:
+        Colaborador.objects.bulk_create(
+            [colaborador for _, colaborador in lote],
+            update_conflicts=atualizar,
+            unique_fields=['matricula'] if atualizar else None,
+            update_fields=['nome_completo', 'funcao', 'status'] if atualizar else None,
+        )
+    # Erros só depois do INSERT: se o lote for refeito linha a linha,
+    # nenhum erro aparece duas vezes no relatório
+    for numero, colaborador in recusadas:
+        erro(numero, colaborador.matricula, "ERRO: Esta matrícula já está cadastrada.")
+    if not lote:
+        return
+    novas = [c.matricula for _, c in lote if c.matricula not in existentes]
+    resultado.criados += len(novas)
+    resultado.atualizados += len(lote) - len(novas)
+
+    # O bulk_create não dispara sinais: invalida o cache e atualiza o índice
+    # de busca aqui. Só reindexa quem é novo ou mudou de nome/função (o status
+    # não é indexado).
+    cache.invalidar_ao_confirmar(cache.COLABORADORES)
+    if novas:
+        ids = Colaborador.objects.filter(matricula__in=novas).values_list('id', flat=True)
+        busca.indexar_ao_confirmar(busca.TIPO_COLABORADOR, list(ids), novos=True)
+    alterados = [
+        existentes[c.matricula][0] for _, c in lote
+        if c.matricula in existentes and existentes[c.matricula][1:] != (c.nome_completo, c.funcao)
+    ]
+    if alterados:
+        busca.indexar_ao_confirmar(busca.TIPO_COLABORADOR, alterados)
+    renomeados = [
+        existentes[c.matricula][0] for _, c in lote
+        if c.matricula in existentes and existentes[c.matricula][1] != c.nome_completo
+    ]
+    if renomeados:
+        emprestimos = Emprestimo.objects.filter(colaborador_id__in=renomeados).values_list('id', flat=True)
+        busca.indexar_ao_confirmar(busca.TIPO_EMPRESTIMO, list(emprestimos))
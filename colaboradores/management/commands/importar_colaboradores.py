@@ -0,0 +1,58 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from colaboradores.importacao import ErroImportacao, importar_colaboradores
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa colaboradores de um arquivo CSV ou XLSX (colunas nome_completo, matricula, "
+        "funcao e status opcional), em lotes e sem carregar o arquivo inteiro na memória."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo .csv ou .xlsx.")
+        parser.add_argument(
+            '--sem-atualizar', action='store_false', dest='atualizar',
+            help="Matrícula já cadastrada vira erro em vez de atualizar o colaborador.",
+        )
+        parser.add_argument('--relatorio', help="Grava todos os erros (linha, matrícula, erro) neste CSV.")
+
+    def handle(self, *args, **options):
+        relatorio = escritor = None
+        if options['relatorio']:
+            relatorio = open(options['relatorio'], 'w', encoding='utf-8', newline='')
+            escritor = csv.writer(relatorio)
+            escritor.writerow(['linha', 'matricula', 'erro'])
+
+        def ao_errar(linha, matricula, mensagem):
+            if escritor:
+                escritor.writerow([linha, matricula, mensagem])
+            else:
+                self.stderr.write(f"Linha {linha}: {mensagem}")
+
+        def progresso(resultado):
+            self.stdout.write(f"{resultado.linhas} linhas lidas...")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = importar_colaboradores(
+                    arquivo, options['arquivo'], atualizar=options['atualizar'],
+                    ao_errar=ao_errar, progresso=progresso,
+                )
+        except (OSError, ErroImportacao) as erro:
+            raise CommandError(str(erro))
+        finally:
+            if relatorio:
+                relatorio.close()
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.linhas} linhas em {duracao:.1f}s: {resultado.criados} cadastrados, "
+            f"{resultado.atualizados} atualizados, {resultado.total_erros} com erro."
+        ))
+        if resultado.total_erros and options['relatorio']:
+            self.stdout.write(f"Erros gravados em {options['relatorio']}.")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("colaboradores", "0002_alter_colaborador_matricula"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="colaborador",
+            index=models.Index(
+                fields=["status", "nome_completo"], name="colaborador_status_nome_idx"
+            ),
+        ),
+    ]
@@ -37,6 +37,13 @@ class Colaborador(models.Model):
     #     é CRIADO pela primeira vez. O campo não será atualizado depois.
     data_cadastro = models.DateTimeField(auto_now_add=True)
 
+    # [DESEMPENHO] Índice composto para o seletor de colaboradores ativos,
+    # que filtra por status e ordena por nome.
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'nome_completo'], name='colaborador_status_nome_idx'),
+        ]
+
     # [BOA PRÁTICA] Define o método especial '__str__'.
     # Este método retorna uma representação em string "legível" do objeto Colaborador.
     # É o que o Django Admin (e outras partes do Django) usa para exibir o objeto.
@@ -1,3 +1,281 @@
-from django.test import TestCase
+import io
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache as cache_django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import cache
+from core.busca import reconstruir_indice
+from core.testes_util import ConsultasFixasMixin, PlanoConsultaMixin
+from emprestimos.models import PosseEquipamento
+from emprestimos.posse import consultar_portaria
+from equipamentos.models import Equipamento
+from .importacao import importar_colaboradores
+from .models import Colaborador
+
+
+class PlanoConsultasColaboradoresTest(PlanoConsultaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for numero in range(20):
+            Colaborador.objects.create(
+                nome_completo=f'Colaborador {numero}',
+                matricula=str(numero),
+                funcao='Operador',
+                status='Ativo' if numero % 4 else 'Inativo',
+            )
+        cls.usuario = User.objects.create_user('estoque', password='senha')
+
+    def test_consulta_portaria(self):
+        # Busca pela matrícula (índice único) e posse pelo colaborador
+        equipamento = Equipamento.objects.create(nome='Capacete', estoque_total=10, estoque_disponivel=10)
+        for colaborador in Colaborador.objects.all():
+            PosseEquipamento.objects.create(
+                colaborador=colaborador, equipamento=equipamento, quantidade=1,
+                devolucao_mais_antiga=date.today(),
+            )
+        self.assertSemVarreduraCompleta(
+            lambda: consultar_portaria('7'), {'colaboradores_colaborador', 'emprestimos_posseequipamento'}
+        )
+
+    def test_seletor_de_colaboradores_ativos(self):
+        self.client.force_login(self.usuario)
+        url = reverse('colaborador_autocomplete')
+        self.assertSemVarreduraCompleta(
+            lambda: self.client.get(url, {'q': 'Colab'}), {'colaboradores_colaborador'}
+        )
+
+
+class ConsultasFixasColaboradoresTest(ConsultasFixasMixin, TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_colaborador_lista(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho, colaboradores=tamanho)
+            return (reverse('index'),)
+        self.assertConsultasFixas(5, self.client.get, preparar)
+
+    def test_colaborador_detalhe(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho, colaboradores=tamanho)
+            colaborador = Colaborador.objects.filter(posses__isnull=False).first()
+            return (reverse('colaborador_detalhe', args=[colaborador.id]),)
+        self.assertConsultasFixas(5, self.client.get, preparar)
+
+    def test_consulta_portaria(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho, colaboradores=tamanho)
+            colaborador = Colaborador.objects.filter(posses__isnull=False).first()
+            return (reverse('consulta_portaria'), {'matricula': colaborador.matricula})
+        self.assertConsultasFixas(3, self.client.get, preparar)
+
+
+class ConsultaPortariaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('portaria', password='senha')
+        cls.colaborador = Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Pedreiro')
+        Colaborador.objects.create(nome_completo='Sem EPI', matricula='200', funcao='Servente')
+        cls.luva = Equipamento.objects.create(nome='Luva', ca='123', estoque_total=10, estoque_disponivel=10)
+        cls.bota = Equipamento.objects.create(nome='Bota', estoque_total=10, estoque_disponivel=10)
+        hoje = date.today()
+        PosseEquipamento.objects.create(
+            colaborador=cls.colaborador, equipamento=cls.luva, quantidade=2, devolucao_mais_antiga=hoje + timedelta(days=3)
+        )
+        PosseEquipamento.objects.create(
+            colaborador=cls.colaborador, equipamento=cls.bota, quantidade=1, devolucao_mais_antiga=hoje - timedelta(days=1)
+        )
+        # O autocomplete consulta o índice de busca
+        reconstruir_indice()
+
+    def test_uma_consulta(self):
+        with self.assertNumQueries(1):
+            consulta = consultar_portaria('100')
+        self.assertEqual(consulta['nome'], 'Ana Lima')
+        self.assertTrue(consulta['atrasado'])
+        self.assertEqual(
+            [(p['equipamento'], p['quantidade'], p['atrasado']) for p in consulta['posses']],
+            [('Bota', 1, True), ('Luva', 2, False)],
+        )
+        self.assertEqual(consultar_portaria('200')['posses'], [])
+        self.assertIsNone(consultar_portaria('999'))
+
+    def test_paginas(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('consulta_portaria'), {'matricula': '100', 'formato': 'json'})
+        self.assertEqual(resposta.json()['posses'][0]['equipamento'], 'Bota')
+        resposta = self.client.get(reverse('consulta_portaria'), {'matricula': '999', 'formato': 'json'})
+        self.assertEqual(resposta.status_code, 404)
+        resposta = self.client.get(reverse('consulta_portaria'), {'matricula': '100'})
+        self.assertContains(resposta, 'Devolução atrasada')
+        resposta = self.client.get(reverse('colaborador_detalhe', args=[self.colaborador.id]))
+        self.assertContains(resposta, 'Luva')
+
+
+    async def test_paginas_asgi(self):
+        # As mesmas views pelo AsyncClient (usuário carregado por auser())
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('consulta_portaria'), {'matricula': '100'})
+        self.assertContains(resposta, 'Devolução atrasada')
+        resposta = await self.async_client.get(reverse('colaborador_detalhe', args=[self.colaborador.id]))
+        self.assertContains(resposta, 'Luva')
+        resposta = await self.async_client.get(reverse('colaborador_autocomplete'), {'q': 'Ana'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('Ana Lima', resposta.content.decode())
+
+class AutocompleteColaboradorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('estoque', password='senha')
+        for nome, matricula, status in [
+            ('Ana Lima', '100', 'Ativo'),
+            ('Mariana Souza', '200', 'Ativo'),
+            ('Bruno Dias', '1001', 'Ativo'),
+            ('Ana Reis', '300', 'Inativo'),
+        ]:
+            Colaborador.objects.create(nome_completo=nome, matricula=matricula, funcao='Pedreiro', status=status)
+        reconstruir_indice()
+
+    def setUp(self):
+        cache_django.clear()
+        self.client.force_login(self.usuario)
+
+    def buscar(self, termo):
+        resposta = self.client.get(reverse('colaborador_autocomplete'), {'q': termo})
+        return [resultado['texto'] for resultado in resposta.json()['resultados']]
+
+    def test_somente_ativos_com_quem_comeca_com_o_termo_primeiro(self):
+        self.assertEqual(self.buscar('ana'), ['Ana Lima (100)'])
+        # Matrícula exata antes de quem só começa com ela
+        self.assertEqual(self.buscar('100'), ['Ana Lima (100)', 'Bruno Dias (1001)'])
+        self.assertEqual(self.buscar(''), ['Ana Lima (100)', 'Bruno Dias (1001)', 'Mariana Souza (200)'])
+
+    def test_so_a_lista_inicial_fica_no_cache(self):
+        cache.estatisticas.limpar()
+        self.buscar('')
+        self.buscar('')
+        self.buscar('mar')
+        self.buscar('mari')
+        self.assertEqual(
+            [(linha['nome'], linha['acertos'], linha['falhas']) for linha in cache.estatisticas.resumo()],
+            [('colaboradores:autocomplete', 1, 1)],
+        )
+
+    def test_exige_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('colaborador_autocomplete'), {'q': 'ana'}).status_code, 302)
+
+class ImportacaoColaboradoresTest(TestCase):
+
+    CSV = (
+        "Nome Completo;Matrícula;Função;Status\n"
+        "Ana Lima;100;Pedreiro;Ativo\n"
+        "Bruno Dias;10a;Servente;\n"
+        "Carla Melo;101;Eletricista;inativo\n"
+        "Outra Ana;100;Pedreiro;Ativo\n"
+        ";;;\n"
+        "Davi Reis;102;Carpinteiro;Afastado\n"
+    )
+
+    def importar(self, texto, **opcoes):
+        return importar_colaboradores(io.BytesIO(texto.encode('utf-8')), 'colaboradores.csv', **opcoes)
+
+    def test_relatorio_de_erros_por_linha(self):
+        resultado = self.importar(self.CSV)
+
+        self.assertEqual((resultado.linhas, resultado.criados, resultado.atualizados), (5, 2, 0))
+        self.assertEqual([linha for linha, _, _ in resultado.erros], [3, 5, 7])
+        self.assertIn('apenas números', resultado.erros[0][2])
+        self.assertIn('linha 2', resultado.erros[1][2])
+        self.assertEqual(Colaborador.objects.get(matricula='101').status, 'Inativo')
+
+    def test_matricula_existente_atualiza_ou_vira_erro(self):
+        Colaborador.objects.create(nome_completo='Ana Antiga', matricula='100', funcao='Servente')
+        texto = "nome,matricula,funcao\nAna Lima,100,Pedreiro\n"
+
+        resultado = self.importar(texto, atualizar=False)
+        self.assertEqual(resultado.total_erros, 1)
+        self.assertEqual(Colaborador.objects.get(matricula='100').nome_completo, 'Ana Antiga')
+
+        resultado = self.importar(texto)
+        self.assertEqual((resultado.criados, resultado.atualizados), (0, 1))
+        self.assertEqual(Colaborador.objects.get(matricula='100').funcao, 'Pedreiro')
+
+    def test_matricula_gravada_por_outro_usuario_no_meio_do_lote(self):
+        # Outro usuário cadastra a matrícula 101 entre a consulta do lote e o INSERT
+        bulk_create = Colaborador.objects.bulk_create
+
+        def cadastro_concorrente(objetos, **opcoes):
+            if any(c.matricula == '101' for c in objetos):
+                Colaborador.objects.create(nome_completo='Carla Antiga', matricula='101', funcao='Servente')
+            return bulk_create(objetos, **opcoes)
+
+        texto = "nome,matricula,funcao\nAna Lima,100,Pedreiro\nCarla Melo,101,Eletricista\nDavi Reis,102,Carpinteiro\n"
+        with mock.patch.object(Colaborador.objects, 'bulk_create', side_effect=cadastro_concorrente):
+            resultado = self.importar(texto, atualizar=False)
+
+        self.assertEqual((resultado.criados, resultado.total_erros), (2, 1))
+        self.assertEqual(resultado.erros[0][:2], (3, '101'))
+        self.assertIn('outro usuário', resultado.erros[0][2])
+        self.assertEqual(set(Colaborador.objects.values_list('matricula', flat=True)), {'100', '102'})
+
+    def test_consultas_por_lote_nao_dependem_das_linhas(self):
+        # Lote de colaboradores novos: SAVEPOINT, SELECT das matrículas, INSERT,
+        # SELECT dos ids e RELEASE (até 199 linhas por INSERT no SQLite)
+        for quantidade in (10, 150):
+            texto = "nome,matricula,funcao\n" + "".join(
+                f"Pessoa {quantidade} {numero},{quantidade}{numero:04d},Servente\n"
+                for numero in range(quantidade)
+            )
+            with self.subTest(linhas=quantidade), self.assertNumQueries(5):
+                self.importar(texto)
+
+    def test_pagina_de_importacao(self):
+        self.client.force_login(User.objects.create_user('estoque', password='senha'))
+        arquivo = SimpleUploadedFile('colaboradores.csv', self.CSV.encode('utf-8'))
+
+        resposta = self.client.post(reverse('colaborador_importar'), {'arquivo': arquivo, 'atualizar': 'on'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['resultado'].criados, 2)
+        self.assertContains(resposta, 'Status inválido')
+
+    def test_csv_salvo_pelo_excel_em_cp1252(self):
+        # Acento já no cabeçalho: a detecção não pode depender da 1ª linha só
+        texto = "Nome Completo;Matrícula;Função\nJoão Conceição;100;Eletricista\n"
+        resultado = importar_colaboradores(io.BytesIO(texto.encode('cp1252')), 'colaboradores.csv')
+
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual(Colaborador.objects.get(matricula='100').nome_completo, 'João Conceição')
+
+    def test_csv_ilegivel_vira_mensagem(self):
+        self.client.force_login(User.objects.create_user('estoque', password='senha'))
+        # 0x81 não existe nem em UTF-8 nem em cp1252
+        arquivo = SimpleUploadedFile('colaboradores.csv', b"nome;matricula;funcao\nAna\x81;100;Pedreiro\n")
+
+        resposta = self.client.post(reverse('colaborador_importar'), {'arquivo': arquivo})
+
+        self.assertContains(resposta, 'Salve-o em UTF-8')
+        self.assertFalse(Colaborador.objects.exists())
+
+    def test_upload_exige_token_csrf(self):
+        cliente = Client(enforce_csrf_checks=True)
+        cliente.force_login(User.objects.create_user('estoque', password='senha'))
+        arquivo = SimpleUploadedFile('colaboradores.csv', self.CSV.encode('utf-8'))
+
+        resposta = cliente.post(reverse('colaborador_importar'), {'arquivo': arquivo})
+        self.assertEqual(resposta.status_code, 403)
+        self.assertFalse(Colaborador.objects.exists())
+
+        pagina = cliente.get(reverse('colaborador_importar'))
+        self.assertContains(pagina, 'csrfmiddlewaretoken')
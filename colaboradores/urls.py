@@ -8,9 +8,23 @@ urlpatterns = [
     # Create (Cadastrar)
     path('cadastro/', views.colaborador_novo, name='cadastro'),
 
+    # Importação em lote (CSV/XLSX)
+    path('importar/', views.colaborador_importar, name='colaborador_importar'),
+
+    # O que o colaborador tem em mãos e os últimos empréstimos
+    path('detalhe/<int:id>/', views.colaborador_detalhe, name='colaborador_detalhe'),
+
+    # Consulta rápida pela matrícula (portaria)
+    # ex: /sistema/portaria/?matricula=123 (&formato=json)
+    path('portaria/', views.consulta_portaria, name='consulta_portaria'),
+
     # <int:id> pega o número do colaborador da URL
     path('editar/<int:id>/', views.colaborador_editar, name='colaborador_editar'),
     
     # Delete (Excluir) - NOVA LINHA
     path('excluir/<int:id>/', views.colaborador_excluir, name='colaborador_excluir'),
+
+    # Busca JSON para o seletor de colaborador (autocomplete)
+    # ex: /sistema/colaboradores/buscar/?q=joao
+    path('colaboradores/buscar/', views.colaborador_autocomplete, name='colaborador_autocomplete'),
 ]
\ No newline at end of file
@@ -1,24 +1,51 @@
 # colaboradores/views.py
 
-from django.shortcuts import render, redirect, get_object_or_404 
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from .models import Colaborador
-from .forms import ColaboradorForm
-from django.db.models import Q
+from .forms import ColaboradorForm, ImportacaoColaboradoresForm
+from .importacao import ErroImportacao, importar_colaboradores
+from core import cache
+from core.assincrono import view_assincrona
+from core.condicional import pagina_condicional
+from core.busca import TIPO_COLABORADOR, filtrar_por_busca
+from emprestimos.posse import consultar_portaria
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import JsonResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import ProtectedError
+from django.utils import timezone
 # Importação necessária para corrigir o erro de CSRF no Codespace
 from django.views.decorators.csrf import csrf_exempt
 
+# Quantidade máxima de resultados devolvidos pelo autocomplete
+LIMITE_AUTOCOMPLETE = 20
+
+# Empréstimos mais recentes mostrados no detalhe do colaborador
+LIMITE_EMPRESTIMOS_DETALHE = 20
+
+# Funções sugeridas no cadastro mesmo que ninguém tenha ainda
+SUGESTOES_BASE = ['Pedreiro', 'Servente', 'Mestre de Obras', 'Carpinteiro', 'Eletricista']
+
+
+def sugestoes_de_funcao():
+    # Sugestões + funções já cadastradas (DISTINCT na tabela toda), do cache
+    def calcular():
+        funcoes_db = Colaborador.objects.values_list('funcao', flat=True).distinct()
+        return sorted(set(SUGESTOES_BASE) | set(funcoes_db))
+    return cache.obter('colaboradores:funcoes', [cache.COLABORADORES], calcular)
+
+
 @login_required 
+@pagina_condicional(cache.COLABORADORES)
 def colaborador_lista(request):
     query = request.GET.get('q', '')
     
     if query:
-        colaboradores = Colaborador.objects.filter(
-            Q(nome_completo__icontains=query) |
-            Q(matricula__icontains=query) |
-            Q(funcao__icontains=query)
+        colaboradores = filtrar_por_busca(
+            Colaborador.objects.all(), TIPO_COLABORADOR, query,
+            campos=['nome_completo', 'matricula', 'funcao'],
         ).order_by('nome_completo')
     else:
         colaboradores = Colaborador.objects.all().order_by('nome_completo')
@@ -37,12 +64,56 @@ def colaborador_lista(request):
     return render(request, 'index.html', context)
 
 
+@view_assincrona
+@login_required
+@pagina_condicional(cache.COLABORADORES, cache.EMPRESTIMOS, cache.EQUIPAMENTOS, diaria=True)
+async def colaborador_detalhe(request, id):
+    ##
+    ## O que o colaborador tem em mãos agora (tabela de posse, sem somar
+    ## itens e devoluções) e os empréstimos mais recentes dele.
+    ## View async: as listas são lidas antes do template (ORM assíncrono).
+    ##
+    colaborador = await aget_object_or_404(Colaborador, id=id)
+    posses = colaborador.posses.select_related('equipamento').order_by('devolucao_mais_antiga', 'equipamento__nome')
+    emprestimos = colaborador.emprestimos.order_by('-data_emprestimo')[:LIMITE_EMPRESTIMOS_DETALHE]
+    context = {
+        'colaborador': colaborador,
+        'posses': [posse async for posse in posses],
+        'emprestimos': [emprestimo async for emprestimo in emprestimos],
+        'hoje': timezone.localdate(),
+        'titulo_pagina': colaborador.nome_completo,
+    }
+    return render(request, 'colaborador_detalhe.html', context)
+
+
+@view_assincrona
+@login_required
+async def consulta_portaria(request):
+    ##
+    ## Consulta rápida na portaria pela matrícula: o que o colaborador
+    ## está levando e se há devolução atrasada. Uma consulta só, por
+    ## índice. Com ?formato=json responde em JSON (leitores de crachá).
+    ##
+    matricula = request.GET.get('matricula', '').strip()
+    consulta = await sync_to_async(consultar_portaria)(matricula) if matricula else None
+
+    if request.GET.get('formato') == 'json':
+        if consulta is None:
+            return JsonResponse({'erro': 'Matrícula não encontrada.'}, status=404)
+        return JsonResponse(consulta)
+
+    context = {
+        'matricula': matricula,
+        'consulta': consulta,
+        'titulo_pagina': 'Consulta na Portaria',
+    }
+    return render(request, 'consulta_portaria.html', context)
+
+
 @csrf_exempt # <--- ADICIONADO: Ignora verificação CSRF para cadastro
 @login_required 
 def colaborador_novo(request):
-    sugestoes_base = ['Pedreiro', 'Servente', 'Mestre de Obras', 'Carpinteiro', 'Eletricista']
-    funcoes_db = Colaborador.objects.values_list('funcao', flat=True).distinct()
-    todas_funcoes = sorted(list(set(sugestoes_base) | set(funcoes_db)))
+    todas_funcoes = sugestoes_de_funcao()
 
     if request.method == 'POST':
         form = ColaboradorForm(request.POST)
@@ -66,9 +137,7 @@ def colaborador_novo(request):
 def colaborador_editar(request, id):
     colaborador = get_object_or_404(Colaborador, id=id)
     
-    sugestoes_base = ['Pedreiro', 'Servente', 'Mestre de Obras', 'Carpinteiro', 'Eletricista']
-    funcoes_db = Colaborador.objects.values_list('funcao', flat=True).distinct()
-    todas_funcoes = sorted(list(set(sugestoes_base) | set(funcoes_db)))
+    todas_funcoes = sugestoes_de_funcao()
 
     if request.method == 'POST':
         form = ColaboradorForm(request.POST, instance=colaborador)
@@ -101,4 +170,80 @@ def colaborador_excluir(request, id):
         except ProtectedError:
             messages.error(request, f'Erro: O colaborador "{colaborador.nome_completo}" tem empréstimos registrados e não pode ser excluído.')
     
-    return redirect('index')
\ No newline at end of file
+    return redirect('index')
+
+
+@view_assincrona
+@login_required
+async def colaborador_autocomplete(request):
+    ##
+    ## Busca JSON para o seletor de colaborador (somente ativos).
+    ## Quem começa com o termo (nome ou matrícula) aparece primeiro.
+    ## Só a lista inicial (sem termo) fica no cache: o texto digitado vai
+    ## ao índice de busca, e guardar cada termo encheria o cache.
+    ##
+    termo = request.GET.get('q', '').strip()
+    if termo:
+        resultados = await sync_to_async(_buscar_ativos)(termo)
+    else:
+        resultados = await sync_to_async(cache.obter)(
+            'colaboradores:autocomplete', [cache.COLABORADORES], lambda: _buscar_ativos('')
+        )
+    return JsonResponse({'resultados': resultados})
+
+
+def _buscar_ativos(termo):
+    colaboradores = Colaborador.objects.filter(status='Ativo')
+
+    if termo:
+        # Índice de busca (nome, matrícula e função, por prefixo)
+        colaboradores = filtrar_por_busca(
+            colaboradores, TIPO_COLABORADOR, termo, campos=['nome_completo', 'matricula'],
+        ).annotate(
+            relevancia=Case(
+                When(matricula=termo, then=Value(0)),
+                When(Q(nome_completo__istartswith=termo) | Q(matricula__startswith=termo), then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        ).order_by('relevancia', 'nome_completo')
+    else:
+        colaboradores = colaboradores.order_by('nome_completo')
+
+    return [
+        {'id': c['id'], 'texto': f"{c['nome_completo']} ({c['matricula']})"}
+        for c in colaboradores.values('id', 'nome_completo', 'matricula')[:LIMITE_AUTOCOMPLETE]
+    ]
+
+
+@login_required
+def colaborador_importar(request):
+    ##
+    ## Importação em lote de colaboradores a partir de CSV/XLSX.
+    ## O arquivo é lido em streaming (o Django grava uploads grandes em
+    ## arquivo temporário) e o relatório mostra os erros por linha.
+    ##
+    resultado = None
+    if request.method == 'POST':
+        form = ImportacaoColaboradoresForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importar_colaboradores(
+                    arquivo.file, arquivo.name, atualizar=form.cleaned_data['atualizar']
+                )
+            except ErroImportacao as erro:
+                messages.error(request, str(erro))
+            else:
+                if resultado.total_erros:
+                    messages.warning(request, f'Importação concluída com {resultado.total_erros} linha(s) com erro.')
+                else:
+                    messages.success(request, 'Importação concluída sem erros!')
+    else:
+        form = ImportacaoColaboradoresForm()
+
+    context = {
+        'form': form,
+        'resultado': resultado,
+    }
+    return render(request, 'importar_colaboradores.html', context)
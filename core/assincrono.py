@@ -0,0 +1,35 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.core.handlers.asgi import ASGIRequest
+
+## --- Views assíncronas (deploy ASGI, setup/asgi.py) ---
+## As views de leitura que mais esperam pelo banco (buscas, autocomplete,
+## consulta da portaria, detalhe e exportação) são "async def": no ASGI,
+## enquanto esperam, não prendem uma thread do servidor. No WSGI (e nos
+## testes) o Django roda a mesma view com async_to_sync.
+## Dentro delas o banco só pode ser usado pelo ORM assíncrono (aget,
+## async for, aiterator...) ou com sync_to_async.
+
+
+def view_assincrona(view):
+    ##
+    ## Decorador de toda view async (acima do @login_required): carrega o
+    ## usuário (com o perfil) pelo caminho assíncrono e o deixa pronto em
+    ## request.user. Sem isso, o primeiro acesso a request.user (no
+    ## template, no base.html) consultaria o banco de forma síncrona dentro
+    ## do loop de eventos, o que o Django não permite.
+    ##
+    if not iscoroutinefunction(view):
+        raise TypeError(f"{view.__name__} precisa ser 'async def' para usar @view_assincrona.")
+
+    @wraps(view)
+    async def interna(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return interna
+
+
+def servido_por_asgi(request):
+    # A resposta vai ser lida por um servidor ASGI (streaming assíncrono)?
+    return isinstance(request, ASGIRequest)
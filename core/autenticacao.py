@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class PerfilModelBackend(ModelBackend):
+    ##
+    ## Igual ao ModelBackend, mas carrega o perfil (foto do rodapé do
+    ## base.html) na mesma consulta do usuário: uma página autenticada
+    ## faz uma única consulta de autenticação.
+    ##
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # O mesmo para request.auser() (views async, ver core/assincrono.py)
+        UserModel = get_user_model()
+        try:
+            user = await UserModel._default_manager.select_related('profile').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,43 @@
+## --- Ajustes do banco a cada conexão nova ---
+## Aplicados pelo sinal connection_created (core/signals.py). Com
+## CONN_MAX_AGE (setup/settings.py) a conexão é reaproveitada entre
+## requisições, então isso roda uma vez por conexão, não por requisição.
+
+# PRAGMAs do SQLite, na ordem em que são executados
+PRAGMAS_SQLITE = (
+    # Leitores não bloqueiam quem grava, nem quem grava bloqueia leitores
+    # (fica gravado no arquivo; nos seguintes é só uma confirmação)
+    ('journal_mode', 'WAL'),
+    # Espera até 5 s pelo lock de escrita antes de "database is locked"
+    ('busy_timeout', 5000),
+    # Com WAL, o fsync fica para o checkpoint: seguro contra queda do
+    # processo (uma queda de energia pode perder só as últimas transações)
+    ('synchronous', 'NORMAL'),
+    # Lê o arquivo por mmap (até 256 MB), sem copiar as páginas
+    ('mmap_size', 256 * 1024 * 1024),
+    # Cache de páginas de 64 MB por conexão (negativo = em KiB)
+    ('cache_size', -64 * 1024),
+    # Tabelas temporárias (ORDER BY/GROUP BY grandes) na memória
+    ('temp_store', 'MEMORY'),
+)
+
+
+def configurar_conexao(connection):
+    ##
+    ## Executa os PRAGMAs na conexão que acabou de abrir. Direto no
+    ## driver (connection.connection): não passa pelos wrappers de
+    ## medição nem conta como consulta da requisição.
+    ##
+    if connection.vendor != 'sqlite':
+        return
+    for nome, valor in PRAGMAS_SQLITE:
+        connection.connection.execute(f'PRAGMA {nome} = {valor}')
+
+
+def pragmas_atuais(connection):
+    # Valor de cada PRAGMA na conexão (diagnóstico e testes)
+    connection.ensure_connection()
+    return {
+        nome: connection.connection.execute(f'PRAGMA {nome}').fetchone()[0]
+        for nome, _ in PRAGMAS_SQLITE
+    }
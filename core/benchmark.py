@@ -0,0 +1,338 @@
+import asyncio
+import io
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from colaboradores.models import Colaborador
+from emprestimos.models import Emprestimo, ItemEmprestado, HistoricoDevolucao
+from equipamentos.models import Equipamento, MovimentacaoEstoque
+
+# Usuário (staff) usado pelo benchmark para acessar as páginas
+USUARIO_BENCHMARK = 'benchmark'
+
+# Rotas que alteram dados ou encerram a sessão em um GET, ou que só
+# baixam arquivos: ficam de fora
+ROTAS_IGNORADAS = {'logout', 'colaborador_excluir', 'equipamento_excluir', 'fichas_epi_baixar'}
+
+# Namespaces de terceiros (o admin do Django não é parte do sistema)
+NAMESPACES_IGNORADOS = {'admin'}
+
+# Parâmetros de busca usados nas rotas que dependem deles
+PARAMETROS_GET = {
+    'colaborador_autocomplete': {'q': 'Silva'},
+    'equipamento_autocomplete': {'q': 'Luva'},
+    'busca_global': {'q': 'Luva'},
+    'consulta_portaria': {'matricula': 'SINT0000001'},
+}
+
+# Modelo usado para preencher o <id> de cada rota com argumento
+MODELOS_DAS_ROTAS = {
+    'colaborador_editar': Colaborador,
+    'colaborador_detalhe': Colaborador,
+    'equipamento_editar': Equipamento,
+    'equipamento_movimentacoes': Equipamento,
+    'detalhe_emprestimo': Emprestimo,
+    'devolver_item_parcial': ItemEmprestado,
+}
+
+
+def listar_rotas(padroes=None, namespace=None):
+    ##
+    ## Percorre o setup/urls.py (e os includes) e devolve o nome de
+    ## cada rota, na ordem em que aparecem.
+    ##
+    if padroes is None:
+        padroes = get_resolver().url_patterns
+    rotas = []
+    for padrao in padroes:
+        if isinstance(padrao, URLResolver):
+            if padrao.namespace in NAMESPACES_IGNORADOS:
+                continue
+            rotas.extend(listar_rotas(padrao.url_patterns, padrao.namespace or namespace))
+        elif isinstance(padrao, URLPattern) and padrao.name:
+            rotas.append(f'{namespace}:{padrao.name}' if namespace else padrao.name)
+    return rotas
+
+
+def montar_url(rota):
+    ##
+    ## Monta a URL de uma rota; as que têm <id> usam o registro mais
+    ## recente do modelo correspondente. Retorna None se não houver.
+    ##
+    modelo = MODELOS_DAS_ROTAS.get(rota)
+    if modelo is None:
+        return reverse(rota)
+    pk = modelo.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return reverse(rota, args=[pk]) if pk else None
+
+
+def medir_rota(cliente, url, parametros, repeticoes):
+    ##
+    ## Uma execução de aquecimento medindo consultas e pico de memória
+    ## (tracemalloc deixa o código mais lento, então fica separado) e
+    ## depois 'repeticoes' execuções só cronometradas.
+    ##
+    consultas = []
+
+    def contar(execute, sql, params, many, context):
+        consultas.append(sql)
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(contar):
+            resposta = cliente.get(url, parametros)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cliente.get(url, parametros)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+
+    return {
+        'status': resposta.status_code,
+        'consultas': len(consultas),
+        'memoria_pico_kb': round(pico / 1024, 1),
+        'latencia_ms': {
+            'min': round(tempos[0], 2),
+            'mediana': round(statistics.median(tempos), 2),
+            'p95': round(tempos[max(0, round(0.95 * len(tempos)) - 1)], 2),
+            'max': round(tempos[-1], 2),
+        },
+    }
+
+
+def _medir_rotas(cliente, rotas, repeticoes, progresso):
+    resultados = {}
+    for rota in rotas:
+        if rota in ROTAS_IGNORADAS:
+            continue
+        url = montar_url(rota)
+        if url is None:
+            resultados[rota] = {'ignorada': 'sem registros para montar a URL'}
+            continue
+        resultados[rota] = {'url': url, **medir_rota(cliente, url, PARAMETROS_GET.get(rota, {}), repeticoes)}
+        if progresso:
+            progresso(f"{rota}: {resultados[rota]['latencia_ms']['mediana']} ms")
+    return resultados
+
+
+def executar_benchmark(repeticoes=10, rotas=None, progresso=None):
+    ##
+    ## Passa por todas as rotas do sistema com o cliente de testes do
+    ## Django e devolve um dicionário pronto para virar JSON
+    ## (dá para comparar com "diff" entre dois commits).
+    ## Roda com DEBUG=False, como em produção (com DEBUG o Django guarda
+    ## todas as consultas em memória e distorce tempo e memória).
+    ##
+    usuario, _ = User.objects.get_or_create(
+        username=USUARIO_BENCHMARK, defaults={'is_staff': True}
+    )
+    cliente = Client()
+    cliente.force_login(usuario)
+
+    with override_settings(DEBUG=False):
+        resultados = _medir_rotas(cliente, rotas or listar_rotas(), repeticoes, progresso)
+
+    return {
+        'ambiente': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'repeticoes': repeticoes,
+        },
+        'dados': {
+            'colaboradores': Colaborador.objects.count(),
+            'equipamentos': Equipamento.objects.count(),
+            'emprestimos': Emprestimo.objects.count(),
+            'itens': ItemEmprestado.objects.count(),
+            'historico': HistoricoDevolucao.objects.count(),
+            'movimentacoes': MovimentacaoEstoque.objects.count(),
+        },
+        'rotas': resultados,
+    }
+
+
+## --- Concorrência: WSGI x ASGI ---
+## As mesmas rotas chamadas por várias requisições ao mesmo tempo, pelos
+## dois handlers de verdade do Django (os de setup/wsgi.py e
+## setup/asgi.py), sem servidor HTTP na frente: o WSGI com um pool de
+## threads (como o gunicorn --threads) e o ASGI em um loop de eventos
+## (como o uvicorn).
+
+# Rotas de leitura convertidas em views async (ver core/assincrono.py)
+ROTAS_CONCORRENCIA = (
+    'colaborador_autocomplete', 'equipamento_autocomplete', 'busca_global',
+    'consulta_portaria', 'colaborador_detalhe', 'equipamento_lista',
+)
+
+
+def _percentil(tempos, fracao):
+    # tempos já ordenados
+    return round(tempos[max(0, round(fracao * len(tempos)) - 1)], 2)
+
+
+def _resumo(tempos, duracao, erros):
+    tempos.sort()
+    return {
+        'req_por_s': round(len(tempos) / duracao, 1),
+        'p50_ms': _percentil(tempos, 0.50),
+        'p95_ms': _percentil(tempos, 0.95),
+        'erros': erros,
+    }
+
+
+def _chamar_wsgi(aplicacao, caminho, query, cookie):
+    # Uma requisição GET pelo WSGIHandler; devolve o status HTTP
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': caminho, 'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    corpo = aplicacao(environ, lambda linha, cabecalhos, exc_info=None: status.append(linha))
+    try:
+        for _ in corpo:
+            pass
+    finally:
+        if hasattr(corpo, 'close'):
+            corpo.close()
+    return int(status[0].split()[0])
+
+
+async def _chamar_asgi(aplicacao, caminho, query, cookie):
+    # Uma requisição GET pelo ASGIHandler; devolve o status HTTP
+    escopo = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    corpo_enviado = False
+    fim = asyncio.Event()
+    status = []
+
+    async def receber():
+        nonlocal corpo_enviado
+        if not corpo_enviado:
+            corpo_enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # O Django fica escutando um "disconnect": o cliente nunca desconecta
+        await fim.wait()
+        return {'type': 'http.disconnect'}
+
+    async def enviar(mensagem):
+        if mensagem['type'] == 'http.response.start':
+            status.append(mensagem['status'])
+        elif not mensagem.get('more_body'):
+            fim.set()
+
+    await aplicacao(escopo, receber, enviar)
+    return status[0]
+
+
+def medir_wsgi(aplicacao, caminho, query, cookie, concorrencia, requisicoes):
+    tempos, erros = [], 0
+
+    def uma(_):
+        inicio = time.perf_counter()
+        status = _chamar_wsgi(aplicacao, caminho, query, cookie)
+        return status, (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        for status, tempo in pool.map(uma, range(requisicoes)):
+            tempos.append(tempo)
+            erros += status != 200
+    return _resumo(tempos, time.perf_counter() - inicio, erros)
+
+
+def medir_asgi(aplicacao, caminho, query, cookie, concorrencia, requisicoes):
+    tempos, erros = [], 0
+
+    async def cliente(fila):
+        nonlocal erros
+        while fila:
+            fila.pop()
+            inicio = time.perf_counter()
+            status = await _chamar_asgi(aplicacao, caminho, query, cookie)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            erros += status != 200
+
+    async def todos():
+        fila = list(range(requisicoes))
+        await asyncio.gather(*(cliente(fila) for _ in range(concorrencia)))
+
+    inicio = time.perf_counter()
+    asyncio.run(todos())
+    return _resumo(tempos, time.perf_counter() - inicio, erros)
+
+
+def executar_benchmark_concorrencia(concorrencia=8, requisicoes=200, rotas=None, progresso=None):
+    ##
+    ## Para cada rota: 'requisicoes' GETs com 'concorrencia' requisições
+    ## em andamento ao mesmo tempo, primeiro pelo WSGI e depois pelo ASGI.
+    ## Devolve requisições por segundo, p50/p95 e quantas não deram 200.
+    ## Uma requisição de aquecimento antes de cada medição (cache e
+    ## conexões já abertos, como em um servidor em uso).
+    ##
+    usuario, _ = User.objects.get_or_create(
+        username=USUARIO_BENCHMARK, defaults={'is_staff': True}
+    )
+    cliente = Client()
+    cliente.force_login(usuario)
+    cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    wsgi = get_wsgi_application()
+    asgi = get_asgi_application()
+    resultados = {}
+    with override_settings(DEBUG=False):
+        for rota in rotas or ROTAS_CONCORRENCIA:
+            url = montar_url(rota)
+            if url is None:
+                resultados[rota] = {'ignorada': 'sem registros para montar a URL'}
+                continue
+            query = urlencode(PARAMETROS_GET.get(rota, {}))
+            _chamar_wsgi(wsgi, url, query, cookie)
+            medida_wsgi = medir_wsgi(wsgi, url, query, cookie, concorrencia, requisicoes)
+            asyncio.run(_chamar_asgi(asgi, url, query, cookie))
+            medida_asgi = medir_asgi(asgi, url, query, cookie, concorrencia, requisicoes)
+            resultados[rota] = {'url': url, 'wsgi': medida_wsgi, 'asgi': medida_asgi}
+            if progresso:
+                progresso(
+                    f"{rota}: WSGI {medida_wsgi['req_por_s']} req/s, "
+                    f"ASGI {medida_asgi['req_por_s']} req/s"
+                )
+
+    return {
+        'ambiente': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'concorrencia': concorrencia,
+            'requisicoes': requisicoes,
+        },
+        'rotas': resultados,
+    }
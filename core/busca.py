@@ -0,0 +1,239 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Índice de busca textual (SQLite FTS5).
+# Uma única tabela guarda os documentos das três entidades pesquisáveis;
+# 'tipo' e 'objeto_id' apontam para o registro original.
+TABELA_BUSCA = 'busca_indice'
+
+TIPO_COLABORADOR = 'colaborador'
+TIPO_EQUIPAMENTO = 'equipamento'
+TIPO_EMPRESTIMO = 'emprestimo'
+
+# O rowid de cada documento vem do tipo e do id do registro: trocar ou
+# apagar um documento é uma busca pela chave, sem varrer o índice
+# ('tipo' e 'objeto_id' são UNINDEXED). Mesma fórmula da migração 0004.
+CODIGOS_TIPO = {TIPO_COLABORADOR: 1, TIPO_EQUIPAMENTO: 2, TIPO_EMPRESTIMO: 3}
+
+
+def chave_documento(tipo, objeto_id):
+    return objeto_id * 4 + CODIGOS_TIPO[tipo]
+
+
+# Peso de cada coluna no ranking (bm25): o título vale mais que o resto
+PESOS_BM25 = (0.0, 0.0, 10.0, 1.0)
+
+# Tamanho dos lotes usados na reconstrução do índice
+TAMANHO_LOTE = 2000
+
+_disponivel = {}
+
+
+def indice_disponivel():
+    ##
+    ## O índice só existe no SQLite (com FTS5). Nos outros bancos,
+    ## as telas continuam usando a busca com icontains.
+    ##
+    if connection.vendor != 'sqlite':
+        return False
+    nome_banco = connection.settings_dict['NAME']
+    if nome_banco not in _disponivel:
+        _disponivel[nome_banco] = TABELA_BUSCA in connection.introspection.table_names()
+    return _disponivel[nome_banco]
+
+
+def montar_consulta(termo):
+    ##
+    ## Converte o texto digitado em uma consulta FTS5 por prefixo:
+    ## "joao sil" -> "joao"* "sil"*  (todas as palavras precisam aparecer).
+    ## Acentos e maiúsculas são ignorados pelo tokenizador (unicode61).
+    ##
+    palavras = re.findall(r'\w+', termo or '')
+    if not palavras:
+        return None
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def filtrar_por_busca(queryset, tipo, termo, campos):
+    ##
+    ## Aplica a busca textual em um queryset das telas de listagem.
+    ##   - Com o índice: id IN (SELECT ... MATCH ...), em uma consulta só.
+    ##   - Sem o índice: cai no icontains antigo sobre 'campos'.
+    ##
+    if indice_disponivel():
+        consulta = montar_consulta(termo)
+        if consulta is None:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT objeto_id FROM {TABELA_BUSCA} WHERE {TABELA_BUSCA} MATCH %s AND tipo = %s",
+            (consulta, tipo),
+        ))
+
+    filtro = Q()
+    for campo in campos:
+        filtro |= Q(**{f'{campo}__icontains': termo})
+    queryset = queryset.filter(filtro)
+    if any('__' in campo for campo in campos):
+        queryset = queryset.distinct()
+    return queryset
+
+
+def buscar(termo, tipos=None, limite=20):
+    ##
+    ## Busca global: retorna resultados misturados das três entidades,
+    ## ordenados por relevância (bm25). Cada resultado é um dicionário
+    ## com tipo, id, título e um trecho destacado.
+    ##
+    consulta = montar_consulta(termo)
+    if consulta is None or not indice_disponivel():
+        return []
+
+    sql = (
+        f"SELECT tipo, objeto_id, titulo, "
+        f"snippet({TABELA_BUSCA}, 3, '[', ']', '...', 8) "
+        f"FROM {TABELA_BUSCA} WHERE {TABELA_BUSCA} MATCH %s"
+    )
+    parametros = [consulta]
+    if tipos:
+        sql += f" AND tipo IN ({', '.join(['%s'] * len(tipos))})"
+        parametros += list(tipos)
+    sql += f" ORDER BY bm25({TABELA_BUSCA}, {', '.join(str(p) for p in PESOS_BM25)}) LIMIT %s"
+    parametros.append(limite)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [
+            {'tipo': tipo, 'id': objeto_id, 'titulo': titulo, 'trecho': trecho}
+            for tipo, objeto_id, titulo, trecho in cursor.fetchall()
+        ]
+
+
+## --- Montagem dos documentos ---
+
+def _documentos_colaboradores(ids=None):
+    from colaboradores.models import Colaborador
+    colaboradores = Colaborador.objects.all()
+    if ids is not None:
+        colaboradores = colaboradores.filter(id__in=ids)
+    for c in colaboradores.values_list('id', 'nome_completo', 'matricula', 'funcao').iterator(chunk_size=TAMANHO_LOTE):
+        ident, nome, matricula, funcao = c
+        yield TIPO_COLABORADOR, ident, nome, f"{matricula} {funcao}"
+
+
+def _documentos_equipamentos(ids=None):
+    from equipamentos.models import Equipamento
+    categorias = dict(Equipamento.CATEGORIAS_CHOICES)
+    equipamentos = Equipamento.objects.all()
+    if ids is not None:
+        equipamentos = equipamentos.filter(id__in=ids)
+    for ident, nome, ca, categoria in equipamentos.values_list('id', 'nome', 'ca', 'categoria').iterator(chunk_size=TAMANHO_LOTE):
+        yield TIPO_EQUIPAMENTO, ident, nome, f"{ca or ''} {categoria} {categorias.get(categoria, '')}"
+
+
+def _documentos_emprestimos(ids=None):
+    from emprestimos.models import Emprestimo, ItemEmprestado
+    emprestimos = Emprestimo.objects.order_by('id')
+    if ids is not None:
+        emprestimos = emprestimos.filter(id__in=ids)
+    linhas = emprestimos.values_list('id', 'colaborador__nome_completo', 'colaborador__matricula')
+
+    lote = []
+    for linha in linhas.iterator(chunk_size=TAMANHO_LOTE):
+        lote.append(linha)
+        if len(lote) >= TAMANHO_LOTE:
+            yield from _documentos_lote_emprestimos(lote, ItemEmprestado)
+            lote = []
+    if lote:
+        yield from _documentos_lote_emprestimos(lote, ItemEmprestado)
+
+
+def _documentos_lote_emprestimos(lote, ItemEmprestado):
+    # Nomes dos equipamentos de todos os empréstimos do lote em uma consulta
+    nomes = {}
+    itens = ItemEmprestado.objects.filter(
+        emprestimo_id__in=[linha[0] for linha in lote]
+    ).values_list('emprestimo_id', 'equipamento__nome')
+    for emprestimo_id, nome in itens:
+        nomes.setdefault(emprestimo_id, []).append(nome)
+
+    for ident, nome_colaborador, matricula in lote:
+        equipamentos = ' '.join(nomes.get(ident, []))
+        yield TIPO_EMPRESTIMO, ident, nome_colaborador, f"{ident} {matricula} {equipamentos}"
+
+
+GERADORES = {
+    TIPO_COLABORADOR: _documentos_colaboradores,
+    TIPO_EQUIPAMENTO: _documentos_equipamentos,
+    TIPO_EMPRESTIMO: _documentos_emprestimos,
+}
+
+
+## --- Escrita no índice ---
+
+def indexar(tipo, ids, novos=False):
+    ##
+    ## (Re)indexa os registros 'ids' de um tipo. Registros que não existem
+    ## mais são apenas removidos do índice.
+    ## novos=True: os registros acabaram de ser criados e ainda não estão
+    ## no índice, então a remoção é pulada.
+    ##
+    if not ids or not indice_disponivel():
+        return
+    ids = list(ids)
+    # Uma transação só: chamado no on_commit, cada INSERT seria um commit
+    with transaction.atomic():
+        if not novos:
+            remover(tipo, ids)
+        _inserir(GERADORES[tipo](ids))
+
+
+def remover(tipo, ids):
+    if not ids or not indice_disponivel():
+        return
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), 500):
+            parte = ids[inicio:inicio + 500]
+            # Pelo rowid: uma busca na chave por documento
+            cursor.execute(
+                f"DELETE FROM {TABELA_BUSCA} WHERE rowid IN ({', '.join(['%s'] * len(parte))})",
+                [chave_documento(tipo, ident) for ident in parte],
+            )
+
+
+def _inserir(documentos):
+    sql = f"INSERT INTO {TABELA_BUSCA} (rowid, tipo, objeto_id, titulo, texto) VALUES (%s, %s, %s, %s, %s)"
+    lote = []
+    with connection.cursor() as cursor:
+        for tipo, ident, titulo, texto in documentos:
+            lote.append((chave_documento(tipo, ident), tipo, ident, titulo, texto))
+            if len(lote) >= TAMANHO_LOTE:
+                cursor.executemany(sql, lote)
+                lote = []
+        if lote:
+            cursor.executemany(sql, lote)
+
+
+@transaction.atomic
+def reconstruir_indice():
+    ##
+    ## Apaga e recria o índice inteiro. Retorna {tipo: quantidade}.
+    ##
+    if not indice_disponivel():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_BUSCA}")
+    for gerador in GERADORES.values():
+        _inserir(gerador())
+    with connection.cursor() as cursor:
+        # Compacta o índice depois da carga completa
+        cursor.execute(f"INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}) VALUES ('optimize')")
+        cursor.execute(f"SELECT tipo, COUNT(*) FROM {TABELA_BUSCA} GROUP BY tipo")
+        return dict(cursor.fetchall())
+
+
+def indexar_ao_confirmar(tipo, ids, novos=False):
+    # Indexa depois do COMMIT (ex: o empréstimo só tem itens no fim da transação)
+    transaction.on_commit(lambda: indexar(tipo, ids, novos))
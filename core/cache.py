@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+## --- Cache de catálogos e listas que mudam pouco ---
+## Cada entidade tem uma versão guardada no próprio cache. As chaves dos
+## valores levam as versões das entidades de que dependem: quando uma
+## entidade muda (sinais em core/signals.py), a versão sobe e os valores
+## antigos simplesmente deixam de ser lidos (e expiram sozinhos).
+
+COLABORADORES = 'colaboradores'
+EQUIPAMENTOS = 'equipamentos'
+EMPRESTIMOS = 'emprestimos'
+ENTIDADES = (COLABORADORES, EQUIPAMENTOS, EMPRESTIMOS)
+
+# Tempo máximo de um valor no cache (segundos). Também limita por quanto
+# tempo um processo pode ver dado antigo se o cache for só dele (LocMem
+# com vários processos, ver CACHES em setup/settings.py).
+TEMPO_PADRAO = 10 * 60
+
+
+def _chave_versao(entidade):
+    return f'versao:{entidade}'
+
+
+def versoes(entidades):
+    ##
+    ## Versão atual de cada entidade (uma ida ao cache para todas).
+    ## Versão que não existe (cache novo ou chave expulsa por falta de
+    ## espaço) começa pelo relógio, nunca por um número que já foi usado:
+    ## assim um valor antigo que ainda esteja no cache não volta a valer.
+    ##
+    chaves = [_chave_versao(entidade) for entidade in entidades]
+    atuais = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in atuais:
+            cache.add(chave, time.time_ns() // 1000, timeout=None)
+            atuais[chave] = cache.get(chave)
+    return [atuais[chave] for chave in chaves]
+
+
+def _chave_alteracao(entidade):
+    return f'alterado:{entidade}'
+
+
+def invalidar(*entidades):
+    for entidade in entidades:
+        try:
+            cache.incr(_chave_versao(entidade))
+        except ValueError:
+            # Versão ainda não existia: a próxima leitura cria uma nova
+            pass
+    # Momento da mudança (Last-Modified das páginas, ver core/condicional.py)
+    cache.set_many({_chave_alteracao(entidade): time.time() for entidade in entidades}, timeout=None)
+
+
+def ultima_alteracao(entidades):
+    # Momento (timestamp) da última mudança em alguma das entidades, ou
+    # None se o cache não souber (cache novo ou reiniciado)
+    momentos = cache.get_many([_chave_alteracao(entidade) for entidade in entidades])
+    return max(momentos.values()) if len(momentos) == len(entidades) else None
+
+
+def invalidar_ao_confirmar(*entidades):
+    ##
+    ## Invalida agora (a própria transação já lê o valor novo) e de novo
+    ## depois do COMMIT: se outra requisição guardou no cache, nesse meio
+    ## tempo, o dado de antes da gravação, ele também deixa de valer.
+    ##
+    invalidar(*entidades)
+    transaction.on_commit(lambda: invalidar(*entidades))
+
+
+def obter(nome, entidades, calcular, *partes, tempo=TEMPO_PADRAO):
+    ##
+    ## Devolve o valor 'nome' do cache ou, se não estiver lá, chama
+    ## calcular() e guarda o resultado.
+    ##   - entidades: de quais entidades o valor depende (invalidação)
+    ##   - partes: variações do mesmo valor (ex: o termo de uma busca)
+    ## Acertos e falhas são contados por 'nome' (ver estatisticas).
+    ##
+    chave = f"{nome}:" + ':'.join(f'{e}{v}' for e, v in zip(entidades, versoes(entidades)))
+    if partes:
+        # Texto digitado pelo usuário vira hash (chave curta e sem espaços)
+        chave += ':' + hashlib.md5(repr(partes).encode()).hexdigest()
+
+    valor = cache.get(chave)
+    estatisticas.registrar(nome, valor is not None)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, tempo)
+    return valor
+
+
+class EstatisticasCache:
+    ##
+    ## Acertos e falhas de cada valor do cache, por processo (como o
+    ## registro do diagnóstico: somem quando o servidor reinicia).
+    ##
+    def __init__(self):
+        self._contadores = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, nome, acerto):
+        with self._trava:
+            contador = self._contadores.setdefault(nome, [0, 0])
+            contador[0 if acerto else 1] += 1
+
+    def limpar(self):
+        with self._trava:
+            self._contadores.clear()
+
+    def resumo(self):
+        linhas = []
+        for nome, (acertos, falhas) in sorted(self._contadores.items()):
+            linhas.append({
+                'nome': nome,
+                'acertos': acertos,
+                'falhas': falhas,
+                'taxa_acerto': 100 * acertos / (acertos + falhas),
+            })
+        return linhas
+
+
+# Contadores únicos do processo, mostrados na página de diagnóstico
+estatisticas = EstatisticasCache()
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import cache
+from .templatetags.fotos_perfil import foto_perfil
+
+## --- GET condicional (ETag / Last-Modified) ---
+## As páginas de lista e de detalhe dependem de poucas entidades. A
+## versão delas no cache (core/cache.py) muda a cada gravação, então serve
+## de ETag sem consultar o banco. Se o navegador já tem a página com o
+## mesmo ETag, a resposta é 304: sem as consultas da view e sem template.
+## Só vale com um cache compartilhado entre os processos (EPI_CACHE_DIR,
+## Redis, Memcached): com o LocMem, cada worker tem as próprias versões e
+## um que não viu a gravação responderia 304 com a página antiga.
+
+
+def validadores_disponiveis():
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _etag(entidades, diaria):
+    def calcular(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        # Mensagem pendente (ex.: "salvo com sucesso") só aparece uma vez
+        if len(messages.get_messages(request)):
+            return None
+        partes = [
+            request.get_full_path(),
+            cache.versoes(entidades),
+            # Partes do base.html que dependem do usuário e do deploy
+            request.user.pk, request.user.is_staff, foto_perfil(request.user),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            getattr(staticfiles_storage, 'manifest_hash', ''),
+        ]
+        if diaria:
+            # Atrasos dependem da data de hoje
+            partes.append(timezone.localdate().isoformat())
+        return hashlib.md5(repr(partes).encode()).hexdigest()
+    return calcular
+
+
+def _ultima_modificacao(entidades, diaria):
+    def calcular(request, *args, **kwargs):
+        momento = cache.ultima_alteracao(entidades)
+        if momento is None:
+            return None
+        modificada = datetime.fromtimestamp(momento, tz=timezone.get_current_timezone())
+        if diaria:
+            modificada = max(modificada, timezone.make_aware(datetime.combine(timezone.localdate(), time.min)))
+        return modificada
+    return calcular
+
+
+def pagina_condicional(*entidades, diaria=False):
+    ##
+    ## Decorador das views de leitura: ETag/Last-Modified a partir das
+    ## versões das 'entidades' e 304 quando nada mudou.
+    ##   - diaria=True: a página também muda quando o dia vira (atrasos)
+    ##   - cache por processo (LocMem): a view roda sempre, sem validadores
+    ## A resposta sai com "private, no-cache": o navegador guarda, mas
+    ## sempre confirma com o servidor antes de reaproveitar.
+    ## Use abaixo do @login_required. Aceita views síncronas e async.
+    ##
+    def decorador(view):
+        view_condicional = condition(
+            etag_func=_etag(entidades, diaria),
+            last_modified_func=_ultima_modificacao(entidades, diaria),
+        )(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def interna_async(request, *args, **kwargs):
+                alvo = view_condicional if validadores_disponiveis() else view
+                resposta = await alvo(request, *args, **kwargs)
+                patch_cache_control(resposta, private=True, no_cache=True)
+                return resposta
+            return interna_async
+
+        @wraps(view)
+        def interna(request, *args, **kwargs):
+            alvo = view_condicional if validadores_disponiveis() else view
+            resposta = alvo(request, *args, **kwargs)
+            patch_cache_control(resposta, private=True, no_cache=True)
+            return resposta
+        return interna
+    return decorador
@@ -0,0 +1,322 @@
+import random
+from datetime import timedelta
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from colaboradores.models import Colaborador
+from emprestimos.models import Emprestimo, ItemEmprestado, HistoricoDevolucao, PosseEquipamento
+from emprestimos.posse import reconstruir_posses
+from emprestimos.kpis import contadores_ativos, reconstruir_contadores
+from equipamentos.models import Equipamento, MovimentacaoEstoque, SaldoEstoque
+from . import busca, cache
+
+# Marcador dos registros sintéticos (matrícula do colaborador e C.A. do
+# equipamento). Permite apagar só eles, sem tocar nos dados reais.
+# O número vem do ID, então dá para gerar mais dados por cima dos atuais.
+PREFIXO = 'SINT'
+
+# Tamanho dos lotes de INSERT (executemany)
+TAMANHO_LOTE = 5000
+
+# Empréstimos gerados por rodada (itens e histórico vão junto)
+EMPRESTIMOS_POR_RODADA = 2000
+
+PRIMEIROS_NOMES = [
+    'Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+    'Isabela', 'João', 'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Otávio', 'Patrícia',
+    'Rafael', 'Sabrina', 'Thiago', 'Vanessa',
+]
+SOBRENOMES = [
+    'Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Carvalho', 'Ferreira',
+    'Rodrigues', 'Almeida', 'Costa', 'Gomes', 'Martins', 'Araújo', 'Ribeiro', 'Barbosa',
+]
+FUNCOES = ['Operador', 'Soldador', 'Eletricista', 'Mecânico', 'Almoxarife', 'Pintor', 'Técnico de Segurança']
+
+# Nomes base de EPIs por categoria (todas as CATEGORIAS_CHOICES)
+EPIS_POR_CATEGORIA = {
+    'CABECA': ['Capacete', 'Capuz', 'Touca Árabe'],
+    'OLHOS': ['Óculos de Proteção', 'Protetor Facial', 'Máscara de Solda'],
+    'AUDITIVA': ['Protetor Auricular Plug', 'Abafador de Ruído'],
+    'RESPIRATORIA': ['Respirador PFF2', 'Máscara Semifacial', 'Filtro Químico'],
+    'TRONCO': ['Avental de Raspa', 'Colete Refletivo'],
+    'MEMBROS_SUP': ['Luva de Raspa', 'Luva Nitrílica', 'Luva Isolante', 'Mangote'],
+    'MEMBROS_INF': ['Botina de Segurança', 'Bota de PVC', 'Perneira'],
+    'CORPO_INTEIRO': ['Macacão Tyvek', 'Cinto Paraquedista'],
+    'OUTRO': ['Creme Protetor', 'Trava-quedas'],
+}
+
+# Proporções "realistas" das devoluções
+CHANCE_COLABORADOR_INATIVO = 0.1
+CHANCE_VENCIDO_CONCLUIDO = 0.8   # empréstimos vencidos já totalmente devolvidos
+CHANCE_VENCIDO_PARCIAL = 0.15    # vencidos com devolução parcial (o resto: nada devolvido)
+CHANCE_NO_PRAZO_PARCIAL = 0.3    # ainda no prazo, com alguma devolução
+STATUS_DEVOLUCAO = [('DEVOLVIDO', 85), ('DANIFICADO', 10), ('PERDIDO', 5)]
+
+
+def _inserir(modelo, campos, linhas):
+    ##
+    ## INSERT em lote direto no banco (executemany), com as colunas na
+    ## ordem de 'campos'. Bem mais rápido que o bulk_create para milhões
+    ## de linhas, porque não cria uma instância do modelo por linha.
+    ##
+    colunas = ', '.join(connection.ops.quote_name(modelo._meta.get_field(campo).column) for campo in campos)
+    marcadores = ', '.join(['%s'] * len(campos))
+    sql = f"INSERT INTO {connection.ops.quote_name(modelo._meta.db_table)} ({colunas}) VALUES ({marcadores})"
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), TAMANHO_LOTE):
+            cursor.executemany(sql, linhas[inicio:inicio + TAMANHO_LOTE])
+
+
+def _proximo_id(modelo):
+    # Os IDs são definidos aqui, para ligar as tabelas sem consultar o banco
+    return (modelo.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+
+
+def _apagar_em_massa(queryset):
+    # DELETE direto no banco, sem carregar os objetos nem disparar sinais
+    # (com centenas de milhares de linhas o delete() do ORM fica lento)
+    sql, parametros = queryset.values('pk').query.sql_with_params()
+    tabela = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabela} WHERE id IN ({sql})", parametros)
+
+
+def existem_dados_sinteticos():
+    return Colaborador.objects.filter(matricula__startswith=PREFIXO).exists()
+
+
+def apagar_dados_sinteticos():
+    ##
+    ## Remove só os registros gerados aqui, dos "filhos" para os "pais".
+    ## Como os sinais não rodam, os dados derivados são recalculados no fim.
+    ##
+    with transaction.atomic():
+        _apagar_em_massa(HistoricoDevolucao.objects.filter(
+            item_emprestado__emprestimo__colaborador__matricula__startswith=PREFIXO
+        ))
+        _apagar_em_massa(ItemEmprestado.objects.filter(emprestimo__colaborador__matricula__startswith=PREFIXO))
+        _apagar_em_massa(Emprestimo.objects.filter(colaborador__matricula__startswith=PREFIXO))
+        _apagar_em_massa(PosseEquipamento.objects.filter(colaborador__matricula__startswith=PREFIXO))
+        _apagar_em_massa(Colaborador.objects.filter(matricula__startswith=PREFIXO))
+        _apagar_em_massa(MovimentacaoEstoque.objects.filter(equipamento__ca__startswith=PREFIXO))
+        _apagar_em_massa(SaldoEstoque.objects.filter(equipamento__ca__startswith=PREFIXO))
+        _apagar_em_massa(Equipamento.objects.filter(ca__startswith=PREFIXO))
+    atualizar_derivados()
+
+
+def gerar_dados(colaboradores=1000, equipamentos=200, emprestimos=5000,
+                itens_por_emprestimo=4, dias=730, semente=42, agora=None, progresso=None):
+    ##
+    ## Gera um conjunto de dados sintético e reproduzível (mesma semente,
+    ## mesmos dados), gravado com INSERTs em lote.
+    ##
+    ## O estoque dos equipamentos fica coerente com os empréstimos
+    ## (disponível = total - pendente; o perdido já saiu do total), o
+    ## quantidade_devolvida dos itens bate com o histórico e o livro de
+    ## estoque tem uma movimentação para cada saída, devolução e perda.
+    ## As datas são relativas a 'agora' (padrão: o momento atual).
+    ## Retorna a quantidade de linhas criadas por tabela.
+    ##
+    aleatorio = random.Random(semente)
+    agora = agora or timezone.now()
+    hoje = timezone.localdate(agora)
+    fuso = timezone.get_current_timezone()
+    data_hora = connection.ops.adapt_datetimefield_value
+    data = connection.ops.adapt_datefield_value
+    status_devolucao = [status for status, _ in STATUS_DEVOLUCAO]
+    pesos_devolucao = [peso for _, peso in STATUS_DEVOLUCAO]
+    totais = {'colaboradores': 0, 'equipamentos': 0, 'emprestimos': 0, 'itens': 0, 'historico': 0, 'movimentacoes': 0}
+
+    def avisar(mensagem):
+        if progresso:
+            progresso(mensagem)
+
+    with transaction.atomic():
+        primeiro = _proximo_id(Colaborador)
+        ids_colaboradores = list(range(primeiro, primeiro + colaboradores))
+        _inserir(Colaborador, ['id', 'nome_completo', 'matricula', 'funcao', 'status', 'data_cadastro'], [
+            (
+                pk,
+                f"{aleatorio.choice(PRIMEIROS_NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}",
+                f"{PREFIXO}{pk:07d}",
+                aleatorio.choice(FUNCOES),
+                'Inativo' if aleatorio.random() < CHANCE_COLABORADOR_INATIVO else 'Ativo',
+                data_hora(agora - timedelta(days=aleatorio.randint(0, dias))),
+            )
+            for pk in ids_colaboradores
+        ])
+        totais['colaboradores'] = colaboradores
+        avisar(f"Colaboradores: {colaboradores}")
+
+        # Estoque zerado por enquanto; é calculado depois dos empréstimos
+        categorias = list(EPIS_POR_CATEGORIA)
+        primeiro = _proximo_id(Equipamento)
+        ids_equipamentos = list(range(primeiro, primeiro + equipamentos))
+        cadastro = data_hora(agora - timedelta(days=dias))
+        linhas = []
+        for pk in ids_equipamentos:
+            categoria = categorias[pk % len(categorias)]
+            linhas.append((
+                pk, f"{aleatorio.choice(EPIS_POR_CATEGORIA[categoria])} {pk:05d}", categoria,
+                f"{PREFIXO}{pk:05d}", 0, 0, cadastro, cadastro,
+            ))
+        _inserir(Equipamento, [
+            'id', 'nome', 'categoria', 'ca', 'estoque_total', 'estoque_disponivel',
+            'data_cadastro', 'data_ultima_atualizacao',
+        ], linhas)
+        totais['equipamentos'] = equipamentos
+        avisar(f"Equipamentos: {equipamentos}")
+
+        # Quanto de cada equipamento está emprestado (pendente) e foi perdido
+        pendentes = dict.fromkeys(ids_equipamentos, 0)
+        perdidos = dict.fromkeys(ids_equipamentos, 0)
+        proximo_emprestimo = _proximo_id(Emprestimo)
+        proximo_item = _proximo_id(ItemEmprestado)
+        proximo_historico = _proximo_id(HistoricoDevolucao)
+        proxima_movimentacao = _proximo_id(MovimentacaoEstoque)
+        campos_movimentacao = ['id', 'equipamento', 'tipo', 'variacao_total', 'variacao_disponivel', 'referencia', 'data']
+
+        for inicio in range(0, emprestimos, EMPRESTIMOS_POR_RODADA):
+            linhas_emprestimos, linhas_itens, linhas_historico, linhas_movimentacoes = [], [], [], []
+
+            for _ in range(min(EMPRESTIMOS_POR_RODADA, emprestimos - inicio)):
+                data_emprestimo = agora - timedelta(minutes=aleatorio.randint(0, dias * 24 * 60))
+                dia_emprestimo = data_emprestimo.astimezone(fuso).date()
+                prevista = dia_emprestimo + timedelta(days=aleatorio.randint(7, 90))
+                vencido = prevista < hoje
+
+                sorteio = aleatorio.random()
+                if vencido:
+                    modo = 'total' if sorteio < CHANCE_VENCIDO_CONCLUIDO else (
+                        'parcial' if sorteio < CHANCE_VENCIDO_CONCLUIDO + CHANCE_VENCIDO_PARCIAL else 'nenhum')
+                else:
+                    modo = 'parcial' if sorteio < CHANCE_NO_PRAZO_PARCIAL else 'nenhum'
+
+                # Janela das devoluções: do empréstimo até 10 dias após a data prevista
+                prazo = (prevista - dia_emprestimo).days + 10
+                fim_janela = min(agora, data_emprestimo + timedelta(days=prazo))
+                janela = max(0, int((fim_janela - data_emprestimo).total_seconds()))
+
+                pendente = False
+                referencia = f"Empréstimo #{proximo_emprestimo}"
+                quantidade_itens = min(equipamentos, aleatorio.randint(1, itens_por_emprestimo))
+                for equipamento in aleatorio.sample(ids_equipamentos, quantidade_itens):
+                    emprestada = aleatorio.randint(1, 3)
+                    if modo == 'total':
+                        processada = emprestada
+                    elif modo == 'parcial':
+                        processada = aleatorio.randint(0, emprestada - 1)
+                    else:
+                        processada = 0
+                    pendente = pendente or processada < emprestada
+                    linhas_movimentacoes.append((
+                        proxima_movimentacao, equipamento, MovimentacaoEstoque.SAIDA, 0, -emprestada,
+                        referencia, data_hora(data_emprestimo),
+                    ))
+                    proxima_movimentacao += 1
+
+                    # Divide o que foi processado em um ou mais registros de histórico
+                    restante, perdido = processada, 0
+                    while restante:
+                        parte = aleatorio.randint(1, restante)
+                        status = aleatorio.choices(status_devolucao, weights=pesos_devolucao)[0]
+                        devolucao = data_emprestimo + timedelta(seconds=aleatorio.randint(0, janela))
+                        linhas_historico.append(
+                            (proximo_historico, proximo_item, parte, data_hora(devolucao), status)
+                        )
+                        proximo_historico += 1
+                        if status == 'PERDIDO':
+                            perdido += parte
+                            movimentacao = (MovimentacaoEstoque.PERDA, -parte, 0)
+                        else:
+                            movimentacao = (MovimentacaoEstoque.DEVOLUCAO, 0, parte)
+                        linhas_movimentacoes.append(
+                            (proxima_movimentacao, equipamento, *movimentacao, referencia, data_hora(devolucao))
+                        )
+                        proxima_movimentacao += 1
+                        restante -= parte
+
+                    linhas_itens.append((
+                        proximo_item, proximo_emprestimo, equipamento, emprestada, processada,
+                        'PENDENTE' if processada < emprestada else 'CONCLUIDO',
+                    ))
+                    proximo_item += 1
+                    pendentes[equipamento] += emprestada - processada
+                    perdidos[equipamento] += perdido
+
+                if not pendente:
+                    status = 'DEVOLVIDO'
+                elif vencido:
+                    # O mesmo que a varredura diária (marcar_atrasados) faria
+                    status = 'ATRASADO'
+                else:
+                    status = 'ATIVO'
+                linhas_emprestimos.append((
+                    proximo_emprestimo, aleatorio.choice(ids_colaboradores),
+                    data_hora(data_emprestimo), data(prevista), status,
+                ))
+                proximo_emprestimo += 1
+
+            _inserir(Emprestimo, ['id', 'colaborador', 'data_emprestimo', 'data_prevista_devolucao', 'status'],
+                     linhas_emprestimos)
+            _inserir(ItemEmprestado, [
+                'id', 'emprestimo', 'equipamento', 'quantidade_emprestada', 'quantidade_devolvida', 'status_item',
+            ], linhas_itens)
+            _inserir(HistoricoDevolucao, [
+                'id', 'item_emprestado', 'quantidade_devolvida', 'data_devolucao', 'status_devolucao',
+            ], linhas_historico)
+            _inserir(MovimentacaoEstoque, campos_movimentacao, linhas_movimentacoes)
+
+            totais['emprestimos'] += len(linhas_emprestimos)
+            totais['itens'] += len(linhas_itens)
+            totais['historico'] += len(linhas_historico)
+            totais['movimentacoes'] += len(linhas_movimentacoes)
+            avisar(f"Empréstimos: {totais['emprestimos']}/{emprestimos}")
+
+        # Estoque final: uma sobra aleatória + o que está emprestado.
+        # A entrada no cadastro cobre também o que foi perdido depois.
+        estoques, entradas = [], []
+        for pk in ids_equipamentos:
+            disponivel = aleatorio.randint(0, 100)
+            total = disponivel + pendentes[pk]
+            estoques.append((total, disponivel, pk))
+            compra = total + perdidos[pk]
+            entradas.append((proxima_movimentacao, pk, MovimentacaoEstoque.ENTRADA, compra, compra, 'Cadastro', cadastro))
+            proxima_movimentacao += 1
+        _inserir(MovimentacaoEstoque, campos_movimentacao, entradas)
+        totais['movimentacoes'] += len(entradas)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "UPDATE {} SET {} = %s, {} = %s WHERE id = %s".format(
+                    *map(connection.ops.quote_name, [
+                        Equipamento._meta.db_table, 'estoque_total', 'estoque_disponivel',
+                    ])
+                ),
+                estoques,
+            )
+
+            # Com IDs definidos aqui, as sequências do PostgreSQL precisam ser ajustadas
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Colaborador, Equipamento, Emprestimo, ItemEmprestado, HistoricoDevolucao, MovimentacaoEstoque]
+            ):
+                cursor.execute(sql)
+
+    # Os INSERTs diretos não disparam sinais: atualiza o que depende deles
+    atualizar_derivados()
+    return totais
+
+
+def atualizar_derivados():
+    ##
+    ## Recalcula as estruturas que normalmente são mantidas pelos sinais
+    ## e pelas views: contadores do painel, posse de equipamentos por
+    ## colaborador, índice de busca e as versões do cache.
+    ##
+    reconstruir_posses()
+    if contadores_ativos():
+        reconstruir_contadores()
+    if busca.indice_disponivel():
+        busca.reconstruir_indice()
+    cache.invalidar(*cache.ENTIDADES)
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+# Quantas requisições de cada view ficam guardadas no buffer circular
+TAMANHO_BUFFER_PADRAO = 200
+
+# Quantas consultas repetidas de cada requisição são guardadas
+LIMITE_REPETIDAS = 5
+
+# Medição da requisição em andamento (None fora do middleware)
+_medicao_atual = ContextVar('medicao_diagnostico', default=None)
+
+
+@dataclass
+class Medicao:
+    ##
+    ## Números de uma requisição: consultas SQL, tempo no banco,
+    ## tempo renderizando templates e tempo total (em ms).
+    ##
+    consultas: int = 0
+    tempo_sql: float = 0.0
+    tempo_template: float = 0.0
+    tempo_total: float = 0.0
+    sql_executados: Counter = field(default_factory=Counter)
+    renderizando: bool = False
+
+    def repetidas(self):
+        # Só interessa o que rodou mais de uma vez (sinal de N+1)
+        return [(sql, vezes) for sql, vezes in self.sql_executados.most_common(LIMITE_REPETIDAS) if vezes > 1]
+
+
+def medicao_atual():
+    return _medicao_atual.get()
+
+
+def iniciar_medicao():
+    medicao = Medicao()
+    return medicao, _medicao_atual.set(medicao)
+
+
+def encerrar_medicao(token):
+    _medicao_atual.reset(token)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    ##
+    ## Usado com connection.execute_wrapper: cronometra cada consulta
+    ## e conta o texto SQL (com os %s, sem os valores) para achar repetições.
+    ##
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_sql += (time.perf_counter() - inicio) * 1000
+        medicao.consultas += 1
+        medicao.sql_executados[sql] += 1
+
+
+def percentil(valores_ordenados, p):
+    # Percentil pelo método do "rank mais próximo"
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+class RegistroDiagnostico:
+    ##
+    ## Guarda em memória as últimas medições de cada view em buffers
+    ## circulares (deque com maxlen), então o consumo de memória é fixo.
+    ## Os dados são por processo e somem quando o servidor reinicia.
+    ##
+    def __init__(self, tamanho=None):
+        self.tamanho = tamanho
+        self._buffers = {}
+        self._trava = threading.Lock()
+
+    def _tamanho(self):
+        return self.tamanho or getattr(settings, 'DIAGNOSTICO_TAMANHO_BUFFER', TAMANHO_BUFFER_PADRAO)
+
+    def registrar(self, view, medicao):
+        buffer = self._buffers.get(view)
+        if buffer is None:
+            with self._trava:
+                buffer = self._buffers.setdefault(view, deque(maxlen=self._tamanho()))
+        buffer.append((medicao.tempo_total, medicao.consultas, medicao.tempo_sql,
+                       medicao.tempo_template, medicao.repetidas()))
+
+    def limpar(self):
+        with self._trava:
+            self._buffers.clear()
+
+    def resumo(self):
+        ##
+        ## Uma linha por view, das mais lentas (p95) para as mais rápidas,
+        ## com as consultas que mais se repetiram dentro de uma requisição.
+        ##
+        linhas = []
+        for view, buffer in list(self._buffers.items()):
+            registros = list(buffer)
+            if not registros:
+                continue
+            tempos = sorted(r[0] for r in registros)
+            repetidas = Counter()
+            for registro in registros:
+                for sql, vezes in registro[4]:
+                    repetidas[sql] = max(repetidas[sql], vezes)
+            linhas.append({
+                'view': view,
+                'requisicoes': len(registros),
+                'p50': percentil(tempos, 50),
+                'p95': percentil(tempos, 95),
+                'p99': percentil(tempos, 99),
+                'consultas_media': sum(r[1] for r in registros) / len(registros),
+                'consultas_max': max(r[1] for r in registros),
+                'sql_medio': sum(r[2] for r in registros) / len(registros),
+                'template_medio': sum(r[3] for r in registros) / len(registros),
+                'repetidas': repetidas.most_common(LIMITE_REPETIDAS),
+            })
+        linhas.sort(key=lambda linha: linha['p95'], reverse=True)
+        return linhas
+
+
+# Registro único do processo, usado pelo middleware e pela página de diagnóstico
+registro = RegistroDiagnostico()
+
+
+class TemplateMedido(Template):
+    ##
+    ## Template do Django que soma o tempo de renderização na medição
+    ## da requisição. Os {% include %} ficam dentro do template
+    ## principal, então só o nível mais externo é cronometrado.
+    ##
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None or medicao.renderizando:
+            return super().render(context, request)
+        medicao.renderizando = True
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.tempo_template += (time.perf_counter() - inicio) * 1000
+            medicao.renderizando = False
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    ##
+    ## Backend de templates igual ao padrão, mas devolvendo TemplateMedido.
+    ## Configurado em TEMPLATES['BACKEND'] no settings.
+    ##
+    def from_string(self, template_code):
+        return TemplateMedido(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TemplateMedido(super().get_template(template_name).template, self)
@@ -0,0 +1,287 @@
+import gzip
+import mimetypes
+import os
+import re
+import warnings
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+## --- Arquivos estáticos (CSS, JS) ---
+## No collectstatic cada arquivo ganha o hash do conteúdo no nome
+## (style.css -> style.3f2a1b9c0d4e.css) e, depois, o CSS e o JS são
+## minificados e recebem versões .gz e .br ao lado. Um nome com hash
+## nunca muda de conteúdo: pode ficar no cache do navegador para sempre.
+
+# Tipos que valem a pena comprimir (imagens e fontes já são comprimidas)
+EXTENSOES_COMPRIMIR = ('.css', '.js', '.svg', '.txt', '.json', '.map')
+
+# Um ano: o máximo que os navegadores respeitam
+CACHE_IMUTAVEL = 365 * 24 * 60 * 60
+
+# Nomes sem hash (ex.: /static/style.css) podem mudar a cada deploy
+CACHE_SEM_HASH = 60
+
+
+# Strings do CSS ("..." ou '...') ou um comentário
+_STRING_OU_COMENTARIO_CSS = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.S)
+
+
+def _compactar_css(texto):
+    texto = re.sub(r'\s+', ' ', texto)
+    texto = re.sub(r'\s*([{};>])\s*', r'\1', texto)
+    texto = re.sub(r'\s*,\s*', ',', texto)
+    # Só o espaço DEPOIS do ':' (antes, como em '.menu :focus', ele conta)
+    texto = re.sub(r':\s+', ':', texto)
+    return texto.replace(';}', '}')
+
+
+def minificar_css(texto):
+    ##
+    ## Remove comentários e espaços que não mudam o significado.
+    ## Strings ficam como estão: em content: "a, b" ou em um nome de
+    ## fonte, os espaços e as vírgulas fazem parte do valor.
+    ##
+    partes = []
+    codigo = ''  # CSS fora das strings, já sem os comentários
+    inicio = 0
+    for achado in _STRING_OU_COMENTARIO_CSS.finditer(texto):
+        codigo += texto[inicio:achado.start()]
+        inicio = achado.end()
+        if achado.group(1):
+            partes += [_compactar_css(codigo), achado.group(1)]
+            codigo = ''
+    partes.append(_compactar_css(codigo + texto[inicio:]))
+    return ''.join(partes).strip()
+
+
+# Palavras depois das quais uma '/' começa uma expressão regular
+_ANTES_DE_REGEX = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+
+def _inicia_regex(codigo):
+    # '/' é divisão depois de um valor (nome, número, ')' ou ']')
+    anterior = codigo.rstrip()
+    if not anterior:
+        return True
+    if anterior[-1] in ')]':
+        return False
+    if anterior[-1].isalnum() or anterior[-1] in '_$':
+        palavra = re.search(r'[\w$]+$', anterior).group()
+        return palavra in _ANTES_DE_REGEX
+    return True
+
+
+def _fim_literal(texto, i, delimitador):
+    # Posição logo depois do fim de uma string ('...', "...") ou regex
+    # (/.../flags), respeitando os escapes e, na regex, o [...]
+    em_classe = False
+    while i < len(texto):
+        caractere = texto[i]
+        if caractere == '\\':
+            i += 2
+            continue
+        if delimitador == '/' and caractere == '[':
+            em_classe = True
+        elif delimitador == '/' and caractere == ']':
+            em_classe = False
+        elif caractere == delimitador and not em_classe:
+            i += 1
+            if delimitador == '/':
+                while i < len(texto) and (texto[i].isalnum() or texto[i] == '_'):
+                    i += 1
+            return i
+        elif caractere == '\n' and delimitador != '`':
+            return i
+        i += 1
+    return i
+
+
+def _fim_template(texto, i):
+    # Posição logo depois do ` que fecha a template string; o que está
+    # em ${...} é código (pode ter strings e outras templates dentro)
+    while i < len(texto):
+        caractere = texto[i]
+        if caractere == '\\':
+            i += 2
+        elif caractere == '`':
+            return i + 1
+        elif texto.startswith('${', i):
+            i += 2
+            chaves = 1
+            while i < len(texto) and chaves:
+                if texto[i] in '\'"':
+                    i = _fim_literal(texto, i + 1, texto[i])
+                    continue
+                if texto[i] == '`':
+                    i = _fim_template(texto, i + 1)
+                    continue
+                chaves += {'{': 1, '}': -1}.get(texto[i], 0)
+                i += 1
+        else:
+            i += 1
+    return i
+
+
+def minificar_js(texto):
+    ##
+    ## Minificação conservadora: tira a indentação, os espaços no fim das
+    ## linhas, as linhas em branco e os comentários. Strings, template
+    ## strings (`...`, com as quebras de linha) e expressões regulares
+    ## são copiadas como estão, então um '//' dentro delas não é
+    ## confundido com comentário. O resto do código não é reescrito.
+    ##
+    saida = []
+    linha = ''  # linha de saída em montagem
+    i = 0
+    while i < len(texto):
+        caractere = texto[i]
+        if caractere in '\r\n':
+            linha = linha.rstrip()
+            if linha:
+                saida.append(linha)
+            linha = ''
+            i += 1
+        elif caractere in ' \t' and not linha:
+            i += 1
+        elif texto.startswith('//', i):
+            while i < len(texto) and texto[i] not in '\r\n':
+                i += 1
+        elif texto.startswith('/*', i):
+            fim = texto.find('*/', i + 2)
+            fim = len(texto) if fim < 0 else fim + 2
+            if '\n' in texto[i:fim]:
+                # Comentário de várias linhas: conta como uma quebra de linha
+                linha = linha.rstrip()
+                if linha:
+                    saida.append(linha)
+                linha = ''
+            elif linha and not linha[-1].isspace():
+                # No meio da linha, ainda separa as palavras
+                linha += ' '
+            i = fim
+        elif caractere in '\'"' or (caractere == '/' and _inicia_regex(linha or (saida[-1] if saida else ''))):
+            fim = _fim_literal(texto, i + 1, caractere)
+            linha += texto[i:fim]
+            i = fim
+        elif caractere == '`':
+            fim = _fim_template(texto, i + 1)
+            linha += texto[i:fim]
+            i = fim
+        else:
+            linha += caractere
+            i += 1
+    linha = linha.rstrip()
+    if linha:
+        saida.append(linha)
+    return '\n'.join(saida) + '\n'
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+def _brotli():
+    # O pacote brotli é opcional: sem ele só as versões .gz são gravadas
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _comprimir(caminho, dados):
+    # Grava caminho.gz e, se o pacote brotli estiver instalado, caminho.br
+    # (só quando a versão comprimida é menor que o original)
+    comprimidos = {'.gz': gzip.compress(dados, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        comprimidos['.br'] = brotli.compress(dados, quality=11)
+    for extensao, conteudo in comprimidos.items():
+        if len(conteudo) < len(dados):
+            with open(caminho + extensao, 'wb') as arquivo:
+                arquivo.write(conteudo)
+
+
+class ArmazenamentoEstatico(ManifestStaticFilesStorage):
+    ##
+    ## ManifestStaticFilesStorage (nomes com hash) que, ao fim do
+    ## collectstatic, minifica o CSS/JS e grava as versões comprimidas
+    ## dos arquivos com hash.
+    ## Sem collectstatic (desenvolvimento e testes) o manifesto não existe
+    ## e {% static %} devolve o nome original em vez de dar erro.
+    ##
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        if _brotli() is None:
+            # Avisa no collectstatic em vez de deixar o .br faltar em silêncio
+            warnings.warn(
+                'O pacote brotli não está instalado: os estáticos terão só a versão .gz '
+                '(pip install brotli).',
+                RuntimeWarning,
+            )
+        for nome in set(self.hashed_files.values()):
+            self.otimizar(nome)
+
+    def otimizar(self, nome):
+        extensao = os.path.splitext(nome)[1].lower()
+        if extensao not in EXTENSOES_COMPRIMIR:
+            return
+        caminho = self.path(nome)
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+        if extensao in MINIFICADORES:
+            dados = MINIFICADORES[extensao](dados.decode('utf-8')).encode('utf-8')
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(dados)
+        _comprimir(caminho, dados)
+
+
+# Content-Encoding de cada versão, na ordem de preferência
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def servir_estatico(request, caminho):
+    ##
+    ## Serve o STATIC_ROOT quando o próprio Django atende os estáticos
+    ## (SERVIR_ESTATICOS, sem nginx na frente). Entrega a versão .br/.gz
+    ## que o navegador aceitar e, para nomes com hash, cache de um ano
+    ## marcado como imutável (o navegador nem revalida).
+    ##
+    try:
+        completo = safe_join(settings.STATIC_ROOT, caminho)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(completo):
+        raise Http404
+
+    aceitas = request.headers.get('Accept-Encoding', '')
+    enviado, codificacao = completo, None
+    for nome, extensao in CODIFICACOES:
+        if nome in aceitas and os.path.isfile(completo + extensao):
+            enviado, codificacao = completo + extensao, nome
+            break
+
+    tipo = mimetypes.guess_type(completo)[0] or 'application/octet-stream'
+    resposta = FileResponse(open(enviado, 'rb'), content_type=tipo)
+    if codificacao:
+        resposta['Content-Encoding'] = codificacao
+    patch_vary_headers(resposta, ['Accept-Encoding'])
+
+    if caminho in staticfiles_storage.hashed_files.values():
+        patch_cache_control(resposta, public=True, max_age=CACHE_IMUTAVEL, immutable=True)
+    else:
+        patch_cache_control(resposta, public=True, max_age=CACHE_SEM_HASH)
+    return resposta
@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.models import User
+from .fotos import TAMANHOS, apagar_nao_usadas, normalizar_foto
 from .models import UserProfile
 
 class UserUpdateForm(forms.ModelForm):
@@ -17,4 +18,22 @@ class ProfileUpdateForm(forms.ModelForm):
         fields = ['foto']
         widgets = {
             'foto': forms.FileInput(attrs={'class': 'form-control-file'})
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Versões atuais, para apagar depois de trocar a foto
+        self.fotos_anteriores = [getattr(self.instance, campo).name for campo in TAMANHOS]
+
+    def save(self, commit=True):
+        ##
+        ## A foto enviada não é gravada como veio: vira as versões em WebP
+        ## de core/fotos.py (miniatura do menu e foto da página de perfil).
+        ##
+        perfil = super().save(commit=False)
+        if 'foto' in self.changed_data and self.cleaned_data.get('foto'):
+            normalizar_foto(perfil, self.cleaned_data['foto'])
+        if commit:
+            perfil.save()
+            apagar_nao_usadas(UserProfile.objects.all(), self.fotos_anteriores)
+        return perfil
\ No newline at end of file
@@ -0,0 +1,99 @@
+import hashlib
+import io
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils.html import escape
+from PIL import Image, ImageOps
+
+## --- Fotos de perfil ---
+## A foto enviada vira dois quadrados em WebP (o original não é guardado)
+## com o hash do conteúdo no nome: a mesma URL sempre aponta para o mesmo
+## arquivo e pode ficar no cache do navegador para sempre.
+
+PASTA = 'perfil'
+
+# Campo do UserProfile -> lado do quadrado em pixels (o dobro do tamanho
+# exibido, para telas de alta densidade)
+TAMANHOS = {
+    'foto': 300,             # página de perfil (150x150)
+    'foto_miniatura': 80,    # rodapé do menu lateral (40x40)
+}
+
+QUALIDADE_WEBP = 80
+
+# Cores do avatar com iniciais (as mesmas do antigo placehold.co)
+COR_FUNDO = '#FFFFFF'
+COR_TEXTO = '#1E6043'
+
+
+def nome_arquivo(conteudo, lado):
+    # 16 caracteres do sha256 bastam para não haver colisão entre fotos
+    return f"{PASTA}/{hashlib.sha256(conteudo).hexdigest()[:16]}_{lado}.webp"
+
+
+def redimensionar(conteudo, lado):
+    ##
+    ## Corta o centro da imagem em um quadrado de 'lado' pixels e devolve
+    ## os bytes em WebP. Respeita a orientação gravada pela câmera (EXIF).
+    ##
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        # JPEG: decodifica direto em uma escala menor (bem mais rápido)
+        imagem.draft('RGB', (lado * 2, lado * 2))
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem = imagem.convert('RGBA' if imagem.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        quadrado = ImageOps.fit(imagem, (lado, lado), Image.LANCZOS)
+        saida = io.BytesIO()
+        quadrado.save(saida, 'WEBP', quality=QUALIDADE_WEBP, method=6)
+    return saida.getvalue()
+
+
+def normalizar_foto(perfil, arquivo):
+    ##
+    ## Grava as versões de 'arquivo' (upload ou arquivo aberto) e aponta os
+    ## campos de TAMANHOS do perfil para elas (sem salvar o perfil).
+    ## Arquivo que já existe (mesma foto enviada de novo) é reaproveitado.
+    ##
+    arquivo.seek(0)
+    conteudo = arquivo.read()
+    for campo, lado in TAMANHOS.items():
+        storage = perfil._meta.get_field(campo).storage
+        nome = nome_arquivo(conteudo, lado)
+        if not storage.exists(nome):
+            nome = storage.save(nome, ContentFile(redimensionar(conteudo, lado)))
+        # Atribui o nome (e não o upload): o original não é gravado
+        setattr(perfil, campo, nome)
+
+
+def apagar_nao_usadas(perfis, nomes):
+    ##
+    ## Apaga os arquivos de 'nomes' (versões antigas) que nenhum perfil
+    ## de 'perfis' usa mais. A mesma foto enviada por dois usuários é um
+    ## arquivo só, por isso a conferência antes de apagar.
+    ##
+    for nome in {nome for nome in nomes if nome}:
+        em_uso = Q()
+        for campo in TAMANHOS:
+            em_uso |= Q(**{campo: nome})
+        if not perfis.filter(em_uso).exists():
+            perfis.model._meta.get_field('foto').storage.delete(nome)
+
+
+def iniciais(user):
+    # "Ana Lima" -> "AL"; sem nome, a primeira letra do login
+    partes = user.get_full_name().split() or [user.username]
+    letras = partes[0][:1] + (partes[-1][:1] if len(partes) > 1 else '')
+    return letras.upper() or '?'
+
+
+@lru_cache(maxsize=1024)
+def avatar_svg(letras):
+    # Gerado uma vez por processo para cada conjunto de iniciais
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="80" height="80" viewBox="0 0 80 80">'
+        f'<rect width="80" height="80" fill="{COR_FUNDO}"/>'
+        f'<text x="40" y="40" dy=".35em" text-anchor="middle" fill="{COR_TEXTO}" '
+        'font-family="Segoe UI, Helvetica, Arial, sans-serif" font-size="32" font-weight="600">'
+        f'{escape(letras)}</text></svg>'
+    )
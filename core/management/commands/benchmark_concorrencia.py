@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import ROTAS_CONCORRENCIA, executar_benchmark_concorrencia, listar_rotas
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara WSGI e ASGI com várias requisições ao mesmo tempo (requisições por "
+        "segundo, p50 e p95) e grava o resultado em JSON. Rode antes 'gerar_dados_sinteticos'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=8, help="Requisições em andamento ao mesmo tempo.")
+        parser.add_argument('--requisicoes', type=int, default=200, help="Requisições por rota em cada handler.")
+        parser.add_argument(
+            '--rota', action='append', dest='rotas',
+            help=f"Mede só esta rota (pode repetir). Padrão: {', '.join(ROTAS_CONCORRENCIA)}.",
+        )
+        parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: imprime na tela).")
+
+    def handle(self, *args, **options):
+        if options['concorrencia'] < 1 or options['requisicoes'] < 1:
+            raise CommandError("--concorrencia e --requisicoes precisam ser pelo menos 1.")
+        desconhecidas = set(options['rotas'] or []) - set(listar_rotas())
+        if desconhecidas:
+            raise CommandError(f"Rotas desconhecidas: {', '.join(sorted(desconhecidas))}")
+
+        progresso = self.stderr.write if options['saida'] is None else self.stdout.write
+        resultado = executar_benchmark_concorrencia(
+            concorrencia=options['concorrencia'],
+            requisicoes=options['requisicoes'],
+            rotas=options['rotas'],
+            progresso=progresso,
+        )
+        texto = json.dumps(resultado, indent=2, sort_keys=True, ensure_ascii=False)
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}."))
+        else:
+            self.stdout.write(texto)
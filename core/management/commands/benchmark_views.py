@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import executar_benchmark, listar_rotas
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede todas as rotas do sistema (latência, número de consultas e pico de memória) "
+        "e grava o resultado em JSON. Rode antes 'gerar_dados_sinteticos'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=10, help="Execuções cronometradas por rota.")
+        parser.add_argument('--rota', action='append', dest='rotas', help="Mede só esta rota (pode repetir).")
+        parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: imprime na tela).")
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError("--repeticoes precisa ser pelo menos 1.")
+        desconhecidas = set(options['rotas'] or []) - set(listar_rotas())
+        if desconhecidas:
+            raise CommandError(f"Rotas desconhecidas: {', '.join(sorted(desconhecidas))}")
+
+        progresso = self.stderr.write if options['saida'] is None else self.stdout.write
+        resultado = executar_benchmark(
+            repeticoes=options['repeticoes'],
+            rotas=options['rotas'],
+            progresso=progresso,
+        )
+        texto = json.dumps(resultado, indent=2, sort_keys=True, ensure_ascii=False)
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}."))
+        else:
+            self.stdout.write(texto)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import dados_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um conjunto de dados sintético e reproduzível (colaboradores, equipamentos, "
+        "empréstimos e histórico de devoluções) para testes de desempenho."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colaboradores', type=int, default=1000)
+        parser.add_argument('--equipamentos', type=int, default=200)
+        parser.add_argument('--emprestimos', type=int, default=5000)
+        parser.add_argument('--itens', type=int, default=4, help="Máximo de itens por empréstimo.")
+        parser.add_argument('--dias', type=int, default=730, help="Período (em dias) coberto pelos empréstimos.")
+        parser.add_argument('--semente', type=int, default=42, help="Mesma semente, mesmos dados.")
+        parser.add_argument(
+            '--limpar', action='store_true',
+            help="Apaga os dados sintéticos gerados antes (os dados reais não são tocados).",
+        )
+
+    def handle(self, *args, **options):
+        if options['equipamentos'] < 1 or options['colaboradores'] < 1:
+            raise CommandError("Informe pelo menos 1 colaborador e 1 equipamento.")
+
+        if dados_sinteticos.existem_dados_sinteticos():
+            if not options['limpar']:
+                raise CommandError("Já existem dados sintéticos. Use --limpar para gerar de novo.")
+            self.stdout.write("Apagando dados sintéticos anteriores...")
+            dados_sinteticos.apagar_dados_sinteticos()
+
+        inicio = time.perf_counter()
+        try:
+            totais = dados_sinteticos.gerar_dados(
+                colaboradores=options['colaboradores'],
+                equipamentos=options['equipamentos'],
+                emprestimos=options['emprestimos'],
+                itens_por_emprestimo=options['itens'],
+                dias=options['dias'],
+                semente=options['semente'],
+                progresso=self.stdout.write,
+            )
+        except RuntimeError as erro:
+            raise CommandError(str(erro))
+
+        duracao = time.perf_counter() - inicio
+        linhas = sum(totais.values())
+        for tabela, total in totais.items():
+            self.stdout.write(f"{tabela}: {total}")
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linhas geradas em {duracao:.1f}s."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.fotos import apagar_nao_usadas, normalizar_foto
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as versões em WebP (com hash no nome) das fotos de perfil "
+        "enviadas antes delas existirem e apaga os originais."
+    )
+
+    def handle(self, *args, **options):
+        pendentes = UserProfile.objects.exclude(Q(foto='') | Q(foto__isnull=True)).filter(
+            Q(foto_miniatura='') | Q(foto_miniatura__isnull=True)
+        )
+
+        convertidas = 0
+        for perfil in pendentes:
+            original = perfil.foto.name
+            try:
+                with perfil.foto.open('rb') as arquivo:
+                    normalizar_foto(perfil, arquivo)
+            except (OSError, ValueError) as erro:
+                self.stdout.write(self.style.WARNING(f"{perfil.user}: foto ignorada ({erro})."))
+                continue
+            perfil.save(update_fields=['foto', 'foto_miniatura'])
+            apagar_nao_usadas(UserProfile.objects.all(), [original])
+            convertidas += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{convertidas} foto(s) de perfil convertida(s)."))
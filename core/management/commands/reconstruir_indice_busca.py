@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.busca import indice_disponivel, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = "Apaga e recria o índice de busca textual (FTS5) de colaboradores, equipamentos e empréstimos."
+
+    def handle(self, *args, **options):
+        if not indice_disponivel():
+            self.stdout.write(self.style.WARNING(
+                "Índice de busca indisponível (banco não é SQLite com FTS5). Nada a fazer."
+            ))
+            return
+        totais = reconstruir_indice()
+        for tipo, total in totais.items():
+            self.stdout.write(f"{tipo}: {total}")
+        self.stdout.write(self.style.SUCCESS("Índice de busca reconstruído."))
@@ -0,0 +1,86 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.middleware.gzip import GZipMiddleware
+
+from . import diagnostico
+
+
+class DiagnosticoMiddleware:
+    ##
+    ## Mede cada requisição: quantidade de consultas SQL, tempo no banco,
+    ## tempo de template e tempo total. Devolve os números no cabeçalho
+    ## Server-Timing (aparece na aba "Rede/Timing" do navegador) e guarda
+    ## no registro em memória que alimenta a página /sistema/diagnostico/.
+    ##
+    ## Fica no topo do MIDDLEWARE para medir também sessão e autenticação.
+    ## Funciona no WSGI e no ASGI (sem forçar as views async a rodar em
+    ## thread): as consultas são medidas pelo wrapper que core/signals.py
+    ## instala em toda conexão, e a medição segue a requisição por um
+    ## ContextVar (que o sync_to_async leva para as threads do ORM).
+    ##
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao, token = diagnostico.iniciar_medicao()
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            diagnostico.encerrar_medicao(token)
+        return self._registrar(request, response, medicao, inicio)
+
+    async def __acall__(self, request):
+        medicao, token = diagnostico.iniciar_medicao()
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            diagnostico.encerrar_medicao(token)
+        return self._registrar(request, response, medicao, inicio)
+
+    def _registrar(self, request, response, medicao, inicio):
+        medicao.tempo_total = (time.perf_counter() - inicio) * 1000
+
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={medicao.tempo_sql:.1f};desc="{medicao.consultas} consultas"',
+            f'tpl;dur={medicao.tempo_template:.1f};desc="Templates"',
+            f'total;dur={medicao.tempo_total:.1f};desc="Total"',
+        ])
+
+        # Só registra requisições que caíram em uma view conhecida
+        rota = getattr(request, 'resolver_match', None)
+        if rota is not None:
+            diagnostico.registro.registrar(rota.view_name, medicao)
+        return response
+
+
+class CompressaoMiddleware(GZipMiddleware):
+    ##
+    ## GZipMiddleware do Django (que já embaralha o tamanho da resposta
+    ## contra o ataque BREACH ao token CSRF) só para respostas que valem
+    ## a pena: texto, a partir de TAMANHO_MINIMO bytes e nunca as enviadas
+    ## aos poucos (exportação CSV, download das fichas e os estáticos, que
+    ## já têm as versões .gz/.br).
+    ##
+    TAMANHO_MINIMO = 1024
+    TIPOS = {
+        'text/html', 'text/plain', 'text/css', 'text/javascript',
+        'application/javascript', 'application/json', 'image/svg+xml',
+    }
+
+    def process_response(self, request, response):
+        if response.streaming:
+            return response
+        tipo = response.get('Content-Type', '').split(';')[0].strip()
+        if tipo not in self.TIPOS or len(response.content) < self.TAMANHO_MINIMO:
+            return response
+        return super().process_response(request, response)
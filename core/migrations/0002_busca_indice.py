@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def criar_indice_busca(apps, schema_editor):
+    # Índice FTS5 (só existe no SQLite). Sem acento, sem maiúsculas,
+    # com prefixos de 2 e 3 letras pré-calculados para o autocomplete.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS busca_indice USING fts5("
+            "tipo UNINDEXED, objeto_id UNINDEXED, titulo, texto, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        # SQLite compilado sem FTS5: as telas usam a busca com icontains
+        pass
+
+
+def remover_indice_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS busca_indice")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("colaboradores", "0002_alter_colaborador_matricula"),
+        ("equipamentos", "0002_alter_equipamento_estoque_total_and_more"),
+        ("emprestimos", "0006_itememprestado_quantidade_devolvida"),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
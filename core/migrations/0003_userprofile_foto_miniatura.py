@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_busca_indice"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="foto_miniatura",
+            field=models.ImageField(blank=True, null=True, upload_to="perfil/"),
+        ),
+    ]
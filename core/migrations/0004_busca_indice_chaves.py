@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Mesma fórmula de core.busca.chave_documento (cópia: a migração não pode
+# depender do código atual do módulo)
+CODIGOS_TIPO = {"colaborador": 1, "equipamento": 2, "emprestimo": 3}
+
+
+def preencher_indice_busca(apps, schema_editor):
+    ##
+    ## Recria o conteúdo do índice com o rowid de cada documento vindo de
+    ## (tipo, id) e preenche com os registros que já existem: bancos que
+    ## rodaram a 0002 ficaram com o índice vazio, e as buscas das telas
+    ## não achavam nada até alguém rodar 'reconstruir_indice_busca'.
+    ## Tudo em INSERT ... SELECT (sem trazer os registros para o Python).
+    ##
+    conexao = schema_editor.connection
+    if conexao.vendor != "sqlite" or "busca_indice" not in conexao.introspection.table_names():
+        return
+
+    Colaborador = apps.get_model("colaboradores", "Colaborador")
+    Equipamento = apps.get_model("equipamentos", "Equipamento")
+    Emprestimo = apps.get_model("emprestimos", "Emprestimo")
+    ItemEmprestado = apps.get_model("emprestimos", "ItemEmprestado")
+    colaboradores = Colaborador._meta.db_table
+    equipamentos = Equipamento._meta.db_table
+
+    # Rótulo da categoria também entra no texto (ex: "Proteção das Mãos")
+    categorias = Equipamento._meta.get_field("categoria").choices
+    rotulo = "CASE categoria " + " ".join(["WHEN %s THEN %s"] * len(categorias)) + " ELSE '' END"
+    parametros_rotulo = [str(parte) for escolha in categorias for parte in escolha]
+
+    with conexao.cursor() as cursor:
+        cursor.execute("DELETE FROM busca_indice")
+        cursor.execute(
+            "INSERT INTO busca_indice (rowid, tipo, objeto_id, titulo, texto) "
+            f"SELECT id * 4 + {CODIGOS_TIPO['colaborador']}, 'colaborador', id, nome_completo, "
+            f"matricula || ' ' || COALESCE(funcao, '') FROM {colaboradores}"
+        )
+        cursor.execute(
+            "INSERT INTO busca_indice (rowid, tipo, objeto_id, titulo, texto) "
+            f"SELECT id * 4 + {CODIGOS_TIPO['equipamento']}, 'equipamento', id, nome, "
+            f"COALESCE(ca, '') || ' ' || categoria || ' ' || {rotulo} FROM {equipamentos}",
+            parametros_rotulo,
+        )
+        cursor.execute(
+            "INSERT INTO busca_indice (rowid, tipo, objeto_id, titulo, texto) "
+            f"SELECT e.id * 4 + {CODIGOS_TIPO['emprestimo']}, 'emprestimo', e.id, c.nome_completo, "
+            "e.id || ' ' || c.matricula || ' ' || COALESCE(("
+            f"  SELECT group_concat(q.nome, ' ') FROM {ItemEmprestado._meta.db_table} i "
+            f"  JOIN {equipamentos} q ON q.id = i.equipamento_id WHERE i.emprestimo_id = e.id"
+            "), '') "
+            f"FROM {Emprestimo._meta.db_table} e JOIN {colaboradores} c ON c.id = e.colaborador_id"
+        )
+        cursor.execute("INSERT INTO busca_indice(busca_indice) VALUES ('optimize')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_userprofile_foto_miniatura"),
+        ("colaboradores", "0003_colaborador_colaborador_status_nome_idx"),
+        ("equipamentos", "0004_livro_estoque"),
+        ("emprestimos", "0009_posseequipamento"),
+    ]
+
+    operations = [
+        # Sem volta a desfazer: a 0002 apaga a tabela inteira
+        migrations.RunPython(preencher_indice_busca, migrations.RunPython.noop),
+    ]
@@ -5,19 +5,29 @@ from django.dispatch import receiver
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    # Versões da foto enviada, em WebP e com o hash do conteúdo no nome
+    # (ver core/fotos.py)
     foto = models.ImageField(upload_to='perfil/', blank=True, null=True)
+    foto_miniatura = models.ImageField(upload_to='perfil/', blank=True, null=True)
 
     def __str__(self):
         return self.user.username
 
-# Sinais para criar/atualizar o perfil automaticamente quando o usuário for criado
+# Sinal para criar o perfil automaticamente quando o usuário for criado.
+# Só na criação: o Django salva o usuário a cada login (last_login) e o
+# perfil não deve ser lido nem regravado nessas vezes.
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    # Garante que o perfil exista antes de salvar
-    UserProfile.objects.get_or_create(user=instance)
-    instance.profile.save()
\ No newline at end of file
+
+def perfil_do_usuario(user):
+    ##
+    ## Perfil do usuário, criado na primeira vez que for pedido (usuários
+    ## criados antes do sinal, por fixtures ou direto no banco não têm).
+    ##
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return UserProfile.objects.get_or_create(user=user)[0]
@@ -0,0 +1,103 @@
+import zlib
+
+# Página A4 em pontos (1/72 de polegada)
+LARGURA_A4 = 595
+ALTURA_A4 = 842
+
+# Fontes padrão do PDF (não precisam ser embutidas no arquivo)
+FONTES = {'normal': 'Helvetica', 'negrito': 'Helvetica-Bold'}
+
+
+def _escapar(texto):
+    # WinAnsiEncoding (cp1252) cobre os acentos do português
+    texto = str(texto).encode('cp1252', 'replace').decode('latin-1')
+    return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def largura_texto(texto, tamanho):
+    # Aproximação da largura na Helvetica (metade do tamanho por caractere)
+    return len(str(texto)) * tamanho * 0.5
+
+
+def cortar(texto, largura, tamanho):
+    # Corta o texto (com reticências) para caber em 'largura' pontos
+    texto = str(texto)
+    maximo = int(largura / (tamanho * 0.5))
+    return texto if len(texto) <= maximo else texto[:max(maximo - 3, 0)] + '...'
+
+
+class DocumentoPDF:
+    ##
+    ## Gerador de PDF simples (texto e linhas) sem dependências externas.
+    ## Coordenadas em pontos, com a origem no canto inferior esquerdo.
+    ##   doc = DocumentoPDF()
+    ##   doc.texto(50, 800, 'Título', tamanho=14, fonte='negrito')
+    ##   doc.nova_pagina()
+    ##   dados = doc.gerar()  # bytes do arquivo
+    ##
+    def __init__(self, largura=LARGURA_A4, altura=ALTURA_A4):
+        self.largura = largura
+        self.altura = altura
+        self.paginas = []
+        self.nova_pagina()
+
+    def nova_pagina(self):
+        self.paginas.append([])
+
+    def texto(self, x, y, texto, tamanho=10, fonte='normal'):
+        fonte = 'F2' if fonte == 'negrito' else 'F1'
+        self.paginas[-1].append(f"BT /{fonte} {tamanho} Tf {x:.1f} {y:.1f} Td ({_escapar(texto)}) Tj ET")
+
+    def linha(self, x1, y1, x2, y2, espessura=0.5):
+        self.paginas[-1].append(f"{espessura} w {x1:.1f} {y1:.1f} m {x2:.1f} {y2:.1f} l S")
+
+    def gerar(self):
+        ##
+        ## Monta o arquivo: catálogo, árvore de páginas, as duas fontes
+        ## e, para cada página, o objeto da página e o conteúdo (comprimido).
+        ##
+        objetos = []
+
+        def adicionar(conteudo):
+            objetos.append(conteudo)
+            return len(objetos)
+
+        catalogo = adicionar(None)
+        arvore = adicionar(None)
+        fontes = [
+            adicionar(f"<< /Type /Font /Subtype /Type1 /BaseFont /{nome} /Encoding /WinAnsiEncoding >>".encode())
+            for nome in FONTES.values()
+        ]
+        recursos = f"<< /Font << /F1 {fontes[0]} 0 R /F2 {fontes[1]} 0 R >> >>"
+
+        paginas = []
+        for comandos in self.paginas:
+            conteudo = zlib.compress('\n'.join(comandos).encode('latin-1'))
+            fluxo = adicionar(
+                f"<< /Length {len(conteudo)} /Filter /FlateDecode >>\nstream\n".encode()
+                + conteudo + b"\nendstream"
+            )
+            paginas.append(adicionar(
+                f"<< /Type /Page /Parent {arvore} 0 R /MediaBox [0 0 {self.largura} {self.altura}] "
+                f"/Resources {recursos} /Contents {fluxo} 0 R >>".encode()
+            ))
+
+        objetos[catalogo - 1] = f"<< /Type /Catalog /Pages {arvore} 0 R >>".encode()
+        filhas = ' '.join(f"{numero} 0 R" for numero in paginas)
+        objetos[arvore - 1] = f"<< /Type /Pages /Kids [{filhas}] /Count {len(paginas)} >>".encode()
+
+        saida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        posicoes = []
+        for numero, conteudo in enumerate(objetos, start=1):
+            posicoes.append(len(saida))
+            saida += f"{numero} 0 obj\n".encode() + conteudo + b"\nendobj\n"
+
+        inicio_xref = len(saida)
+        saida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+        for posicao in posicoes:
+            saida += f"{posicao:010d} 00000 n \n".encode()
+        saida += (
+            f"trailer\n<< /Size {len(objetos) + 1} /Root {catalogo} 0 R >>\n"
+            f"startxref\n{inicio_xref}\n%%EOF\n"
+        ).encode()
+        return bytes(saida)
@@ -0,0 +1,34 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+## --- Pool de processos para tarefas pesadas (ex: fichas de EPI) ---
+## Os processos do pool recebem funções de módulos do projeto, e esses
+## módulos importam models: o Django precisa estar configurado no filho.
+##   - 'fork' (Linux): o filho é uma cópia do processo atual, com o Django
+##     já configurado. Fixado aqui porque o padrão do Python muda com a
+##     versão e o sistema (spawn no macOS e no Windows, forkserver no
+##     Linux a partir do 3.14).
+##     Só é seguro em um processo de uma thread (ex: um comando).
+##   - 'spawn' (sem 'fork', ou pedido por quem roda dentro do servidor
+##     web, que tem outras threads): o filho começa do zero e o
+##     initializer chama o django.setup() antes da primeira tarefa.
+## Este módulo não importa nada do Django: é o primeiro que o filho lê.
+
+
+def _configurar_django():
+    # DJANGO_SETTINGS_MODULE vem do ambiente herdado do processo pai
+    import django
+    django.setup()
+
+
+def criar_pool(processos=None, metodo=None):
+    ##
+    ## ProcessPoolExecutor com 'processos' processos (padrão: um por CPU).
+    ## 'metodo' força o modo de início ('spawn' dentro do servidor web).
+    ##
+    if metodo is None:
+        metodo = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    contexto = multiprocessing.get_context(metodo)
+    if metodo == 'fork':
+        return ProcessPoolExecutor(processos, mp_context=contexto)
+    return ProcessPoolExecutor(processos, mp_context=contexto, initializer=_configurar_django)
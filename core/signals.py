@@ -0,0 +1,106 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from colaboradores.models import Colaborador
+from emprestimos.models import Emprestimo, HistoricoDevolucao, ItemEmprestado
+from equipamentos.models import Equipamento
+
+from . import banco, busca, cache, diagnostico
+
+
+## --- Banco (core/banco.py) ---
+
+@receiver(connection_created)
+def configurar_banco(sender, connection, **kwargs):
+    banco.configurar_conexao(connection)
+
+
+## --- Diagnóstico (core/middleware.py) ---
+
+@receiver(connection_created)
+def medir_consultas(sender, connection, **kwargs):
+    # Fica em toda conexão (inclusive as das threads do ORM assíncrono);
+    # fora de uma requisição medida, só repassa a consulta
+    if diagnostico.medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(diagnostico.medir_consulta)
+
+
+## --- Cache (core/cache.py) ---
+## Toda gravação ou exclusão sobe a versão da entidade no cache
+## (agora e de novo depois do COMMIT). Itens e devoluções contam como
+## empréstimo: mudam as páginas de empréstimos (ETag, core/condicional.py).
+## Eles só são apagados junto com o empréstimo, que já avisa; sem
+## post_delete neles, o Django continua apagando em massa (sem carregar).
+
+VERSOES_CACHE = {
+    Colaborador: cache.COLABORADORES,
+    Equipamento: cache.EQUIPAMENTOS,
+    Emprestimo: cache.EMPRESTIMOS,
+    ItemEmprestado: cache.EMPRESTIMOS,
+    HistoricoDevolucao: cache.EMPRESTIMOS,
+}
+
+
+@receiver(post_save, sender=Colaborador)
+@receiver(post_save, sender=Equipamento)
+@receiver(post_save, sender=Emprestimo)
+@receiver(post_save, sender=ItemEmprestado)
+@receiver(post_save, sender=HistoricoDevolucao)
+@receiver(post_delete, sender=Colaborador)
+@receiver(post_delete, sender=Equipamento)
+@receiver(post_delete, sender=Emprestimo)
+def invalidar_cache(sender, **kwargs):
+    cache.invalidar_ao_confirmar(VERSOES_CACHE[sender])
+
+
+## --- Índice de busca (FTS5) ---
+## Cada alteração reindexa o registro depois do COMMIT.
+## Se o nome de um colaborador/equipamento mudar, os empréstimos
+## ligados a ele também são reindexados (o nome faz parte do documento).
+
+@receiver(pre_save, sender=Colaborador)
+def guardar_nome_colaborador(sender, instance, **kwargs):
+    if instance.pk:
+        instance._nome_anterior = sender.objects.filter(pk=instance.pk).values_list('nome_completo', flat=True).first()
+
+
+@receiver(post_save, sender=Colaborador)
+def indexar_colaborador(sender, instance, created, **kwargs):
+    busca.indexar_ao_confirmar(busca.TIPO_COLABORADOR, [instance.pk])
+    if not created and getattr(instance, '_nome_anterior', None) != instance.nome_completo:
+        emprestimos = list(instance.emprestimos.values_list('id', flat=True))
+        busca.indexar_ao_confirmar(busca.TIPO_EMPRESTIMO, emprestimos)
+
+
+@receiver(pre_save, sender=Equipamento)
+def guardar_nome_equipamento(sender, instance, **kwargs):
+    if instance.pk:
+        instance._nome_anterior = sender.objects.filter(pk=instance.pk).values_list('nome', flat=True).first()
+
+
+@receiver(post_save, sender=Equipamento)
+def indexar_equipamento(sender, instance, created, **kwargs):
+    busca.indexar_ao_confirmar(busca.TIPO_EQUIPAMENTO, [instance.pk])
+    if not created and getattr(instance, '_nome_anterior', None) != instance.nome:
+        emprestimos = list(
+            instance.emprestimos_itens.values_list('emprestimo_id', flat=True).distinct()
+        )
+        busca.indexar_ao_confirmar(busca.TIPO_EMPRESTIMO, emprestimos)
+
+
+@receiver(post_save, sender=Emprestimo)
+def indexar_emprestimo(sender, instance, **kwargs):
+    busca.indexar_ao_confirmar(busca.TIPO_EMPRESTIMO, [instance.pk])
+
+
+@receiver(post_delete, sender=Colaborador)
+@receiver(post_delete, sender=Equipamento)
+@receiver(post_delete, sender=Emprestimo)
+def remover_do_indice(sender, instance, **kwargs):
+    tipos = {
+        Colaborador: busca.TIPO_COLABORADOR,
+        Equipamento: busca.TIPO_EQUIPAMENTO,
+        Emprestimo: busca.TIPO_EMPRESTIMO,
+    }
+    busca.remover(tipos[sender], [instance.pk])
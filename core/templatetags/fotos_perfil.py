@@ -0,0 +1,26 @@
+from urllib.parse import quote
+
+from django import template
+from django.urls import reverse
+
+from core.fotos import iniciais
+
+register = template.Library()
+
+
+@register.simple_tag
+def foto_perfil(user, tamanho='miniatura'):
+    ##
+    ## URL da foto do usuário: {% foto_perfil request.user %} (menu) ou
+    ## {% foto_perfil user 'media' %} (página de perfil). Sem foto, o
+    ## avatar com as iniciais, servido pelo próprio sistema.
+    ## O perfil já vem com o usuário (core.autenticacao): sem consultas.
+    ##
+    perfil = getattr(user, 'profile', None)
+    if perfil:
+        # Perfis antigos só têm a 'foto' até rodar normalizar_fotos_perfil
+        foto = (perfil.foto_miniatura if tamanho == 'miniatura' else None) or perfil.foto
+        if foto:
+            return foto.url
+    # As iniciais na URL: se o nome mudar, o navegador busca o avatar novo
+    return f"{reverse('avatar_iniciais')}?v={quote(iniciais(user))}"
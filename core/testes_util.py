@@ -0,0 +1,85 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .dados_sinteticos import gerar_dados
+
+# Linha do EXPLAIN QUERY PLAN do SQLite que indica leitura da tabela
+# inteira (sem índice): "SCAN tabela". Com índice aparece
+# "SCAN tabela USING INDEX ..." ou "SEARCH tabela USING ...".
+VARREDURA_COMPLETA = re.compile(r'^SCAN (\w+)$')
+
+
+class PlanoConsultaMixin:
+    ##
+    ## Ajuda os testes a verificar o plano de execução das consultas.
+    ##
+    ## Executa o código, captura as consultas feitas e roda o
+    ## "EXPLAIN QUERY PLAN" de cada uma. Assim o teste quebra se alguém
+    ## mudar uma consulta (ou remover um índice) e ela voltar a ler a
+    ## tabela inteira.
+    ##
+
+    def planos_de(self, funcao):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Os planos de consulta são verificados apenas no SQLite.")
+
+        with CaptureQueriesContext(connection) as capturadas:
+            funcao()
+
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in capturadas.captured_queries:
+                sql = consulta['sql']
+                if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                planos.append((sql, [linha[-1] for linha in cursor.fetchall()]))
+        return planos
+
+    def assertSemVarreduraCompleta(self, funcao, tabelas):
+        ##
+        ## Falha se alguma consulta feita por 'funcao' ler uma das
+        ## 'tabelas' inteira.
+        ##
+        planos = self.planos_de(funcao)
+        self.assertTrue(planos, "Nenhuma consulta foi executada.")
+        for sql, plano in planos:
+            for linha in plano:
+                varredura = VARREDURA_COMPLETA.match(linha)
+                if varredura and varredura.group(1) in tabelas:
+                    self.fail(
+                        f"Varredura completa em '{varredura.group(1)}'.\n"
+                        f"SQL: {sql}\nPlano:\n  " + "\n  ".join(plano)
+                    )
+
+
+class ConsultasFixasMixin:
+    ##
+    ## Ajuda a provar que o número de consultas de uma view não cresce
+    ## com o volume de dados: a mesma requisição é medida com bases de
+    ## tamanhos diferentes (dados sintéticos somados a cada rodada) e
+    ## precisa fazer exatamente o mesmo número de consultas.
+    ##
+    ## Nos testes, o cache é limpo antes de cada medição para que o
+    ## resultado não dependa da ordem em que os testes rodam.
+    ##
+    TAMANHOS = (5, 40)
+
+    def semear(self, emprestimos, colaboradores=5, equipamentos=10):
+        gerar_dados(colaboradores=colaboradores, equipamentos=equipamentos, emprestimos=emprestimos)
+
+    def assertConsultasFixas(self, numero, requisicao, preparar):
+        ##
+        ## Para cada tamanho em TAMANHOS: chama preparar(tamanho), que
+        ## aumenta a base e devolve os argumentos da requisição, e confere
+        ## que requisicao(*argumentos) faz exatamente 'numero' consultas.
+        ##
+        for tamanho in self.TAMANHOS:
+            with self.subTest(tamanho=tamanho):
+                argumentos = preparar(tamanho)
+                cache.clear()
+                with self.assertNumQueries(numero):
+                    requisicao(*argumentos)
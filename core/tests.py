@@ -1,3 +1,618 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import zlib
 
-# Create your tests here.
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache as cache_django
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from colaboradores.models import Colaborador
+from colaboradores.views import sugestoes_de_funcao
+from emprestimos.kpis import obter_kpis, registrar_transicao
+from emprestimos.models import Emprestimo, HistoricoDevolucao, ItemEmprestado
+from equipamentos.catalogo import equipamentos_cadastrados, equipamentos_disponiveis
+from equipamentos.estoque import divergencias
+from equipamentos.models import Equipamento
+from . import banco, benchmark, busca, cache, dados_sinteticos, diagnostico
+from .estaticos import minificar_css, minificar_js, servir_estatico
+from .models import UserProfile
+from .pdf import DocumentoPDF
+from .testes_util import ConsultasFixasMixin
+
+
+class ConsultasFixasCoreTest(ConsultasFixasMixin, TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_perfil(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            return (reverse('perfil'),)
+        self.assertConsultasFixas(2, self.client.get, preparar)
+
+
+class LoginSemEscritaTest(TestCase):
+
+    def setUp(self):
+        cache_django.clear()
+        self.usuario = User.objects.create_user('estoque', password='senha')
+
+    def consultas_de(self, funcao):
+        with CaptureQueriesContext(connection) as capturadas:
+            funcao()
+        return [consulta['sql'] for consulta in capturadas.captured_queries]
+
+    def test_login_nao_regrava_perfil(self):
+        consultas = self.consultas_de(
+            lambda: self.client.post(reverse('login'), {'username': 'estoque', 'password': 'senha'})
+        )
+        self.assertFalse([sql for sql in consultas if 'core_userprofile' in sql])
+        self.assertEqual(UserProfile.objects.filter(user=self.usuario).count(), 1)
+
+    def test_pagina_sem_escrita_e_uma_consulta_de_autenticacao(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('perfil'))
+
+        # Sessão já no cache: só o usuário (com o perfil, no mesmo SELECT)
+        consultas = self.consultas_de(lambda: self.client.get(reverse('perfil')))
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('core_userprofile', consultas[0])
+        self.assertFalse([sql for sql in consultas if not sql.lstrip().upper().startswith('SELECT')])
+
+    def test_perfil_criado_no_primeiro_acesso(self):
+        UserProfile.objects.filter(user=self.usuario).delete()
+        self.client.force_login(self.usuario)
+
+        resposta = self.client.get(reverse('perfil'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(UserProfile.objects.filter(user=self.usuario).exists())
+
+
+class FotoPerfilTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.usuario = User.objects.create_user('estoque', password='senha', first_name='Ana', last_name='Lima')
+        self.client.force_login(self.usuario)
+
+    def enviar(self, cor):
+        saida = io.BytesIO()
+        Image.new('RGB', (1200, 800), cor).save(saida, 'JPEG')
+        foto = SimpleUploadedFile('Minha Foto.jpg', saida.getvalue(), content_type='image/jpeg')
+        dados = {'first_name': 'Ana', 'last_name': 'Lima', 'email': 'ana@exemplo.com', 'foto': foto}
+        self.client.post(reverse('perfil'), dados)
+        return UserProfile.objects.get(user=self.usuario)
+
+    def arquivos(self):
+        return sorted(os.listdir(os.path.join(self.media, 'perfil')))
+
+    def test_versoes_em_webp_com_hash(self):
+        perfil = self.enviar('red')
+        self.assertRegex(perfil.foto.name, r'^perfil/[0-9a-f]{16}_300\.webp$')
+        self.assertRegex(perfil.foto_miniatura.name, r'^perfil/[0-9a-f]{16}_80\.webp$')
+        with Image.open(perfil.foto_miniatura.path) as miniatura:
+            self.assertEqual((miniatura.format, miniatura.size), ('WEBP', (80, 80)))
+        # O original não fica gravado
+        self.assertEqual(self.arquivos(), sorted([os.path.basename(perfil.foto.name), os.path.basename(perfil.foto_miniatura.name)]))
+
+        resposta = self.client.get(reverse('perfil'))
+        self.assertContains(resposta, perfil.foto_miniatura.url)
+        self.assertContains(resposta, perfil.foto.url)
+
+    def test_troca_de_foto_apaga_versoes_antigas(self):
+        antigo = self.enviar('red')
+        self.assertEqual(self.enviar('red').foto.name, antigo.foto.name)
+
+        novo = self.enviar('blue')
+        self.assertNotEqual(novo.foto.name, antigo.foto.name)
+        self.assertEqual(len(self.arquivos()), 2)
+
+    def test_avatar_com_iniciais_sem_foto(self):
+        resposta = self.client.get(reverse('perfil'))
+        self.assertNotContains(resposta, 'placehold.co')
+        self.assertContains(resposta, reverse('avatar_iniciais') + '?v=AL')
+
+        avatar = self.client.get(reverse('avatar_iniciais'), {'v': 'AL'})
+        self.assertEqual(avatar['Content-Type'], 'image/svg+xml')
+        self.assertIn('immutable', avatar['Cache-Control'])
+        self.assertIn('>AL</text>', avatar.content.decode())
+
+
+class EstaticosTest(TestCase):
+
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz)
+        configuracao = override_settings(STATIC_ROOT=self.raiz)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_sem_collectstatic_usa_nome_original(self):
+        self.assertEqual(staticfiles_storage.url('style.css'), '/static/style.css')
+
+    def test_collectstatic_com_hash_minificado_e_comprimido(self):
+        with mock.patch('core.estaticos._brotli', return_value=None):
+            with self.assertWarnsRegex(RuntimeWarning, 'brotli'):
+                call_command('collectstatic', interactive=False, verbosity=0)
+        url = staticfiles_storage.url('style.css')
+        self.assertRegex(url, r'^/static/style\.[0-9a-f]{12}\.css$')
+        nome = url.removeprefix('/static/')
+
+        with open(os.path.join(self.raiz, 'style.css'), 'rb') as original:
+            tamanho_original = len(original.read())
+        with open(os.path.join(self.raiz, nome), 'rb') as minificado:
+            conteudo = minificado.read()
+        self.assertLess(len(conteudo), tamanho_original)
+        with open(os.path.join(self.raiz, nome + '.gz'), 'rb') as comprimido:
+            self.assertEqual(gzip.decompress(comprimido.read()), conteudo)
+
+        fabrica = RequestFactory()
+        resposta = servir_estatico(fabrica.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate'), nome)
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertEqual(resposta['Content-Type'], 'text/css')
+        self.assertIn('immutable', resposta['Cache-Control'])
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+        resposta.close()
+
+        # Nome sem hash: cache curto e, sem Accept-Encoding, o arquivo puro
+        resposta = servir_estatico(fabrica.get('/static/style.css'), 'style.css')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', resposta['Cache-Control'])
+        resposta.close()
+
+    def test_minificar_css(self):
+        css = "/* menu */\n.menu  a:hover ,\n.menu :focus {\n    color: #FFF;\n    margin: 0 auto;\n}\n"
+        self.assertEqual(minificar_css(css), '.menu a:hover,.menu :focus{color:#FFF;margin:0 auto}')
+
+    def test_minificar_css_preserva_strings(self):
+        css = (
+            '.aviso::before {\n    content: "a, b ;  }"; /* x */\n'
+            '    font-family: "Segoe  UI" , \'Open /* não é comentário */ Sans\';\n}\n'
+            '/* fim: "aspas" no comentário */\n.vazio { content: \'\\\'\'; /* y */ }\n'
+        )
+        self.assertEqual(minificar_css(css), (
+            '.aviso::before{content:"a, b ;  }";'
+            'font-family:"Segoe  UI",\'Open /* não é comentário */ Sans\'}'
+            ".vazio{content:'\\''}"
+        ))
+
+    def test_minificar_js(self):
+        js = (
+            '/* cabeçalho\n   de várias linhas */\n'
+            'function f(a, b) {\n'
+            '    // comentário\n'
+            "    const url = 'http://exemplo.com'; // fim\n"
+            '    return a / b / 2 /* meio */;\n'
+            '}\n'
+        )
+        self.assertEqual(minificar_js(js), (
+            'function f(a, b) {\n'
+            "const url = 'http://exemplo.com';\n"
+            'return a / b / 2 ;\n'
+            '}\n'
+        ))
+
+    def test_minificar_js_preserva_template_e_regex(self):
+        # Dentro da crase, // e as quebras de linha fazem parte do texto
+        template = (
+            'const html = `<div>\n'
+            '        // não é comentário ${ok ? `a${"}"}` : \'/* x */\'}\n'
+            '    </div>`;'
+        )
+        regex = "const r = /\\/\\/'[/]x/g.test(url);"
+        js = '    ' + template + ' // fim\n\n    ' + regex + '\n'
+        self.assertEqual(minificar_js(js), template + '\n' + regex + '\n')
+
+
+class PaginaCondicionalTest(TestCase):
+
+    def setUp(self):
+        # Os validadores só são ligados com um cache compartilhado
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        configuracao = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': pasta,
+        }})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache_django.clear()
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+        Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Pedreiro')
+
+    def test_pagina_sem_mudanca_responde_304_sem_consultas_da_view(self):
+        # A primeira visita cria o cookie CSRF, que também entra no ETag
+        self.client.get(reverse('index'))
+        primeira = self.client.get(reverse('index'))
+        self.assertEqual(primeira.status_code, 200)
+        self.assertIn('no-cache', primeira['Cache-Control'])
+        self.assertTrue(primeira.has_header('Last-Modified'))
+
+        # Só a autenticação (usuário + perfil); a sessão vem do cache
+        with self.assertNumQueries(1):
+            resposta = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta.content, b'')
+
+        Colaborador.objects.create(nome_completo='Bruno Reis', matricula='200', funcao='Servente')
+        resposta = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Bruno Reis')
+
+    def test_etag_muda_com_a_busca_e_com_mensagem_pendente(self):
+        self.client.get(reverse('index'))
+        lista = self.client.get(reverse('index'))['ETag']
+        self.assertNotEqual(self.client.get(reverse('index'), {'q': 'Ana'})['ETag'], lista)
+
+        # Mensagem a exibir: a página é gerada de novo (sem ETag)
+        self.client.post(reverse('cadastro'), {
+            'nome_completo': 'Carla Dias', 'matricula': '300', 'funcao': 'Pedreiro', 'status': 'Ativo',
+        })
+        resposta = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=lista)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(resposta.has_header('ETag'))
+        self.assertContains(resposta, 'Colaborador cadastrado com sucesso!')
+
+
+    def test_view_async_responde_304(self):
+        # equipamento_lista é async (ver core/assincrono.py)
+        self.client.get(reverse('equipamento_lista'))
+        primeira = self.client.get(reverse('equipamento_lista'))
+        self.assertIn('no-cache', primeira['Cache-Control'])
+        resposta = self.client.get(reverse('equipamento_lista'), HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_cache_por_processo_nao_usa_validadores(self):
+        # Com o LocMem outro worker poderia ter versões antigas: sem 304
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get(reverse('index'))
+            primeira = self.client.get(reverse('index'))
+            self.assertFalse(primeira.has_header('ETag'))
+            self.assertIn('no-cache', primeira['Cache-Control'])
+            resposta = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH='"qualquer"')
+            self.assertEqual(resposta.status_code, 200)
+
+
+class BancoTest(TestCase):
+
+    def test_pragmas_em_toda_conexao(self):
+        pragmas = banco.pragmas_atuais(connection)
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['busy_timeout'], 5000)
+        self.assertEqual(pragmas['synchronous'], 1)   # NORMAL
+        self.assertEqual(pragmas['cache_size'], -64 * 1024)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+class CompressaoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_html_comprimido_e_json_pequeno_nao(self):
+        resposta = self.client.get(reverse('index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+        self.assertIn(b'<html', gzip.decompress(resposta.content))
+
+        resposta = self.client.get(reverse('colaborador_autocomplete'), {'q': 'x'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+
+    def test_exportacao_em_streaming_nao_e_comprimida(self):
+        resposta = self.client.get(reverse('exportar_emprestimos'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(resposta.streaming)
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertTrue(b''.join(resposta.streaming_content).decode('utf-8-sig').startswith('Empréstimo'))
+
+
+class DocumentoPDFTest(TestCase):
+
+    def test_estrutura(self):
+        doc = DocumentoPDF()
+        doc.texto(40, 800, 'Função (NR-6)', fonte='negrito')
+        doc.nova_pagina()
+        doc.linha(40, 40, 100, 40)
+        dados = doc.gerar()
+
+        self.assertTrue(dados.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 2', dados)
+        # Cada posição da tabela xref aponta para o início do objeto
+        inicio = int(re.search(rb'startxref\n(\d+)', dados).group(1))
+        self.assertTrue(dados[inicio:].startswith(b'xref'))
+        for numero, posicao in enumerate(re.findall(rb'(\d{10}) 00000 n', dados), start=1):
+            self.assertTrue(dados[int(posicao):].startswith(f'{numero} 0 obj'.encode()))
+        # Texto em cp1252 com os parênteses escapados
+        primeira = zlib.decompress(re.search(rb'stream\n(.*?)\nendstream', dados, re.S).group(1))
+        self.assertIn('(Função \\(NR-6\\))'.encode('cp1252'), primeira)
+
+
+
+class CacheTest(TestCase):
+
+    def setUp(self):
+        cache_django.clear()
+        cache.estatisticas.limpar()
+
+    def test_acertos_e_falhas(self):
+        calculos = []
+        def calcular():
+            calculos.append(1)
+            return ['valor']
+
+        for _ in range(3):
+            self.assertEqual(cache.obter('teste', [cache.EQUIPAMENTOS], calcular), ['valor'])
+        cache.obter('teste', [cache.EQUIPAMENTOS], calcular, 'outra variação')
+
+        self.assertEqual(len(calculos), 2)
+        self.assertEqual(cache.estatisticas.resumo(), [
+            {'nome': 'teste', 'acertos': 2, 'falhas': 2, 'taxa_acerto': 50.0},
+        ])
+
+    def test_versao_nova_nao_reaproveita_valor_antigo(self):
+        # Versão perdida (cache reiniciado/expulsa) não volta a um número já usado
+        cache.obter('teste', [cache.EQUIPAMENTOS], lambda: 'antigo')
+        cache_django.delete('versao:equipamentos')
+        self.assertEqual(cache.obter('teste', [cache.EQUIPAMENTOS], lambda: 'novo'), 'novo')
+
+    def test_colaborador_salvo_invalida_funcoes(self):
+        self.assertNotIn('Soldador Naval', sugestoes_de_funcao())
+        with self.assertNumQueries(0):
+            sugestoes_de_funcao()
+
+        Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Soldador Naval')
+        self.assertIn('Soldador Naval', sugestoes_de_funcao())
+
+    def test_estoque_alterado_invalida_catalogo(self):
+        capacete = Equipamento.objects.create(nome='Capacete', estoque_total=5, estoque_disponivel=5)
+        self.assertEqual(equipamentos_disponiveis(), [capacete])
+        self.assertEqual(equipamentos_cadastrados(), [capacete])
+
+        capacete.estoque_disponivel = 0
+        capacete.save()
+        self.assertEqual(equipamentos_disponiveis(), [])
+        self.assertEqual(equipamentos_cadastrados()[0].estoque_disponivel, 0)
+
+    def test_transicao_em_massa_invalida_kpis(self):
+        colaborador = Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Pedreiro')
+        Emprestimo.objects.create(colaborador=colaborador, data_prevista_devolucao=timezone.localdate() + timedelta(days=5))
+        self.assertEqual(obter_kpis()['ATIVO'], 1)
+
+        # UPDATE em massa não dispara sinais: quem muda avisa pelos KPIs
+        Emprestimo.objects.update(status='DEVOLVIDO')
+        self.assertEqual(obter_kpis()['ATIVO'], 1)
+        registrar_transicao('ATIVO', 'DEVOLVIDO')
+        self.assertEqual(obter_kpis()['ATIVO'], 0)
+
+
+class BuscaIndiceTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.colaborador = Colaborador.objects.create(nome_completo='José Antônio', matricula='7001', funcao='Soldador')
+        cls.luva = Equipamento.objects.create(nome='Luva de Raspa', ca='12345', categoria='MEMBROS_SUP', estoque_total=5)
+        cls.capacete = Equipamento.objects.create(nome='Capacete', estoque_total=5)
+        cls.emprestimo = Emprestimo.objects.create(
+            colaborador=cls.colaborador, data_prevista_devolucao=timezone.localdate() + timedelta(days=5),
+        )
+        ItemEmprestado.objects.create(emprestimo=cls.emprestimo, equipamento=cls.luva)
+
+    def _documentos(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid, tipo, objeto_id, titulo, texto FROM {busca.TABELA_BUSCA} ORDER BY rowid")
+            return cursor.fetchall()
+
+    def _buscar(self, termo, tipo=busca.TIPO_EQUIPAMENTO):
+        return list(busca.filtrar_por_busca(
+            Equipamento.objects.order_by('id'), tipo, termo, campos=['nome'],
+        ).values_list('nome', flat=True))
+
+    def test_migracao_preenche_indice_igual_a_reconstrucao(self):
+        busca.reconstruir_indice()
+        esperado = self._documentos()
+        self.assertEqual(len(esperado), 4)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {busca.TABELA_BUSCA}")
+        migracao = importlib.import_module('core.migrations.0004_busca_indice_chaves')
+        # A função só usa a conexão do schema_editor
+        migracao.preencher_indice_busca(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(self._documentos(), esperado)
+        self.assertEqual(self._buscar('raspa'), ['Luva de Raspa'])
+        self.assertEqual(self._buscar('maos'), ['Luva de Raspa'])
+
+    def test_reindexar_troca_so_o_documento_alterado(self):
+        busca.reconstruir_indice()
+        Equipamento.objects.filter(pk=self.luva.pk).update(nome='Luva Nitrílica')
+        busca.indexar(busca.TIPO_EQUIPAMENTO, [self.luva.pk])
+
+        self.assertEqual(self._buscar('raspa'), [])
+        self.assertEqual(self._buscar('nitrilica'), ['Luva Nitrílica'])
+        self.assertEqual(self._buscar('capacete'), ['Capacete'])
+        self.assertEqual(len(self._documentos()), 4)
+
+    def test_remover_usa_a_chave_do_tipo(self):
+        busca.reconstruir_indice()
+        # Mesmo id em outro tipo não é afetado
+        busca.remover(busca.TIPO_COLABORADOR, [self.luva.pk, self.colaborador.pk])
+        tipos = [tipo for _, tipo, _, _, _ in self._documentos()]
+        self.assertEqual(sorted(tipos), ['emprestimo', 'equipamento', 'equipamento'])
+
+
+class DiagnosticoTest(TestCase):
+
+    def setUp(self):
+        diagnostico.registro.limpar()
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_cabecalho_server_timing(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            resposta = self.client.get(reverse('perfil'))
+
+        partes = dict(
+            re.match(r'(\w+);dur=([\d.]+);desc="([^"]*)"', parte.strip()).group(1, 3)
+            for parte in resposta['Server-Timing'].split(',')
+        )
+        self.assertEqual(set(partes), {'sql', 'tpl', 'total'})
+        # Conta também as consultas da sessão/autenticação (middleware no topo)
+        self.assertEqual(partes['sql'], f'{len(capturadas)} consultas')
+
+    def test_registro_por_view_com_consultas_repetidas(self):
+        self.client.get(reverse('perfil'))
+        self.client.get(reverse('perfil'))
+
+        medicao, token = diagnostico.iniciar_medicao()
+        try:
+            for _ in range(3):
+                list(Equipamento.objects.all())
+        finally:
+            diagnostico.encerrar_medicao(token)
+        self.assertEqual(medicao.consultas, 3)
+        self.assertEqual(medicao.repetidas()[0][1], 3)
+
+        linhas = {linha['view']: linha for linha in diagnostico.registro.resumo()}
+        self.assertEqual(linhas['perfil']['requisicoes'], 2)
+
+    def test_painel_so_para_staff(self):
+        self.assertEqual(self.client.get(reverse('painel_diagnostico')).status_code, 403)
+
+        User.objects.filter(pk=self.usuario.pk).update(is_staff=True)
+        self.client.get(reverse('perfil'))
+        resposta = self.client.get(reverse('painel_diagnostico'))
+        self.assertContains(resposta, 'perfil')
+        self.assertIn('Server-Timing', resposta)
+
+        self.client.post(reverse('painel_diagnostico'), {'limpar': '1'})
+        # Sobra só o próprio POST, registrado depois de limpar
+        self.assertEqual([linha['view'] for linha in diagnostico.registro.resumo()], ['painel_diagnostico'])
+
+
+class DadosSinteticosTest(TestCase):
+
+    def gerar(self, **opcoes):
+        return dados_sinteticos.gerar_dados(**{
+            'colaboradores': 20, 'equipamentos': 10, 'emprestimos': 60, 'semente': 7, **opcoes,
+        })
+
+    def retrato(self):
+        return (
+            list(Colaborador.objects.order_by('matricula').values_list('nome_completo', 'funcao', 'status')),
+            list(Equipamento.objects.order_by('ca').values_list('nome', 'estoque_total', 'estoque_disponivel')),
+            list(ItemEmprestado.objects.order_by('id').values_list('quantidade_emprestada', 'quantidade_devolvida')),
+        )
+
+    def test_dados_coerentes(self):
+        totais = self.gerar()
+        self.assertEqual(totais['colaboradores'], 20)
+        self.assertEqual(totais['emprestimos'], Emprestimo.objects.count())
+        self.assertEqual(totais['historico'], HistoricoDevolucao.objects.count())
+
+        # Itens: devolvido bate com o histórico
+        for item in ItemEmprestado.objects.annotate(soma=Sum('historico_devolucoes__quantidade_devolvida')):
+            self.assertEqual(item.quantidade_devolvida, item.soma or 0)
+
+        # Estoque: disponível = total - pendente, e o livro bate com os campos
+        for equipamento in Equipamento.objects.all():
+            pendente = ItemEmprestado.objects.filter(equipamento=equipamento).aggregate(
+                soma=Sum(F('quantidade_emprestada') - F('quantidade_devolvida')))['soma'] or 0
+            self.assertEqual(equipamento.estoque_total - equipamento.estoque_disponivel, pendente)
+        self.assertEqual(divergencias(), [])
+
+        # Sem nada pendente, o empréstimo está devolvido; vencido e pendente, atrasado
+        hoje = timezone.localdate()
+        for emprestimo in Emprestimo.objects.prefetch_related('itens_emprestados'):
+            pendente = any(i.quantidade_devolvida < i.quantidade_emprestada for i in emprestimo.itens_emprestados.all())
+            if not pendente:
+                esperado = 'DEVOLVIDO'
+            else:
+                esperado = 'ATRASADO' if emprestimo.data_prevista_devolucao < hoje else 'ATIVO'
+            self.assertEqual(emprestimo.status, esperado)
+
+    def test_mesma_semente_mesmos_dados(self):
+        agora = timezone.now()
+        self.gerar(agora=agora)
+        primeiro = self.retrato()
+        dados_sinteticos.apagar_dados_sinteticos()
+        self.gerar(agora=agora)
+        self.assertEqual(self.retrato(), primeiro)
+
+        dados_sinteticos.apagar_dados_sinteticos()
+        self.gerar(agora=agora, semente=8)
+        self.assertNotEqual(self.retrato(), primeiro)
+
+    def test_apagar_preserva_dados_reais(self):
+        real = Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Pedreiro')
+        self.gerar()
+        self.assertTrue(dados_sinteticos.existem_dados_sinteticos())
+
+        dados_sinteticos.apagar_dados_sinteticos()
+        self.assertFalse(dados_sinteticos.existem_dados_sinteticos())
+        self.assertEqual(list(Colaborador.objects.all()), [real])
+        self.assertFalse(Equipamento.objects.exists())
+        self.assertFalse(Emprestimo.objects.exists())
+
+    def test_comando_exige_limpar_para_gerar_de_novo(self):
+        opcoes = {'colaboradores': 5, 'equipamentos': 3, 'emprestimos': 10, 'stdout': io.StringIO()}
+        call_command('gerar_dados_sinteticos', **opcoes)
+        with self.assertRaises(CommandError):
+            call_command('gerar_dados_sinteticos', **opcoes)
+        call_command('gerar_dados_sinteticos', limpar=True, **opcoes)
+        self.assertEqual(Colaborador.objects.count(), 5)
+
+
+class BenchmarkTest(TestCase):
+
+    def test_listar_rotas_sem_admin(self):
+        rotas = benchmark.listar_rotas()
+        self.assertIn('perfil', rotas)
+        self.assertIn('colaborador_detalhe', rotas)
+        self.assertFalse([rota for rota in rotas if rota.startswith('admin:')])
+
+    def test_mede_rotas(self):
+        dados_sinteticos.gerar_dados(colaboradores=5, equipamentos=3, emprestimos=10)
+        resultado = benchmark.executar_benchmark(
+            repeticoes=2, rotas=['perfil', 'colaborador_detalhe', 'logout'],
+        )['rotas']
+
+        # logout fica de fora (encerraria a sessão do benchmark)
+        self.assertEqual(set(resultado), {'perfil', 'colaborador_detalhe'})
+        detalhe = resultado['colaborador_detalhe']
+        self.assertEqual(detalhe['status'], 200)
+        self.assertGreater(detalhe['consultas'], 0)
+        latencia = detalhe['latencia_ms']
+        self.assertLessEqual(latencia['min'], latencia['mediana'])
+        self.assertLessEqual(latencia['mediana'], latencia['max'])
+
+    def test_rota_sem_registros_e_ignorada(self):
+        resultado = benchmark.executar_benchmark(repeticoes=1, rotas=['detalhe_emprestimo'])['rotas']
+        self.assertIn('ignorada', resultado['detalhe_emprestimo'])
+
+    def test_comando_recusa_rota_desconhecida(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_views', rota=['nao_existe'], stdout=io.StringIO())
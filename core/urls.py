@@ -14,8 +14,17 @@ urlpatterns = [
     # Logout Personalizado (Funciona com GET)
     path('logout/', views.custom_logout, name='logout'),
     
+    # Busca global (JSON) em colaboradores, equipamentos e empréstimos
+    path('sistema/busca/', views.busca_global, name='busca_global'),
+
+    # Diagnóstico de desempenho (somente staff)
+    path('sistema/diagnostico/', views.painel_diagnostico, name='painel_diagnostico'),
+
     # Perfil
     path('sistema/perfil/', views.perfil, name='perfil'),
+
+    # Avatar com as iniciais (usuário sem foto)
+    path('sistema/perfil/avatar.svg', views.avatar_iniciais, name='avatar_iniciais'),
     
     # Alterar Senha
     path('sistema/perfil/senha/', auth_views.PasswordChangeView.as_view(
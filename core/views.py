@@ -1,8 +1,23 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from .forms import UserUpdateForm, ProfileUpdateForm
+from .models import perfil_do_usuario
+from . import busca, cache, diagnostico, fotos
+from .assincrono import view_assincrona
+
+# Rota de destino de cada tipo de resultado da busca global
+ROTAS_BUSCA = {
+    busca.TIPO_COLABORADOR: 'colaborador_editar',
+    busca.TIPO_EQUIPAMENTO: 'equipamento_editar',
+    busca.TIPO_EMPRESTIMO: 'detalhe_emprestimo',
+}
 
 def home(request):
     return render(request, 'home.html')
@@ -14,10 +29,11 @@ def custom_logout(request):
 
 @login_required
 def perfil(request):
+    # Pega o perfil (já carregado com o usuário) ou cria se não existir
+    perfil_usuario = perfil_do_usuario(request.user)
     if request.method == 'POST':
         u_form = UserUpdateForm(request.POST, instance=request.user)
-        # O instance aqui tenta pegar o perfil, ou cria se não existir
-        p_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
+        p_form = ProfileUpdateForm(request.POST, request.FILES, instance=perfil_usuario)
 
         if u_form.is_valid() and p_form.is_valid():
             u_form.save()
@@ -27,11 +43,64 @@ def perfil(request):
 
     else:
         u_form = UserUpdateForm(instance=request.user)
-        p_form = ProfileUpdateForm(instance=request.user.profile)
+        p_form = ProfileUpdateForm(instance=perfil_usuario)
 
     context = {
         'u_form': u_form,
         'p_form': p_form,
         'titulo_pagina': 'Configurações de Perfil'
     }
-    return render(request, 'perfil.html', context)
\ No newline at end of file
+    return render(request, 'perfil.html', context)
+
+
+@login_required
+def avatar_iniciais(request):
+    ##
+    ## Avatar (SVG) com as iniciais de quem não tem foto. A URL leva as
+    ## iniciais (?v=AL, ver templatetags/fotos_perfil.py): o navegador
+    ## guarda a imagem e só pede de novo se o nome mudar.
+    ##
+    resposta = HttpResponse(fotos.avatar_svg(fotos.iniciais(request.user)), content_type='image/svg+xml')
+    patch_cache_control(resposta, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return resposta
+
+
+@view_assincrona
+@login_required
+async def busca_global(request):
+    ##
+    ## Busca única (JSON) em colaboradores, equipamentos e empréstimos,
+    ## ordenada por relevância. Filtro opcional: ?tipo=colaborador
+    ##
+    termo = request.GET.get('q', '').strip()
+    tipos = [t for t in request.GET.getlist('tipo') if t in ROTAS_BUSCA] or None
+
+    resultados = await sync_to_async(busca.buscar)(termo, tipos=tipos)
+    for resultado in resultados:
+        resultado['url'] = reverse(ROTAS_BUSCA[resultado['tipo']], args=[resultado['id']])
+    return JsonResponse({'resultados': resultados})
+
+
+@login_required
+def painel_diagnostico(request):
+    ##
+    ## Página da equipe (staff) com as views mais lentas (p50/p95/p99)
+    ## e as consultas SQL que mais se repetem em uma mesma requisição,
+    ## além dos acertos e falhas do cache.
+    ## O botão "Limpar" zera as medições deste processo.
+    ##
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    if request.method == 'POST' and 'limpar' in request.POST:
+        diagnostico.registro.limpar()
+        cache.estatisticas.limpar()
+        messages.success(request, 'Medições apagadas.')
+        return redirect('painel_diagnostico')
+
+    context = {
+        'views_medidas': diagnostico.registro.resumo(),
+        'cache_estatisticas': cache.estatisticas.resumo(),
+        'titulo_pagina': 'Diagnóstico de Desempenho',
+    }
+    return render(request, 'diagnostico.html', context)
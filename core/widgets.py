@@ -0,0 +1,30 @@
+from django import forms
+
+
+class AutocompleteSelect(forms.Select):
+    ##
+    ## <select> que NÃO renderiza a lista inteira de opções.
+    ## Só vai para o HTML a opção já escolhida; o resto é buscado pelo
+    ## script.js no endpoint JSON informado em 'data-autocomplete-url'.
+    ## A validação continua sendo feita pelo campo do formulário.
+    ##
+    def __init__(self, url, attrs=None, choices=()):
+        attrs = {**(attrs or {}), 'data-autocomplete-url': url}
+        super().__init__(attrs, choices)
+
+    def optgroups(self, name, value, attrs=None):
+        selecionados = {str(v) for v in value if v not in (None, '')}
+        todas = self.choices
+        if hasattr(todas, 'queryset'):
+            # ModelChoiceField: busca só os objetos selecionados, não a tabela toda
+            opcoes = [('', todas.field.empty_label)]
+            if selecionados:
+                opcoes += [todas.choice(obj) for obj in todas.queryset.filter(pk__in=selecionados)]
+        else:
+            opcoes = [(v, rotulo) for v, rotulo in todas if v == '' or str(v) in selecionados]
+
+        self.choices = opcoes
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Emprestimo, ControleVarredura
+from .kpis import registrar_transicao
+
+# Nome da marca d'água usada pela varredura de atrasos
+VARREDURA_ATRASOS = 'atrasos'
+
+
+@transaction.atomic
+def marcar_emprestimos_atrasados(hoje=None, completo=False):
+    ##
+    ## Passa para ATRASADO os empréstimos ATIVOS cuja data prevista já venceu.
+    ##
+    ## A varredura é incremental: só olha os empréstimos que venceram
+    ## entre a última execução (marca d'água) e hoje. Com 'completo=True'
+    ## ignora a marca e revisa todos os empréstimos ativos.
+    ## Retorna a quantidade de empréstimos atualizados.
+    ##
+    hoje = hoje or timezone.now().date()
+    controle = ControleVarredura.objects.select_for_update().filter(
+        nome=VARREDURA_ATRASOS
+    ).first()
+
+    vencidos = Emprestimo.objects.filter(
+        status='ATIVO',
+        data_prevista_devolucao__lt=hoje,
+    )
+    if controle and not completo:
+        if controle.executada_ate >= hoje:
+            return 0
+        vencidos = vencidos.filter(data_prevista_devolucao__gte=controle.executada_ate)
+
+    total = vencidos.update(status='ATRASADO')
+    registrar_transicao('ATIVO', 'ATRASADO', total)
+
+    ControleVarredura.objects.update_or_create(
+        nome=VARREDURA_ATRASOS,
+        defaults={'executada_ate': hoje},
+    )
+    return total
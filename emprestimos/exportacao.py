@@ -0,0 +1,139 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from core.busca import TIPO_EMPRESTIMO, filtrar_por_busca
+from .models import Emprestimo, HistoricoDevolucao, ItemEmprestado
+
+# Linhas buscadas do banco por vez (cursor no servidor no PostgreSQL;
+# no SQLite, leitura do cursor aos poucos)
+TAMANHO_LOTE = 2000
+
+# Linhas do CSV enviadas juntas para a resposta (~64 KB)
+LINHAS_POR_BLOCO = 500
+
+CABECALHO = [
+    'Empréstimo', 'Data do empréstimo', 'Devolução prevista', 'Status do empréstimo',
+    'Colaborador', 'Matrícula', 'Equipamento', 'C.A.',
+    'Qtde emprestada', 'Qtde processada', 'Situação do item',
+    'Evento', 'Qtde do evento', 'Data do evento',
+]
+
+# Separador ';' e BOM: o Excel em português abre o arquivo direto
+SEPARADOR = ';'
+BOM = '\ufeff'
+
+# Início de célula que o Excel/LibreOffice interpretam como fórmula
+# (injeção de CSV): textos digitados pelos usuários ganham um ' na frente
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def celula_segura(texto):
+    if texto and texto.startswith(INICIO_FORMULA):
+        return "'" + texto
+    return texto
+
+
+def filtrar_emprestimos(data_inicio=None, data_fim=None, status='', colaborador=None, busca='', hoje=None):
+    ##
+    ## Empréstimos que entram na exportação. As datas são dias (inclusive)
+    ## da data do empréstimo; status segue o mesmo critério da lista
+    ## (ATIVO vencido conta como ATRASADO).
+    ##
+    emprestimos = Emprestimo.objects.all()
+    if data_inicio:
+        emprestimos = emprestimos.filter(
+            data_emprestimo__gte=timezone.make_aware(datetime.combine(data_inicio, time.min))
+        )
+    if data_fim:
+        emprestimos = emprestimos.filter(
+            data_emprestimo__lt=timezone.make_aware(datetime.combine(data_fim + timedelta(days=1), time.min))
+        )
+    if status:
+        emprestimos = emprestimos.filtrar_status(status, hoje)
+    if colaborador:
+        emprestimos = emprestimos.filter(colaborador=colaborador)
+    if busca:
+        emprestimos = filtrar_por_busca(
+            emprestimos, TIPO_EMPRESTIMO, busca,
+            campos=['colaborador__nome_completo', 'id', 'itens_emprestados__equipamento__nome'],
+        )
+    return emprestimos
+
+
+def linhas_historico(emprestimos, hoje=None):
+    ##
+    ## Uma linha por evento do histórico de cada item (devolução, dano
+    ## ou perda); item sem evento sai em uma linha com o evento vazio.
+    ## Tudo em UMA consulta (JOIN com colaborador e equipamento e LEFT
+    ## JOIN com o histórico), lida aos poucos com iterator(): a memória
+    ## usada não depende do tamanho da exportação.
+    ## Os textos cadastrados passam por celula_segura().
+    ##
+    hoje = hoje or timezone.now().date()
+    fuso = timezone.get_current_timezone()
+    status_emprestimo = dict(Emprestimo.STATUS_CHOICES)
+    situacao_item = dict(ItemEmprestado._meta.get_field('status_item').choices)
+    eventos = dict(HistoricoDevolucao.STATUS_DEVOLUCAO_CHOICES)
+
+    itens = ItemEmprestado.objects.filter(emprestimo__in=emprestimos.values('id')).values_list(
+        'emprestimo_id', 'emprestimo__data_emprestimo', 'emprestimo__data_prevista_devolucao',
+        'emprestimo__status', 'emprestimo__colaborador__nome_completo',
+        'emprestimo__colaborador__matricula', 'equipamento__nome', 'equipamento__ca',
+        'quantidade_emprestada', 'quantidade_devolvida', 'status_item',
+        'historico_devolucoes__status_devolucao', 'historico_devolucoes__quantidade_devolvida',
+        'historico_devolucoes__data_devolucao',
+    ).order_by('emprestimo_id', 'id', 'historico_devolucoes__id')
+
+    for (emprestimo, data, prevista, status, nome, matricula, equipamento, ca,
+         emprestada, processada, situacao, evento, quantidade, data_evento) in itens.iterator(chunk_size=TAMANHO_LOTE):
+        if status == 'ATIVO' and prevista < hoje:
+            status = 'ATRASADO'
+        yield (
+            emprestimo, f"{data.astimezone(fuso):%d/%m/%Y %H:%M}", f"{prevista:%d/%m/%Y}",
+            status_emprestimo.get(status, status), celula_segura(nome), celula_segura(matricula),
+            celula_segura(equipamento), celula_segura(ca or ''),
+            emprestada, processada, situacao_item.get(situacao, situacao),
+            eventos.get(evento, evento or ''), quantidade if quantidade is not None else '',
+            f"{data_evento.astimezone(fuso):%d/%m/%Y %H:%M}" if data_evento else '',
+        )
+
+
+class _Eco:
+    # "Arquivo" que só devolve o que recebe: o csv.writer formata a linha
+    # e o gerador manda para a resposta, sem acumular nada.
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas):
+    ##
+    ## Converte as linhas em CSV aos poucos (para StreamingHttpResponse ou
+    ## para gravar em arquivo). O cabeçalho sai na hora, antes da consulta;
+    ## depois, blocos de LINHAS_POR_BLOCO linhas (um write por linha
+    ## deixaria a resposta lenta).
+    ##
+    escritor = csv.writer(_Eco(), delimiter=SEPARADOR)
+    yield BOM + escritor.writerow(CABECALHO)
+    bloco = []
+    for linha in linhas:
+        bloco.append(escritor.writerow(linha))
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+async def agerar_csv(linhas):
+    ##
+    ## gerar_csv() para o streaming do ASGI: cada bloco é montado em uma
+    ## thread (sync_to_async), e o loop de eventos fica livre entre um
+    ## bloco e outro. As linhas continuam vindo do iterator() síncrono, na
+    ## mesma conexão do começo ao fim (thread_sensitive).
+    ##
+    partes = gerar_csv(linhas)
+    while (parte := await sync_to_async(next)(partes, None)) is not None:
+        yield parte
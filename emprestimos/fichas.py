@@ -0,0 +1,257 @@
+import logging
+import os
+import shutil
+import textwrap
+import threading
+import zipfile
+from itertools import repeat
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FilteredRelation, Q
+from django.utils import timezone
+
+from colaboradores.models import Colaborador
+from core.pdf import ALTURA_A4, LARGURA_A4, DocumentoPDF, cortar
+from core.processos import criar_pool
+from .models import GeracaoFichas, HistoricoDevolucao, ItemEmprestado
+
+logger = logging.getLogger(__name__)
+
+# Colaboradores lidos do banco (2 consultas) e enviados ao pool por vez
+LOTE_COLABORADORES = 500
+
+PASTA_FICHAS = 'fichas'
+
+DECLARACAO = (
+    "Declaro que recebi gratuitamente os EPIs acima, que fui orientado(a) sobre o uso, "
+    "a guarda e a conservação, e que devo devolvê-los quando solicitado (NR-6)."
+)
+
+# Colunas da tabela: (título, x, largura)
+COLUNAS = [
+    ('Entrega', 40, 60),
+    ('Equipamento', 100, 170),
+    ('C.A.', 270, 50),
+    ('Qtde', 320, 30),
+    ('Devolução', 350, 205),
+]
+MARGEM = 40
+ALTURA_LINHA = 13
+
+
+def pasta_trabalho(geracao):
+    # Uma ficha por arquivo enquanto a geração não termina
+    return Path(settings.MEDIA_ROOT) / PASTA_FICHAS / f'geracao_{geracao.id}'
+
+
+def colaboradores_da_geracao(geracao):
+    colaboradores = Colaborador.objects.filter(data_cadastro__lte=geracao.criado_em)
+    if not geracao.incluir_inativos:
+        colaboradores = colaboradores.filter(status='Ativo')
+    return colaboradores.order_by('id')
+
+
+def dados_fichas(colaboradores, ate):
+    ##
+    ## Dados das fichas de vários colaboradores em 2 consultas: os
+    ## colaboradores e TODOS os itens entregues a eles até 'ate' (JOIN
+    ## com empréstimo e equipamento, LEFT JOIN com as devoluções).
+    ## Retorna uma lista de dicionários simples (vão para outro processo).
+    ##
+    fichas = {
+        pk: {'matricula': matricula, 'nome': nome, 'funcao': funcao, 'itens': []}
+        for pk, matricula, nome, funcao in Colaborador.objects.filter(pk__in=colaboradores)
+        .values_list('id', 'matricula', 'nome_completo', 'funcao').order_by('id')
+    }
+    eventos = dict(HistoricoDevolucao.STATUS_DEVOLUCAO_CHOICES)
+    fuso = timezone.get_current_timezone()
+
+    linhas = ItemEmprestado.objects.filter(
+        emprestimo__colaborador__in=list(fichas), emprestimo__data_emprestimo__lte=ate,
+    ).annotate(
+        devolucoes=FilteredRelation(
+            'historico_devolucoes', condition=Q(historico_devolucoes__data_devolucao__lte=ate)
+        ),
+    ).values_list(
+        'id', 'emprestimo__colaborador_id', 'emprestimo__data_emprestimo',
+        'equipamento__nome', 'equipamento__ca', 'quantidade_emprestada',
+        'devolucoes__status_devolucao', 'devolucoes__quantidade_devolvida', 'devolucoes__data_devolucao',
+    ).order_by('emprestimo__data_emprestimo', 'id', 'devolucoes__id')
+
+    itens = {}
+    for item, colaborador, data, equipamento, ca, quantidade, evento, devolvida, data_evento in linhas:
+        if item not in itens:
+            itens[item] = {
+                'data': data.astimezone(fuso).strftime('%d/%m/%Y'),
+                'equipamento': equipamento, 'ca': ca or '-', 'quantidade': quantidade, 'devolucoes': [],
+            }
+            fichas[colaborador]['itens'].append(itens[item])
+        if evento:
+            itens[item]['devolucoes'].append(
+                f"{devolvida} {eventos.get(evento, evento).lower()} em {data_evento.astimezone(fuso):%d/%m/%Y}"
+            )
+    return list(fichas.values())
+
+
+def _paginas_da_ficha(ficha):
+    # Divide as linhas da tabela em páginas (a última guarda espaço para a assinatura)
+    linhas = []
+    for item in ficha['itens']:
+        devolucoes = item['devolucoes'] or ['']
+        for numero, devolucao in enumerate(devolucoes):
+            linhas.append((item, devolucao) if numero == 0 else (None, devolucao))
+
+    por_pagina = int((ALTURA_A4 - 2 * MARGEM - 140) / ALTURA_LINHA)
+    paginas = [linhas[inicio:inicio + por_pagina] for inicio in range(0, len(linhas), por_pagina)] or [[]]
+    if len(paginas[-1]) > por_pagina - 8:
+        paginas.append([])
+    return paginas
+
+
+def renderizar_ficha(ficha, emitida_em):
+    ##
+    ## Monta o PDF da ficha de EPI de um colaborador e devolve os bytes.
+    ## Não consulta o banco: roda nos processos do pool.
+    ##
+    doc = DocumentoPDF()
+    paginas = _paginas_da_ficha(ficha)
+    for numero, linhas in enumerate(paginas, start=1):
+        if numero > 1:
+            doc.nova_pagina()
+        y = ALTURA_A4 - MARGEM
+        doc.texto(MARGEM, y, 'FICHA DE CONTROLE DE ENTREGA DE EPI', tamanho=14, fonte='negrito')
+        doc.texto(LARGURA_A4 - MARGEM - 70, y, f'Página {numero} de {len(paginas)}', tamanho=8)
+        y -= 22
+        doc.texto(MARGEM, y, f"Colaborador: {cortar(ficha['nome'], 300, 10)}", tamanho=10)
+        doc.texto(380, y, f"Matrícula: {ficha['matricula']}", tamanho=10)
+        y -= 14
+        doc.texto(MARGEM, y, f"Função: {cortar(ficha['funcao'], 300, 10)}", tamanho=10)
+        doc.texto(380, y, f"Emitida em: {emitida_em}", tamanho=10)
+        y -= 24
+
+        for titulo, x, _ in COLUNAS:
+            doc.texto(x, y, titulo, tamanho=9, fonte='negrito')
+        doc.linha(MARGEM, y - 4, LARGURA_A4 - MARGEM, y - 4)
+        y -= ALTURA_LINHA + 4
+
+        if not ficha['itens'] and numero == 1:
+            doc.texto(MARGEM, y, 'Nenhum EPI entregue.', tamanho=9)
+            y -= ALTURA_LINHA
+        for item, devolucao in linhas:
+            if item:
+                valores = [item['data'], item['equipamento'], item['ca'], item['quantidade']]
+                for (_, x, largura), valor in zip(COLUNAS, valores):
+                    doc.texto(x, y, cortar(valor, largura - 4, 9), tamanho=9)
+            _, x, largura = COLUNAS[-1]
+            doc.texto(x, y, cortar(devolucao, largura, 9), tamanho=9)
+            y -= ALTURA_LINHA
+
+    y -= 10
+    for linha in textwrap.wrap(DECLARACAO, 115):
+        doc.texto(MARGEM, y, linha, tamanho=8)
+        y -= 11
+    y -= 40
+    doc.linha(MARGEM, y, MARGEM + 220, y)
+    doc.linha(320, y, LARGURA_A4 - MARGEM, y)
+    doc.texto(MARGEM, y - 12, 'Assinatura do colaborador', tamanho=8)
+    doc.texto(320, y - 12, 'Responsável pela entrega', tamanho=8)
+    return doc.gerar()
+
+
+def gravar_ficha(ficha, pasta, emitida_em):
+    ##
+    ## Renderiza e grava a ficha (nome temporário + os.replace: uma ficha
+    ## interrompida no meio nunca fica parecendo pronta).
+    ## Função de módulo para poder ser enviada ao pool de processos.
+    ##
+    destino = Path(pasta) / f"ficha_{ficha['matricula']}.pdf"
+    temporario = destino.with_suffix('.tmp')
+    temporario.write_bytes(renderizar_ficha(ficha, emitida_em))
+    os.replace(temporario, destino)
+    return ficha['matricula']
+
+
+def executar_geracao(geracao, processos=None, progresso=None, metodo=None):
+    ##
+    ## Gera (ou retoma) as fichas de uma GeracaoFichas:
+    ##   1. quem já tem o PDF na pasta de trabalho é pulado (retomada);
+    ##   2. os demais vão em lotes de LOTE_COLABORADORES: 2 consultas por
+    ##      lote e os PDFs em paralelo, em 'processos' processos
+    ##      (padrão: um por CPU; 1 = sem pool, no próprio processo);
+    ##   3. no fim, os PDFs viram um único .zip e a pasta é apagada.
+    ## 'progresso(geracao)' é chamado a cada lote.
+    ## 'metodo': modo de início dos processos (ver core/processos.py).
+    ##
+    pasta = pasta_trabalho(geracao)
+    pasta.mkdir(parents=True, exist_ok=True)
+    prontas = {arquivo.stem.removeprefix('ficha_') for arquivo in pasta.glob('ficha_*.pdf')}
+
+    colaboradores = colaboradores_da_geracao(geracao)
+    geracao.total = colaboradores.count()
+    geracao.processados = len(prontas)
+    geracao.status = 'EXECUTANDO'
+    geracao.erro = ''
+    geracao.save(update_fields=['total', 'processados', 'status', 'erro', 'atualizado_em'])
+
+    emitida_em = timezone.localtime(geracao.criado_em).strftime('%d/%m/%Y')
+    pool = criar_pool(processos, metodo) if processos != 1 else None
+    try:
+        faltando = [pk for pk, matricula in colaboradores.values_list('id', 'matricula') if matricula not in prontas]
+        for inicio in range(0, len(faltando), LOTE_COLABORADORES):
+            fichas = dados_fichas(faltando[inicio:inicio + LOTE_COLABORADORES], geracao.criado_em)
+            argumentos = (fichas, repeat(pasta), repeat(emitida_em))
+            gravadas = pool.map(gravar_ficha, *argumentos, chunksize=20) if pool else map(gravar_ficha, *argumentos)
+            geracao.processados += sum(1 for _ in gravadas)
+            geracao.save(update_fields=['processados', 'atualizado_em'])
+            if progresso:
+                progresso(geracao)
+
+        geracao.arquivo.name = _compactar(geracao, pasta)
+        geracao.status = 'CONCLUIDO'
+        geracao.save(update_fields=['arquivo', 'status', 'atualizado_em'])
+        shutil.rmtree(pasta)
+    except BaseException as erro:
+        # Inclui Ctrl+C: a geração fica marcada para ser retomada
+        geracao.status = 'ERRO'
+        geracao.erro = str(erro) or erro.__class__.__name__
+        geracao.save(update_fields=['status', 'erro', 'atualizado_em'])
+        raise
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return geracao
+
+
+def _compactar(geracao, pasta):
+    # Junta os PDFs em um .zip (gravado com outro nome e renomeado no fim)
+    nome = f'{PASTA_FICHAS}/fichas_epi_{geracao.id}.zip'
+    destino = Path(settings.MEDIA_ROOT) / nome
+    temporario = destino.with_suffix('.tmp')
+    # Os PDFs já são comprimidos: ZIP_STORED evita comprimir de novo
+    with zipfile.ZipFile(temporario, 'w', zipfile.ZIP_STORED) as arquivo:
+        for ficha in sorted(pasta.glob('ficha_*.pdf')):
+            arquivo.write(ficha, ficha.name)
+    os.replace(temporario, destino)
+    return nome
+
+
+def iniciar_em_segundo_plano(geracao_id):
+    ##
+    ## Usado pela tela da equipe: gera as fichas em uma thread para não
+    ## prender a requisição. Se o servidor reiniciar no meio, a geração
+    ## fica como está e pode ser retomada (pela tela ou pelo comando).
+    ## O pool usa 'spawn': um fork do worker web (com outras threads no
+    ## meio de logging, banco ou cache) pode travar os filhos, que ainda
+    ## herdariam a conexão aberta com o banco.
+    ##
+    def executar():
+        try:
+            executar_geracao(GeracaoFichas.objects.get(pk=geracao_id), metodo='spawn')
+        except Exception:
+            logger.exception("Falha na geração das fichas de EPI #%s", geracao_id)
+        finally:
+            connection.close()
+
+    threading.Thread(target=executar, daemon=True).start()
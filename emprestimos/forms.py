@@ -1,10 +1,14 @@
+import re
+
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from django.utils import timezone
 from .models import Emprestimo, ItemEmprestado, HistoricoDevolucao
 from colaboradores.models import Colaborador
 from equipamentos.models import Equipamento
 from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+from core.widgets import AutocompleteSelect
 
 ## --- Formulário 1: O "Cabeçalho" do Empréstimo ---
 
@@ -14,7 +18,9 @@ class EmprestimoForm(forms.ModelForm):
     ##
     colaborador = forms.ModelChoiceField(
         queryset=Colaborador.objects.filter(status='Ativo').order_by('nome_completo'),
-        label="Colaborador"
+        label="Colaborador",
+        # Não renderiza todos os colaboradores: a busca é feita por JSON
+        widget=AutocompleteSelect(url=reverse_lazy('colaborador_autocomplete'))
     )
 
     class Meta:
@@ -38,6 +44,34 @@ class EmprestimoForm(forms.ModelForm):
 
 ## --- Formulário 2: Os "Itens" do Empréstimo (Carrinho) ---
 
+class EquipamentoChoiceField(forms.ModelChoiceField):
+    ##
+    ## Campo de equipamento que aproveita os objetos já carregados pelo
+    ## formset (uma consulta para o carrinho inteiro, direto do banco),
+    ## em vez de fazer um SELECT por linha ao validar.
+    ##
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.carregados = {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            equipamento = self.carregados.get(int(value))
+        except (TypeError, ValueError):
+            equipamento = None
+        if equipamento is None:
+            return super().to_python(value)
+        if equipamento.estoque_disponivel <= 0:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return equipamento
+
+
 class ItemEmprestadoForm(forms.ModelForm):
     ##
     ## Formulário para um item individual do empréstimo.
@@ -45,16 +79,35 @@ class ItemEmprestadoForm(forms.ModelForm):
     class Meta:
         model = ItemEmprestado
         fields = ['equipamento', 'quantidade_emprestada'] 
+        field_classes = {'equipamento': EquipamentoChoiceField}
+        widgets = {
+            'equipamento': AutocompleteSelect(url=reverse_lazy('equipamento_autocomplete')),
+        }
 
     def __init__(self, *args, **kwargs):
+        equipamentos_carregados = kwargs.pop('equipamentos_carregados', None)
+        opcoes_equipamento = kwargs.pop('opcoes_equipamento', None)
         super(ItemEmprestadoForm, self).__init__(*args, **kwargs)
         
         self.fields['equipamento'].queryset = Equipamento.objects.filter(
             estoque_disponivel__gt=0
         ).order_by('nome')
+
+        if equipamentos_carregados:
+            self.fields['equipamento'].carregados = equipamentos_carregados
+        if opcoes_equipamento is not None:
+            # Só os equipamentos enviados (o widget só mostra o escolhido)
+            self.fields['equipamento'].choices = opcoes_equipamento
         self.fields['equipamento'].label = "Equipamento"
         self.fields['quantidade_emprestada'].label = "Qtde. Emprestada"
 
+    def _get_validation_exclusions(self):
+        # O equipamento já foi validado (e carregado) pelo próprio campo;
+        # evita o SELECT extra de verificação da chave estrangeira por linha.
+        exclusoes = super()._get_validation_exclusions()
+        exclusoes.add('equipamento')
+        return exclusoes
+
     def clean(self):
         cleaned_data = super().clean()
         equipamento = cleaned_data.get('equipamento')
@@ -80,7 +133,10 @@ class ItemEmprestadoForm(forms.ModelForm):
             if tem_quantidade and quantidade <= 0:
                 self.add_error('quantidade_emprestada', "A quantidade deve ser pelo menos 1.")
             
-            # Erro 4: Verifica estoque (apenas se tudo o resto estiver ok e qtd > 0)
+            # Erro 4: Verifica estoque (apenas se tudo o resto estiver ok e qtd > 0).
+            # O equipamento veio do banco nesta requisição (nunca do cache,
+            # que pode estar atrasado em outro processo); a palavra final é
+            # do reservar_lote, na gravação.
             elif tem_equipamento and tem_quantidade and quantidade > 0:
                 if quantidade > equipamento.estoque_disponivel:
                     self.add_error(
@@ -92,10 +148,63 @@ class ItemEmprestadoForm(forms.ModelForm):
 
 ## --- Formulário 3: O "FormSet" que junta tudo ---
 
+class BaseItemEmprestadoFormSet(BaseInlineFormSet):
+    ##
+    ## Valida o carrinho inteiro de uma vez:
+    ##   - só os equipamentos enviados no carrinho são lidos, em UMA
+    ##     consulta (in_bulk) compartilhada por todas as linhas. O
+    ##     carrinho vazio (GET) não consulta nada: o widget busca as
+    ##     opções pelo autocomplete.
+    ##   - detecta equipamento repetido com um set (sem consultas extras)
+    ##
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.equipamentos_carregados = Equipamento.objects.in_bulk(self._equipamentos_enviados())
+        self.opcoes_equipamento = [('', '---------')] + [
+            (equipamento.pk, str(equipamento))
+            for equipamento in sorted(self.equipamentos_carregados.values(), key=lambda e: e.nome)
+        ]
+
+    def _equipamentos_enviados(self):
+        if not self.is_bound:
+            return []
+        campo = re.compile(rf'^{re.escape(self.prefix)}-\d+-equipamento$')
+        pks = set()
+        for chave, valor in self.data.items():
+            if campo.match(chave):
+                try:
+                    pks.add(int(valor))
+                except (TypeError, ValueError):
+                    continue
+        return pks
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['equipamentos_carregados'] = self.equipamentos_carregados
+        kwargs['opcoes_equipamento'] = self.opcoes_equipamento
+        return kwargs
+
+    def clean(self):
+        super().clean()
+        no_carrinho = set()
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or self._should_delete_form(form):
+                continue
+            equipamento = form.cleaned_data.get('equipamento')
+            if equipamento is None:
+                continue
+            if equipamento.pk in no_carrinho:
+                raise ValidationError(
+                    f"Erro: O equipamento '{equipamento.nome}' foi adicionado mais de uma vez."
+                )
+            no_carrinho.add(equipamento.pk)
+
+
 ItemEmprestadoFormSet = inlineformset_factory(
     Emprestimo,          
     ItemEmprestado,      
     form=ItemEmprestadoForm, 
+    formset=BaseItemEmprestadoFormSet,
     fields=['equipamento', 'quantidade_emprestada'],
     extra=1,             
     can_delete=True,     
@@ -154,4 +263,38 @@ class DevolucaoParcialForm(forms.ModelForm):
             raise ValidationError(
                 f"A quantidade a devolver não pode ser maior que a quantidade pendente ({pendente})."
             )
-        return quantidade
\ No newline at end of file
+        return quantidade
+
+
+## --- Formulário 4: Filtros da exportação do histórico ---
+
+class FiltroExportacaoForm(forms.Form):
+    ##
+    ## Filtros (via GET) da exportação do histórico em CSV.
+    ## Todos opcionais: sem filtro, exporta o histórico inteiro.
+    ##
+    data_inicio = forms.DateField(
+        required=False, label="De",
+        widget=forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d'),
+    )
+    data_fim = forms.DateField(
+        required=False, label="Até",
+        widget=forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d'),
+    )
+    status = forms.ChoiceField(
+        required=False, label="Status",
+        choices=[('', 'Todos os status')] + Emprestimo.STATUS_CHOICES,
+    )
+    colaborador = forms.ModelChoiceField(
+        queryset=Colaborador.objects.all(), required=False, label="Colaborador",
+        empty_label="Todos os colaboradores",
+        widget=AutocompleteSelect(url=reverse_lazy('colaborador_autocomplete')),
+    )
+    q = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio, fim = cleaned_data.get('data_inicio'), cleaned_data.get('data_fim')
+        if inicio and fim and inicio > fim:
+            raise ValidationError("A data inicial não pode ser depois da data final.")
+        return cleaned_data
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.utils import timezone
+
+from core import cache
+from .models import Emprestimo, ContadorStatus
+
+
+def contadores_ativos():
+    ##
+    ## Indica se a tabela de contadores (ContadorStatus) está ligada.
+    ##
+    return getattr(settings, 'EMPRESTIMOS_KPI_CONTADORES', False)
+
+
+def _zerados():
+    return {status: 0 for status, _ in Emprestimo.STATUS_CHOICES}
+
+
+def contar_por_status(hoje=None):
+    ##
+    ## Conta os empréstimos de cada status em UMA consulta agrupada.
+    ## O atraso é calculado pela data prevista (igual à lista), então o
+    ## resultado está certo mesmo antes da varredura diária.
+    ##
+    hoje = hoje or timezone.now().date()
+    linhas = (
+        Emprestimo.objects
+        .annotate(status_atual=Case(
+            When(status='ATIVO', data_prevista_devolucao__lt=hoje, then=Value('ATRASADO')),
+            default=F('status'),
+            output_field=CharField(),
+        ))
+        .values('status_atual')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    totais = _zerados()
+    for linha in linhas:
+        totais[linha['status_atual']] = linha['total']
+    return totais
+
+
+def obter_kpis(hoje=None):
+    ##
+    ## Retorna {status: total} para o painel.
+    ## Com os contadores ligados, lê a tabela ContadorStatus (custo constante).
+    ## Nesse modo, o ATRASADO reflete a última varredura diária.
+    ##
+    if not contadores_ativos():
+        # A contagem agrupada varre a tabela: fica no cache até algum
+        # empréstimo mudar (ou o dia virar, por causa dos atrasos)
+        hoje = hoje or timezone.now().date()
+        return cache.obter(
+            'emprestimos:kpis', [cache.EMPRESTIMOS], lambda: contar_por_status(hoje), hoje.isoformat()
+        )
+    totais = _zerados()
+    totais.update(ContadorStatus.objects.values_list('status', 'total'))
+    return totais
+
+
+def registrar_transicao(status_anterior, status_novo, quantidade=1):
+    ##
+    ## Atualiza os contadores quando empréstimos mudam de status.
+    ## Deve ser chamada dentro da mesma transação da mudança.
+    ##   - status_anterior=None: empréstimo novo
+    ##
+    if not quantidade or status_anterior == status_novo:
+        return
+    # Mudanças por UPDATE em massa não disparam sinais: invalida aqui
+    cache.invalidar_ao_confirmar(cache.EMPRESTIMOS)
+    if not contadores_ativos():
+        return
+    if status_anterior:
+        _somar(status_anterior, -quantidade)
+    if status_novo:
+        _somar(status_novo, quantidade)
+
+
+def _somar(status, quantidade):
+    # UPDATE atômico no banco (total = total + x); cria a linha se faltar
+    atualizados = ContadorStatus.objects.filter(status=status).update(
+        total=F('total') + quantidade
+    )
+    if not atualizados:
+        ContadorStatus.objects.get_or_create(status=status)
+        ContadorStatus.objects.filter(status=status).update(
+            total=F('total') + quantidade
+        )
+
+
+@transaction.atomic
+def reconstruir_contadores():
+    ##
+    ## Recalcula a tabela de contadores do zero a partir dos
+    ## status gravados em Emprestimo. Retorna os totais gravados.
+    ##
+    totais = _zerados()
+    for linha in Emprestimo.objects.values('status').annotate(total=Count('id')).order_by():
+        totais[linha['status']] = linha['total']
+
+    ContadorStatus.objects.all().delete()
+    ContadorStatus.objects.bulk_create(
+        ContadorStatus(status=status, total=total) for status, total in totais.items()
+    )
+    return totais
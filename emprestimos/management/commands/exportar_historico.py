@@ -0,0 +1,51 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from colaboradores.models import Colaborador
+from emprestimos.exportacao import filtrar_emprestimos, gerar_csv, linhas_historico
+from emprestimos.models import Emprestimo
+
+
+def _data(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise CommandError(f"Data inválida: '{texto}' (use AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o histórico de empréstimos e devoluções em CSV (para auditoria), "
+        "lendo o banco aos poucos: a memória usada não depende do tamanho do histórico."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=_data, help="Empréstimos a partir deste dia (AAAA-MM-DD).")
+        parser.add_argument('--fim', type=_data, help="Empréstimos até este dia, inclusive (AAAA-MM-DD).")
+        parser.add_argument('--status', choices=[valor for valor, _ in Emprestimo.STATUS_CHOICES])
+        parser.add_argument('--matricula', help="Somente os empréstimos deste colaborador.")
+        parser.add_argument('--saida', help="Arquivo CSV de saída (padrão: imprime na tela).")
+
+    def handle(self, *args, **options):
+        colaborador = None
+        if options['matricula']:
+            colaborador = Colaborador.objects.filter(matricula=options['matricula']).first()
+            if colaborador is None:
+                raise CommandError(f"Nenhum colaborador com a matrícula {options['matricula']}.")
+
+        emprestimos = filtrar_emprestimos(
+            data_inicio=options['inicio'],
+            data_fim=options['fim'],
+            status=options['status'],
+            colaborador=colaborador,
+        )
+        partes = gerar_csv(linhas_historico(emprestimos))
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(partes)
+            self.stderr.write(self.style.SUCCESS(f"Histórico gravado em {options['saida']}."))
+        else:
+            sys.stdout.writelines(partes)
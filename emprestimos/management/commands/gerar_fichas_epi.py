@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from emprestimos.fichas import executar_geracao
+from emprestimos.models import GeracaoFichas
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera a ficha de EPI (PDF) de cada colaborador, em paralelo, "
+        "em um único arquivo .zip. Uma geração interrompida pode ser retomada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incluir-inativos', action='store_true', dest='incluir_inativos',
+            help="Também gera as fichas dos colaboradores inativos.",
+        )
+        parser.add_argument(
+            '--retomar', type=int, metavar='ID',
+            help="Continua a geração informada (pula as fichas já geradas).",
+        )
+        parser.add_argument(
+            '--processos', type=int,
+            help="Quantidade de processos (padrão: um por CPU; 1 = sem paralelismo).",
+        )
+
+    def handle(self, *args, **options):
+        if options['retomar']:
+            geracao = GeracaoFichas.objects.filter(pk=options['retomar']).first()
+            if geracao is None:
+                raise CommandError(f"Geração #{options['retomar']} não encontrada.")
+            if geracao.status == 'CONCLUIDO':
+                raise CommandError(f"A geração #{geracao.id} já foi concluída: {geracao.arquivo.path}")
+            if not GeracaoFichas.objects.reservar_retomada(geracao.pk):
+                raise CommandError(f"A geração #{geracao.id} está em andamento (pela tela ou por outro comando).")
+        else:
+            geracao = GeracaoFichas.objects.create(incluir_inativos=options['incluir_inativos'])
+            self.stdout.write(f"Geração #{geracao.id} criada (use --retomar {geracao.id} se for interrompida).")
+
+        def progresso(geracao):
+            self.stdout.write(f"{geracao.processados}/{geracao.total} fichas ({geracao.percentual}%)")
+
+        if options['processos'] is not None and options['processos'] < 1:
+            raise CommandError("--processos precisa ser pelo menos 1.")
+        executar_geracao(geracao, processos=options['processos'], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(f"{geracao.total} ficha(s) gravada(s) em {geracao.arquivo.path}."))
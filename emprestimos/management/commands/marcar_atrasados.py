@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from emprestimos.atrasos import marcar_emprestimos_atrasados
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como ATRASADO os empréstimos ativos com a data prevista vencida. "
+        "Feito para rodar uma vez por dia (cron), logo após a meia-noite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help="Ignora a marca d'água e revisa todos os empréstimos ativos.",
+        )
+
+    def handle(self, *args, **options):
+        total = marcar_emprestimos_atrasados(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(f"{total} empréstimo(s) marcado(s) como atrasado(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from emprestimos.kpis import reconstruir_contadores
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero a tabela de contadores de KPIs (ContadorStatus)."
+
+    def handle(self, *args, **options):
+        totais = reconstruir_contadores()
+        for status, total in totais.items():
+            self.stdout.write(f"{status}: {total}")
+        self.stdout.write(self.style.SUCCESS("Contadores reconstruídos."))
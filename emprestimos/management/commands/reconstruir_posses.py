@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from colaboradores.models import Colaborador
+from emprestimos.posse import divergencias, reconstruir_posses
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a tabela de posse (o que cada colaborador tem em mãos) "
+        "a partir dos itens emprestados ainda pendentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matricula', help="Recalcula só este colaborador.")
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help="Só compara a tabela com os itens emprestados, sem gravar nada.",
+        )
+
+    def handle(self, *args, **options):
+        colaboradores = None
+        if options['matricula']:
+            colaboradores = list(Colaborador.objects.filter(matricula=options['matricula']).values_list('id', flat=True))
+            if not colaboradores:
+                raise CommandError(f"Nenhum colaborador com a matrícula {options['matricula']}.")
+
+        if options['verificar']:
+            diferentes = divergencias(colaboradores)
+            for colaborador_id, equipamento_id in sorted(diferentes):
+                self.stdout.write(self.style.WARNING(
+                    f"Colaborador #{colaborador_id}, equipamento #{equipamento_id}: posse diferente dos itens emprestados."
+                ))
+            if not diferentes:
+                self.stdout.write("Tabela de posse confere com os itens emprestados.")
+            return
+
+        gravadas = reconstruir_posses(colaboradores)
+        self.stdout.write(self.style.SUCCESS(f"Tabela de posse recalculada: {gravadas} linha(s)."))
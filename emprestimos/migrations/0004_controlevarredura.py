@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emprestimos', '0003_alter_itememprestado_status_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControleVarredura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True)),
+                ('executada_ate', models.DateField()),
+                ('data_execucao', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emprestimos', '0004_controlevarredura'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('ATIVO', 'Ativo'), ('DEVOLVIDO', 'Devolvido'), ('ATRASADO', 'Atrasado')], max_length=20, unique=True)),
+                ('total', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def preencher_quantidade_devolvida(apps, schema_editor):
+    # Calcula o total já devolvido de cada item a partir do histórico
+    ItemEmprestado = apps.get_model("emprestimos", "ItemEmprestado")
+    HistoricoDevolucao = apps.get_model("emprestimos", "HistoricoDevolucao")
+    soma = (
+        HistoricoDevolucao.objects.filter(item_emprestado=OuterRef("pk"))
+        .values("item_emprestado")
+        .annotate(total=Sum("quantidade_devolvida"))
+        .values("total")
+    )
+    ItemEmprestado.objects.filter(historico_devolucoes__isnull=False).update(
+        quantidade_devolvida=Subquery(soma)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emprestimos", "0005_contadorstatus"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itememprestado",
+            name="quantidade_devolvida",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Qtde. Devolvida"
+            ),
+        ),
+        migrations.RunPython(preencher_quantidade_devolvida, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("colaboradores", "0003_colaborador_colaborador_status_nome_idx"),
+        ("emprestimos", "0006_itememprestado_quantidade_devolvida"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="historicodevolucao",
+            name="item_emprestado",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="historico_devolucoes",
+                to="emprestimos.itememprestado",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emprestimo",
+            index=models.Index(
+                fields=["status", "data_prevista_devolucao"],
+                name="emprestimo_status_prev_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emprestimo",
+            index=models.Index(
+                fields=["data_emprestimo", "id"], name="emprestimo_data_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emprestimo",
+            index=models.Index(
+                fields=["status", "data_emprestimo", "id"],
+                name="emprestimo_status_data_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicodevolucao",
+            index=models.Index(
+                fields=["item_emprestado", "data_devolucao"],
+                name="historico_item_data_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emprestimos", "0007_indices_consultas"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeracaoFichas",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("criado_em", models.DateTimeField(default=django.utils.timezone.now)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                ("incluir_inativos", models.BooleanField(default=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDENTE", "Pendente"),
+                            ("EXECUTANDO", "Executando"),
+                            ("CONCLUIDO", "Concluído"),
+                            ("ERRO", "Interrompida"),
+                        ],
+                        default="PENDENTE",
+                        max_length=20,
+                    ),
+                ),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("processados", models.PositiveIntegerField(default=0)),
+                ("arquivo", models.FileField(blank=True, upload_to="fichas/")),
+                ("erro", models.TextField(blank=True)),
+                (
+                    "solicitante",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-criado_em"],
+            },
+        ),
+    ]
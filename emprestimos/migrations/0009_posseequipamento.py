@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Min, Sum
+
+
+def calcular_posses(apps, schema_editor):
+    # Preenche a tabela com o que já está emprestado (itens pendentes)
+    ItemEmprestado = apps.get_model("emprestimos", "ItemEmprestado")
+    PosseEquipamento = apps.get_model("emprestimos", "PosseEquipamento")
+    posses = (
+        ItemEmprestado.objects.filter(status_item="PENDENTE")
+        .values_list("emprestimo__colaborador_id", "equipamento_id")
+        .annotate(
+            quantidade=Sum(F("quantidade_emprestada") - F("quantidade_devolvida")),
+            data=Min("emprestimo__data_prevista_devolucao"),
+        )
+        .filter(quantidade__gt=0)
+        .order_by()
+    )
+    PosseEquipamento.objects.bulk_create(
+        [
+            PosseEquipamento(
+                colaborador_id=colaborador,
+                equipamento_id=equipamento,
+                quantidade=quantidade,
+                devolucao_mais_antiga=data,
+            )
+            for colaborador, equipamento, quantidade, data in posses.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("colaboradores", "0003_colaborador_colaborador_status_nome_idx"),
+        ("emprestimos", "0008_geracaofichas"),
+        ("equipamentos", "0004_livro_estoque"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PosseEquipamento",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantidade", models.PositiveIntegerField()),
+                ("devolucao_mais_antiga", models.DateField()),
+                (
+                    "colaborador",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="posses",
+                        to="colaboradores.colaborador",
+                    ),
+                ),
+                (
+                    "equipamento",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="posses",
+                        to="equipamentos.equipamento",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("colaborador", "equipamento"),
+                        name="posse_colaborador_equipamento_unica",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(calcular_posses, migrations.RunPython.noop),
+    ]
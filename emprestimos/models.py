@@ -1,12 +1,35 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.utils import timezone
 from colaboradores.models import Colaborador
 from equipamentos.models import Equipamento
 from django.core.exceptions import ValidationError
-from django.db.models import Sum # (NOVO) Para somar as devoluções
+from django.db.models import F, Q
 
 # Create your models here.
 
+class EmprestimoQuerySet(models.QuerySet):
+    ##
+    ## Consultas de Empréstimo que levam em conta o atraso "em tempo real".
+    ##
+    ## A varredura diária (comando 'marcar_atrasados') é quem grava
+    ## status='ATRASADO' no banco. Entre uma varredura e outra, um empréstimo
+    ## ATIVO com a data prevista já vencida é tratado como atrasado aqui,
+    ## sem precisar escrever nada durante a leitura da página.
+    ##
+    def filtrar_status(self, status, hoje=None):
+        hoje = hoje or timezone.now().date()
+        if status == 'ATRASADO':
+            return self.filter(
+                Q(status='ATRASADO') |
+                Q(status='ATIVO', data_prevista_devolucao__lt=hoje)
+            )
+        if status == 'ATIVO':
+            return self.filter(status='ATIVO', data_prevista_devolucao__gte=hoje)
+        return self.filter(status=status)
+
+
 class Emprestimo(models.Model):
     ##
     ## Modelo "Mestre" que representa uma transação de empréstimo.
@@ -41,10 +64,34 @@ class Emprestimo(models.Model):
         null=True, 
         verbose_name="Observação"
     )
+
+    objects = EmprestimoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Varredura de atrasos, KPIs e filtro por status
+            models.Index(fields=['status', 'data_prevista_devolucao'], name='emprestimo_status_prev_idx'),
+            # Ordem do histórico e paginação por cursor (-data_emprestimo, -id)
+            models.Index(fields=['data_emprestimo', 'id'], name='emprestimo_data_id_idx'),
+            # Histórico filtrado por status, na mesma ordem da paginação
+            models.Index(fields=['status', 'data_emprestimo', 'id'], name='emprestimo_status_data_idx'),
+        ]
     
     def __str__(self):
         return f"Empréstimo #{self.id} - {self.colaborador.nome_completo}"
 
+    def get_status_efetivo(self):
+        ##
+        ## Status para exibição: um empréstimo ATIVO com a data prevista
+        ## vencida já aparece como ATRASADO, mesmo antes da varredura diária.
+        ##
+        if self.status == 'ATIVO' and self.data_prevista_devolucao < timezone.now().date():
+            return 'ATRASADO'
+        return self.status
+
+    def get_status_efetivo_display(self):
+        return dict(self.STATUS_CHOICES).get(self.get_status_efetivo())
+
     def clean(self):
         # Verifica se o campo está preenchido antes de comparar
         if self.data_prevista_devolucao and self.data_prevista_devolucao < timezone.now().date():
@@ -76,6 +123,13 @@ class ItemEmprestado(models.Model):
     )
  
     quantidade_emprestada = models.PositiveIntegerField(default=1) 
+
+    # Total já processado no histórico (devolvido, danificado ou perdido).
+    # Mantido pelo HistoricoDevolucao.save(), evita um SUM a cada consulta.
+    quantidade_devolvida = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Qtde. Devolvida"
+    )
     
     status_item = models.CharField(
         max_length=20, 
@@ -89,14 +143,10 @@ class ItemEmprestado(models.Model):
         
     def get_quantidade_devolvida_total(self):
         ##
-        ## Soma todas as quantidades nos registros de histórico.
+        ## Total já registrado no histórico de devoluções.
+        ## (Campo desnormalizado, não faz consulta ao banco)
         ##
-        # Acessa o 'historico_devolucoes' (related_name do novo modelo)
-        # e soma o campo 'quantidade_devolvida'
-        soma = self.historico_devolucoes.aggregate(
-            total=Sum('quantidade_devolvida')
-        )['total']
-        return soma or 0 # Retorna 0 se for None
+        return self.quantidade_devolvida
         
     def get_quantidade_pendente(self):
         ##
@@ -119,7 +169,8 @@ class HistoricoDevolucao(models.Model):
     item_emprestado = models.ForeignKey(
         ItemEmprestado,
         on_delete=models.CASCADE,
-        related_name="historico_devolucoes" # Como ItemEmprestado acessa este modelo
+        related_name="historico_devolucoes", # Como ItemEmprestado acessa este modelo
+        db_index=False # Coberto pelo índice (item_emprestado, data_devolucao) do Meta
     )
     quantidade_devolvida = models.PositiveIntegerField()
     data_devolucao = models.DateTimeField(auto_now_add=True)
@@ -129,5 +180,171 @@ class HistoricoDevolucao(models.Model):
     )
     observacao = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Histórico de um item já ordenado por data (Prefetch do detalhe)
+            models.Index(fields=['item_emprestado', 'data_devolucao'], name='historico_item_data_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantidade_devolvida}x {self.get_status_devolucao_display()} em {self.data_devolucao.strftime('%d/%m/%Y')}"
+
+    def save(self, *args, **kwargs):
+        ##
+        ## Ao criar um registro, soma a quantidade no ItemEmprestado
+        ## (quantidade_devolvida) na mesma transação, com UPDATE atômico.
+        ## O UPDATE só acontece se ainda houver quantidade pendente; se outra
+        ## devolução chegou antes, nada é gravado e levanta ValidationError.
+        ##
+        novo = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if novo:
+                atualizados = ItemEmprestado.objects.filter(
+                    pk=self.item_emprestado_id,
+                    quantidade_devolvida__lte=F('quantidade_emprestada') - self.quantidade_devolvida,
+                ).update(
+                    quantidade_devolvida=F('quantidade_devolvida') + self.quantidade_devolvida
+                )
+                if not atualizados:
+                    raise ValidationError(
+                        "A quantidade a devolver é maior que a quantidade pendente."
+                    )
+                # Mantém a instância em memória coerente com o banco
+                self.item_emprestado.quantidade_devolvida += self.quantidade_devolvida
+
+
+
+class ControleVarredura(models.Model):
+    ##
+    ## Guarda a "marca d'água" das tarefas agendadas (ex: varredura de atrasos).
+    ## 'executada_ate' é o dia da última execução: tudo que venceu antes
+    ## dessa data já foi processado, então a próxima execução só olha
+    ## os empréstimos que venceram depois dela.
+    ##
+    nome = models.CharField(max_length=50, unique=True)
+    executada_ate = models.DateField()
+    data_execucao = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nome} (até {self.executada_ate.strftime('%d/%m/%Y')})"
+
+
+
+class ContadorStatus(models.Model):
+    ##
+    ## Contador de empréstimos por status (tabela de KPIs).
+    ## Atualizado na mesma transação de cada mudança de status,
+    ## para que o cabeçalho do painel custe O(1).
+    ## Só é usado quando settings.EMPRESTIMOS_KPI_CONTADORES = True.
+    ##
+    status = models.CharField(
+        max_length=20,
+        choices=Emprestimo.STATUS_CHOICES,
+        unique=True
+    )
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.total}"
+
+
+class GeracaoFichasQuerySet(models.QuerySet):
+
+    def retomaveis(self, agora=None):
+        # Interrompidas, ou "em andamento" sem progresso há muito tempo
+        limite = (agora or timezone.now()) - GeracaoFichas.TEMPO_SEM_PROGRESSO
+        return self.filter(
+            Q(status='ERRO') | Q(status__in=('PENDENTE', 'EXECUTANDO'), atualizado_em__lt=limite)
+        )
+
+    def reservar_retomada(self, pk):
+        ##
+        ## Marca a geração como PENDENTE (com progresso "agora") em um
+        ## UPDATE condicional: de duas retomadas ao mesmo tempo (duas
+        ## abas, tela + comando), só uma muda a linha e segue para gerar
+        ## as fichas na mesma pasta de trabalho. Retorna True para ela.
+        ##
+        agora = timezone.now()
+        return self.retomaveis(agora).filter(pk=pk).update(status='PENDENTE', erro='', atualizado_em=agora) == 1
+
+
+class GeracaoFichas(models.Model):
+    ##
+    ## Uma geração em lote das fichas de EPI (um PDF por colaborador,
+    ## juntos em um .zip). Guarda o progresso para a tela e para poder
+    ## retomar a geração se ela for interrompida.
+    ## Só entram empréstimos e colaboradores cadastrados até 'criado_em':
+    ## ao retomar, as fichas que faltam saem iguais às já geradas.
+    ##
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDO', 'Concluído'),
+        ('ERRO', 'Interrompida'),
+    ]
+
+    criado_em = models.DateTimeField(default=timezone.now)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    solicitante = models.ForeignKey(
+        'auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    incluir_inativos = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+    total = models.PositiveIntegerField(default=0)
+    processados = models.PositiveIntegerField(default=0)
+    arquivo = models.FileField(upload_to='fichas/', blank=True)
+    erro = models.TextField(blank=True)
+
+    # Sem progresso por esse tempo, uma geração "em andamento" está parada
+    # (ex: o servidor reiniciou no meio) e pode ser retomada
+    TEMPO_SEM_PROGRESSO = timedelta(minutes=10)
+
+    objects = GeracaoFichasQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"Fichas de EPI #{self.id} ({self.get_status_display()})"
+
+    @property
+    def pode_retomar(self):
+        if self.status == 'ERRO':
+            return True
+        parada = self.atualizado_em < timezone.now() - self.TEMPO_SEM_PROGRESSO
+        return self.status in ('PENDENTE', 'EXECUTANDO') and parada
+
+    @property
+    def percentual(self):
+        return round(100 * self.processados / self.total) if self.total else 0
+
+
+class PosseEquipamento(models.Model):
+    ##
+    ## O que cada colaborador tem em mãos agora: uma linha por
+    ## (colaborador, equipamento) com a quantidade ainda não devolvida e a
+    ## data prevista de devolução mais antiga entre os itens pendentes.
+    ## Mantida na mesma transação de cada empréstimo e devolução
+    ## (emprestimos/posse.py); o comando 'reconstruir_posses' recalcula
+    ## tudo a partir dos itens emprestados.
+    ##
+    colaborador = models.ForeignKey(
+        Colaborador,
+        on_delete=models.CASCADE,
+        related_name='posses',
+        db_index=False,  # Coberto pela restrição única (colaborador, equipamento)
+    )
+    equipamento = models.ForeignKey(Equipamento, on_delete=models.CASCADE, related_name='posses')
+    quantidade = models.PositiveIntegerField()
+    devolucao_mais_antiga = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['colaborador', 'equipamento'], name='posse_colaborador_equipamento_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.colaborador}: {self.quantidade}x {self.equipamento}"
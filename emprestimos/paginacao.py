@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class PaginaCursor:
+    ##
+    ## Resultado de uma página da paginação por cursor (keyset).
+    ## Guarda os itens da página e os cursores para os links
+    ## "Próxima" e "Anterior".
+    ##
+    def __init__(self, itens, cursor_proximo=None, cursor_anterior=None):
+        self.itens = itens
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tem_proxima(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def codificar_cursor(emprestimo):
+    ##
+    ## Transforma a chave de ordenação (data_emprestimo, id) de um
+    ## empréstimo em um texto seguro para ir na URL.
+    ##
+    bruto = f"{emprestimo.data_emprestimo.isoformat()}|{emprestimo.id}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    ##
+    ## Faz o caminho inverso de codificar_cursor.
+    ## Retorna None se o cursor estiver corrompido ou for inválido.
+    ##
+    if not cursor:
+        return None
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        bruto = base64.urlsafe_b64decode(cursor + preenchimento).decode()
+        data_texto, id_texto = bruto.rsplit('|', 1)
+        return datetime.fromisoformat(data_texto), int(id_texto)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar_por_cursor(queryset, apos=None, antes=None, tamanho=25):
+    ##
+    ## Paginação por cursor na ordem (-data_emprestimo, -id).
+    ##
+    ## Em vez de OFFSET (que fica mais lento quanto mais fundo a página),
+    ## filtramos a partir da chave do último item visto. Assim o banco
+    ## usa o índice e o custo da página 1 é o mesmo da página 5000.
+    ##   - apos:  cursor do último item da página atual (vai para a próxima)
+    ##   - antes: cursor do primeiro item da página atual (volta uma página)
+    ##
+    chave_apos = decodificar_cursor(apos)
+    chave_antes = decodificar_cursor(antes) if not chave_apos else None
+
+    if chave_antes:
+        data, ident = chave_antes
+        # Busca "para trás" na ordem crescente e inverte no final
+        itens = list(
+            queryset.filter(data_emprestimo__gte=data).filter(
+                Q(data_emprestimo__gt=data) | Q(id__gt=ident)
+            ).order_by('data_emprestimo', 'id')[:tamanho + 1]
+        )
+        tem_anterior = len(itens) > tamanho
+        itens = list(reversed(itens[:tamanho]))
+        tem_proxima = True
+    else:
+        consulta = queryset.order_by('-data_emprestimo', '-id')
+        if chave_apos:
+            data, ident = chave_apos
+            # O primeiro filtro (<=) é uma faixa simples no índice, que
+            # permite ao banco "pular" direto para o cursor; o segundo
+            # desempata os registros com a mesma data.
+            consulta = consulta.filter(data_emprestimo__lte=data).filter(
+                Q(data_emprestimo__lt=data) | Q(id__lt=ident)
+            )
+        itens = list(consulta[:tamanho + 1])
+        tem_proxima = len(itens) > tamanho
+        itens = itens[:tamanho]
+        tem_anterior = chave_apos is not None
+
+    if not itens:
+        return PaginaCursor([])
+
+    return PaginaCursor(
+        itens,
+        cursor_proximo=codificar_cursor(itens[-1]) if tem_proxima else None,
+        cursor_anterior=codificar_cursor(itens[0]) if tem_anterior else None,
+    )
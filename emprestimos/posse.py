@@ -0,0 +1,170 @@
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from django.utils import timezone
+
+from colaboradores.models import Colaborador
+from .models import ItemEmprestado, PosseEquipamento
+
+# Linhas gravadas por INSERT na reconstrução
+TAMANHO_LOTE = 1000
+
+
+def registrar_entrega(colaborador_id, data_prevista, quantidades):
+    ##
+    ## Soma os itens de um novo empréstimo na posse do colaborador.
+    ## 'quantidades' = {id do equipamento: quantidade}.
+    ## Número fixo de consultas (lê as linhas existentes travando-as e
+    ## grava todas com um INSERT ... ON CONFLICT DO UPDATE).
+    ##
+    existentes = {
+        posse.equipamento_id: posse
+        for posse in PosseEquipamento.objects.select_for_update().filter(
+            colaborador_id=colaborador_id, equipamento_id__in=list(quantidades)
+        )
+    }
+    posses = []
+    for equipamento_id, quantidade in quantidades.items():
+        posse = existentes.get(equipamento_id) or PosseEquipamento(
+            colaborador_id=colaborador_id, equipamento_id=equipamento_id,
+            quantidade=0, devolucao_mais_antiga=data_prevista,
+        )
+        posse.quantidade += quantidade
+        posse.devolucao_mais_antiga = min(posse.devolucao_mais_antiga, data_prevista)
+        posses.append(posse)
+
+    PosseEquipamento.objects.bulk_create(
+        posses,
+        update_conflicts=True,
+        unique_fields=['colaborador', 'equipamento'],
+        update_fields=['quantidade', 'devolucao_mais_antiga'],
+    )
+
+
+def registrar_devolucao(item, quantidade):
+    ##
+    ## Tira da posse o que foi processado (devolvido, danificado ou
+    ## perdido) de um item. Trava a linha do par (colaborador, equipamento)
+    ## antes de mexer, para que duas devoluções simultâneas não
+    ## recalculem em cima uma da outra. Enquanto o item tem pendência, é
+    ## só um UPDATE. Quando o item termina, a data mais antiga pode mudar:
+    ## recalcula o par a partir dos outros itens pendentes (ou apaga a
+    ## linha se não sobrou nenhum). Se a linha divergiu dos itens (sumiu
+    ## ou tem menos do que a devolução), o UPDATE não acha nada e o par
+    ## também é recalculado, em vez de ficar errado em silêncio.
+    ##
+    colaborador_id = item.emprestimo.colaborador_id
+    posses = PosseEquipamento.objects.filter(colaborador_id=colaborador_id, equipamento_id=item.equipamento_id)
+    # Trava a linha (nos bancos que suportam) antes de atualizar ou recalcular
+    list(posses.select_for_update().values_list('pk', flat=True))
+
+    # Itens pendentes do par (a devolução já está gravada no item)
+    itens = ItemEmprestado.objects.filter(
+        emprestimo__colaborador_id=colaborador_id, equipamento_id=item.equipamento_id, status_item='PENDENTE',
+    )
+    if item.get_quantidade_pendente() > 0:
+        if posses.filter(quantidade__gt=quantidade).update(quantidade=F('quantidade') - quantidade):
+            return
+    else:
+        itens = itens.exclude(pk=item.pk)
+
+    restante = itens.aggregate(
+        quantidade=Sum(F('quantidade_emprestada') - F('quantidade_devolvida')),
+        devolucao_mais_antiga=Min('emprestimo__data_prevista_devolucao'),
+    )
+    if restante['quantidade']:
+        # Regrava a linha (ou cria, se ela tinha sumido)
+        PosseEquipamento.objects.bulk_create(
+            [PosseEquipamento(colaborador_id=colaborador_id, equipamento_id=item.equipamento_id, **restante)],
+            update_conflicts=True,
+            unique_fields=['colaborador', 'equipamento'],
+            update_fields=['quantidade', 'devolucao_mais_antiga'],
+        )
+    else:
+        posses.delete()
+
+
+def consultar_portaria(matricula, hoje=None):
+    ##
+    ## Consulta da portaria: o colaborador da matrícula e o que ele tem
+    ## em mãos, em UMA consulta por índice (matrícula única + posse por
+    ## colaborador, LEFT JOIN), sem somar empréstimos nem devoluções.
+    ## Retorna None se a matrícula não existir.
+    ##
+    hoje = hoje or timezone.localdate()
+    linhas = Colaborador.objects.filter(matricula=matricula).values_list(
+        'id', 'nome_completo', 'funcao', 'status',
+        'posses__equipamento__nome', 'posses__equipamento__ca',
+        'posses__quantidade', 'posses__devolucao_mais_antiga',
+    ).order_by('posses__devolucao_mais_antiga', 'posses__equipamento__nome')
+
+    consulta = None
+    for pk, nome, funcao, status, equipamento, ca, quantidade, devolucao in linhas:
+        if consulta is None:
+            consulta = {
+                'id': pk, 'nome': nome, 'matricula': matricula, 'funcao': funcao, 'status': status,
+                'posses': [], 'atrasado': False,
+            }
+        if equipamento is not None:
+            atrasado = devolucao < hoje
+            consulta['posses'].append({
+                'equipamento': equipamento, 'ca': ca or '', 'quantidade': quantidade,
+                'devolucao_mais_antiga': devolucao, 'atrasado': atrasado,
+            })
+            consulta['atrasado'] = consulta['atrasado'] or atrasado
+    return consulta
+
+
+def calcular_posses(colaboradores=None):
+    # Posse de cada (colaborador, equipamento) somada a partir dos itens pendentes
+    itens = ItemEmprestado.objects.filter(status_item='PENDENTE')
+    if colaboradores is not None:
+        itens = itens.filter(emprestimo__colaborador__in=colaboradores)
+    return itens.values_list('emprestimo__colaborador_id', 'equipamento_id').annotate(
+        quantidade=Sum(F('quantidade_emprestada') - F('quantidade_devolvida')),
+        devolucao_mais_antiga=Min('emprestimo__data_prevista_devolucao'),
+    ).filter(quantidade__gt=0).order_by()
+
+
+@transaction.atomic
+def reconstruir_posses(colaboradores=None):
+    ##
+    ## Apaga e recalcula a tabela de posse (toda, ou só de alguns
+    ## colaboradores). Para dados gravados sem passar pelas views
+    ## (admin, importação direta no banco) ou para conferir a tabela.
+    ## Retorna quantas linhas foram gravadas.
+    ##
+    antigas = PosseEquipamento.objects.all()
+    if colaboradores is not None:
+        antigas = antigas.filter(colaborador__in=colaboradores)
+    antigas.delete()
+
+    gravadas = 0
+    lote = []
+    for colaborador_id, equipamento_id, quantidade, data in calcular_posses(colaboradores).iterator():
+        lote.append(PosseEquipamento(
+            colaborador_id=colaborador_id, equipamento_id=equipamento_id,
+            quantidade=quantidade, devolucao_mais_antiga=data,
+        ))
+        if len(lote) >= TAMANHO_LOTE:
+            gravadas += len(PosseEquipamento.objects.bulk_create(lote))
+            lote = []
+    if lote:
+        gravadas += len(PosseEquipamento.objects.bulk_create(lote))
+    return gravadas
+
+
+def divergencias(colaboradores=None):
+    ##
+    ## Compara a tabela de posse com o cálculo a partir dos itens.
+    ## Retorna o conjunto de pares (colaborador, equipamento) diferentes.
+    ##
+    calculadas = {(c, e): (q, d) for c, e, q, d in calcular_posses(colaboradores)}
+    gravadas = PosseEquipamento.objects.all()
+    if colaboradores is not None:
+        gravadas = gravadas.filter(colaborador__in=colaboradores)
+    gravadas = {
+        (c, e): (q, d) for c, e, q, d in gravadas.values_list(
+            'colaborador_id', 'equipamento_id', 'quantidade', 'devolucao_mais_antiga'
+        )
+    }
+    return {par for par in calculadas.keys() | gravadas.keys() if calculadas.get(par) != gravadas.get(par)}
@@ -1,3 +1,847 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache as cache_django
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from colaboradores.models import Colaborador
+from core.processos import criar_pool
+from core.testes_util import ConsultasFixasMixin, PlanoConsultaMixin
+from equipamentos.catalogo import equipamentos_disponiveis
+from equipamentos.models import Equipamento
+from .posse import divergencias, reconstruir_posses, registrar_devolucao
+from .forms import ItemEmprestadoFormSet
+from .fichas import dados_fichas, executar_geracao, gravar_ficha, pasta_trabalho
+from .exportacao import CABECALHO, celula_segura, filtrar_emprestimos, linhas_historico
+from .atrasos import VARREDURA_ATRASOS, marcar_emprestimos_atrasados
+from .kpis import contar_por_status, obter_kpis, reconstruir_contadores
+from .models import ContadorStatus, ControleVarredura, Emprestimo, GeracaoFichas, HistoricoDevolucao, ItemEmprestado, PosseEquipamento
+from .paginacao import codificar_cursor, paginar_por_cursor
+
+TABELAS_EMPRESTIMOS = {
+    'emprestimos_emprestimo',
+    'emprestimos_itememprestado',
+    'emprestimos_historicodevolucao',
+}
+
+
+class PlanoConsultasEmprestimosTest(PlanoConsultaMixin, TestCase):
+    ##
+    ## Garante que as consultas mais usadas do módulo de empréstimos
+    ## continuam usando índice (sem varrer a tabela inteira).
+    ##
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoje = date(2026, 3, 10)
+        colaborador = Colaborador.objects.create(
+            nome_completo='Maria Souza', matricula='100', funcao='Operadora'
+        )
+        equipamento = Equipamento.objects.create(
+            nome='Luva', ca='1234', estoque_total=50, estoque_disponivel=50
+        )
+        for dias, status in enumerate(['ATIVO', 'ATIVO', 'DEVOLVIDO', 'ATRASADO'] * 5):
+            emprestimo = Emprestimo.objects.create(
+                colaborador=colaborador,
+                data_prevista_devolucao=cls.hoje + timedelta(days=dias - 10),
+                status=status,
+            )
+            item = ItemEmprestado.objects.create(
+                emprestimo=emprestimo, equipamento=equipamento, quantidade_emprestada=2
+            )
+        HistoricoDevolucao.objects.create(
+            item_emprestado=item, quantidade_devolvida=1, status_devolucao='DEVOLVIDO'
+        )
+        cls.emprestimo = emprestimo
+        cls.usuario = User.objects.create_user('estoque', password='senha')
+
+    def test_varredura_incremental_de_atrasos(self):
+        ControleVarredura.objects.create(
+            nome=VARREDURA_ATRASOS, executada_ate=self.hoje - timedelta(days=1)
+        )
+        self.assertSemVarreduraCompleta(
+            lambda: marcar_emprestimos_atrasados(hoje=self.hoje), TABELAS_EMPRESTIMOS
+        )
+
+    def test_filtro_de_status(self):
+        for status in ['ATIVO', 'ATRASADO', 'DEVOLVIDO']:
+            with self.subTest(status=status):
+                self.assertSemVarreduraCompleta(
+                    lambda: list(Emprestimo.objects.filtrar_status(status, self.hoje)),
+                    TABELAS_EMPRESTIMOS,
+                )
+
+    def test_paginacao_por_cursor(self):
+        emprestimos = Emprestimo.objects.select_related('colaborador')
+        cursor = codificar_cursor(Emprestimo.objects.order_by('id')[10])
+        self.assertSemVarreduraCompleta(
+            lambda: paginar_por_cursor(emprestimos, tamanho=5), TABELAS_EMPRESTIMOS
+        )
+        self.assertSemVarreduraCompleta(
+            lambda: paginar_por_cursor(emprestimos, apos=cursor, tamanho=5), TABELAS_EMPRESTIMOS
+        )
+        self.assertSemVarreduraCompleta(
+            lambda: paginar_por_cursor(emprestimos, antes=cursor, tamanho=5), TABELAS_EMPRESTIMOS
+        )
+
+    def test_paginacao_filtrada_por_status(self):
+        devolvidos = Emprestimo.objects.filtrar_status('DEVOLVIDO', self.hoje)
+        self.assertSemVarreduraCompleta(
+            lambda: paginar_por_cursor(devolvidos, tamanho=5), TABELAS_EMPRESTIMOS
+        )
+
+    def test_kpis_agrupados(self):
+        # A contagem lê todos os empréstimos, mas deve ler só o índice
+        self.assertSemVarreduraCompleta(
+            lambda: contar_por_status(self.hoje), TABELAS_EMPRESTIMOS
+        )
+
+    def test_detalhe_com_historico(self):
+        self.client.force_login(self.usuario)
+        url = reverse('detalhe_emprestimo', args=[self.emprestimo.id])
+        self.assertSemVarreduraCompleta(lambda: self.client.get(url), TABELAS_EMPRESTIMOS)
+
+
+class PaginacaoCursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        colaborador = Colaborador.objects.create(nome_completo='Maria Souza', matricula='100', funcao='Operadora')
+        agora = timezone.now()
+        for numero in range(12):
+            emprestimo = Emprestimo.objects.create(
+                colaborador=colaborador, data_prevista_devolucao=timezone.localdate() + timedelta(days=7)
+            )
+            # Grupos de três com a mesma data: o id desempata
+            Emprestimo.objects.filter(pk=emprestimo.pk).update(data_emprestimo=agora - timedelta(hours=numero // 3))
+        cls.ordem = list(Emprestimo.objects.order_by('-data_emprestimo', '-id'))
+
+    def test_avanca_e_volta_sem_repetir_nem_pular(self):
+        paginas = [paginar_por_cursor(Emprestimo.objects.all(), tamanho=5)]
+        while paginas[-1].tem_proxima:
+            paginas.append(paginar_por_cursor(Emprestimo.objects.all(), apos=paginas[-1].cursor_proximo, tamanho=5))
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 2])
+        self.assertEqual([e for pagina in paginas for e in pagina], self.ordem)
+        self.assertFalse(paginas[0].tem_anterior)
+
+        # "Anterior" na última página devolve a do meio
+        anterior = paginar_por_cursor(Emprestimo.objects.all(), antes=paginas[2].cursor_anterior, tamanho=5)
+        self.assertEqual(list(anterior), list(paginas[1]))
+        self.assertTrue(anterior.tem_anterior and anterior.tem_proxima)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        pagina = paginar_por_cursor(Emprestimo.objects.all(), apos='nao-e-um-cursor', tamanho=5)
+        self.assertEqual(list(pagina), self.ordem[:5])
+
+class VarreduraAtrasosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoje = date(2026, 3, 10)
+        cls.colaborador = Colaborador.objects.create(
+            nome_completo='Maria Souza', matricula='100', funcao='Operadora'
+        )
+
+    def emprestimo(self, dias, status='ATIVO'):
+        # Empréstimo com vencimento 'dias' depois de self.hoje
+        return Emprestimo.objects.create(
+            colaborador=self.colaborador, data_prevista_devolucao=self.hoje + timedelta(days=dias), status=status,
+        )
+
+    def status(self, *emprestimos):
+        return [Emprestimo.objects.get(pk=e.pk).status for e in emprestimos]
+
+    def test_primeira_execucao_marca_vencidos_e_grava_a_marca(self):
+        vencido, vence_hoje, devolvido = self.emprestimo(-3), self.emprestimo(0), self.emprestimo(-5, 'DEVOLVIDO')
+        self.assertEqual(marcar_emprestimos_atrasados(hoje=self.hoje), 1)
+        self.assertEqual(self.status(vencido, vence_hoje, devolvido), ['ATRASADO', 'ATIVO', 'DEVOLVIDO'])
+        self.assertEqual(ControleVarredura.objects.get(nome=VARREDURA_ATRASOS).executada_ate, self.hoje)
+
+        # No mesmo dia a varredura não faz nada
+        with self.assertNumQueries(3):
+            self.assertEqual(marcar_emprestimos_atrasados(hoje=self.hoje), 0)
+
+    def test_incremental_so_olha_o_que_venceu_depois_da_marca(self):
+        ControleVarredura.objects.create(nome=VARREDURA_ATRASOS, executada_ate=self.hoje - timedelta(days=1))
+        # Vencido antes da marca (ex: data alterada pelo admin): fica para a revisão completa
+        antigo, ontem = self.emprestimo(-10), self.emprestimo(-1)
+        self.assertEqual(marcar_emprestimos_atrasados(hoje=self.hoje), 1)
+        self.assertEqual(self.status(antigo, ontem), ['ATIVO', 'ATRASADO'])
+
+        self.assertEqual(marcar_emprestimos_atrasados(hoje=self.hoje, completo=True), 1)
+        self.assertEqual(self.status(antigo), ['ATRASADO'])
+
+    def test_dias_sem_execucao_sao_recuperados(self):
+        ControleVarredura.objects.create(nome=VARREDURA_ATRASOS, executada_ate=self.hoje)
+        vencimentos = [self.emprestimo(dias) for dias in range(0, 4)]
+        # O agendamento falhou por três dias: a próxima execução pega todos
+        self.assertEqual(marcar_emprestimos_atrasados(hoje=self.hoje + timedelta(days=3)), 3)
+        self.assertEqual(self.status(*vencimentos), ['ATRASADO'] * 3 + ['ATIVO'])
+        self.assertEqual(
+            ControleVarredura.objects.get(nome=VARREDURA_ATRASOS).executada_ate, self.hoje + timedelta(days=3)
+        )
+
+    def test_comando(self):
+        vencido = Emprestimo.objects.create(
+            colaborador=self.colaborador, data_prevista_devolucao=timezone.localdate() - timedelta(days=1)
+        )
+        # Antes da varredura a tela já mostra o atraso
+        self.assertEqual(vencido.get_status_efetivo(), 'ATRASADO')
+        saida = io.StringIO()
+        call_command('marcar_atrasados', stdout=saida)
+        self.assertEqual(self.status(vencido), ['ATRASADO'])
+
+class CarrinhoEmprestimoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+        self.colaborador = Colaborador.objects.create(nome_completo='Maria Souza', matricula='100', funcao='Operadora')
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=10, estoque_disponivel=10)
+        self.bota = Equipamento.objects.create(nome='Bota', estoque_total=2, estoque_disponivel=2)
+
+    def enviar(self, *carrinho):
+        dados = {
+            'colaborador': self.colaborador.id,
+            'data_prevista_devolucao': (timezone.localdate() + timedelta(days=7)).isoformat(),
+            'itens-TOTAL_FORMS': len(carrinho), 'itens-INITIAL_FORMS': 0,
+            'itens-MIN_NUM_FORMS': 1, 'itens-MAX_NUM_FORMS': 1000,
+        }
+        for numero, (equipamento, quantidade) in enumerate(carrinho):
+            dados[f'itens-{numero}-equipamento'] = equipamento.id
+            dados[f'itens-{numero}-quantidade_emprestada'] = quantidade
+        return self.client.post(reverse('novo_emprestimo'), dados, follow=True)
+
+    def disponiveis(self):
+        return dict(Equipamento.objects.values_list('nome', 'estoque_disponivel'))
+
+    def test_carrinho_com_varios_itens(self):
+        resposta = self.enviar((self.luva, 3), (self.bota, 2))
+        self.assertContains(resposta, 'registrado com sucesso')
+        emprestimo = Emprestimo.objects.get()
+        self.assertEqual(
+            sorted(emprestimo.itens_emprestados.values_list('equipamento__nome', 'quantidade_emprestada')),
+            [('Bota', 2), ('Luva', 3)],
+        )
+        self.assertEqual(self.disponiveis(), {'Luva': 7, 'Bota': 0})
+
+    def test_transacao_so_na_gravacao(self):
+        # Com o modo IMMEDIATE, abrir uma transação pega o lock de escrita:
+        # a tela vazia e um carrinho recusado não podem abrir nenhuma
+        def savepoints(funcao):
+            with CaptureQueriesContext(connection) as capturadas:
+                funcao()
+            return [c['sql'] for c in capturadas.captured_queries if c['sql'].startswith('SAVEPOINT')]
+
+        self.client.get(reverse('novo_emprestimo'))
+        self.assertEqual(savepoints(lambda: self.client.get(reverse('novo_emprestimo'))), [])
+        self.assertEqual(savepoints(lambda: self.enviar((self.bota, 3))), [])
+        self.assertTrue(savepoints(lambda: self.enviar((self.luva, 1))))
+        self.assertEqual(Emprestimo.objects.count(), 1)
+
+    def test_equipamento_repetido_no_carrinho(self):
+        resposta = self.enviar((self.luva, 1), (self.luva, 2))
+        self.assertContains(resposta, "O equipamento &#x27;Luva&#x27; foi adicionado mais de uma vez.")
+        self.assertFalse(Emprestimo.objects.exists())
+        self.assertEqual(self.disponiveis(), {'Luva': 10, 'Bota': 2})
+
+    def test_quantidade_maior_que_o_estoque(self):
+        resposta = self.enviar((self.luva, 1), (self.bota, 3))
+        self.assertContains(resposta, "Disponível para &#x27;Bota&#x27;: 2")
+        self.assertFalse(Emprestimo.objects.exists())
+        self.assertEqual(self.disponiveis(), {'Luva': 10, 'Bota': 2})
+
+class CatalogoCarrinhoTest(TestCase):
+
+    def setUp(self):
+        cache_django.clear()
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=10, estoque_disponivel=10)
+        self.bota = Equipamento.objects.create(nome='Bota', estoque_total=1, estoque_disponivel=1)
+        for numero in range(20):
+            Equipamento.objects.create(nome=f'Outro {numero}', estoque_total=5)
+
+    def formset(self, *carrinho):
+        dados = {
+            'itens-TOTAL_FORMS': len(carrinho), 'itens-INITIAL_FORMS': 0,
+            'itens-MIN_NUM_FORMS': 1, 'itens-MAX_NUM_FORMS': 1000,
+        }
+        for numero, (equipamento, quantidade) in enumerate(carrinho):
+            dados[f'itens-{numero}-equipamento'] = equipamento
+            dados[f'itens-{numero}-quantidade_emprestada'] = quantidade
+        return ItemEmprestadoFormSet(dados, prefix='itens')
+
+    def test_carrinho_vazio_nao_le_o_catalogo(self):
+        with self.assertNumQueries(0):
+            formset = ItemEmprestadoFormSet(
+                prefix='itens', queryset=ItemEmprestado.objects.none(), initial=[{}] * 5,
+            )
+            self.assertEqual([list(form.fields['equipamento'].choices) for form in formset.forms][0], [('', '---------')])
+
+    def test_so_os_equipamentos_enviados_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            formset = self.formset((self.luva.id, 2), (self.bota.id, 1), ('abc', 1))
+        self.assertEqual(set(formset.equipamentos_carregados), {self.luva.id, self.bota.id})
+        self.assertEqual(
+            [rotulo for _, rotulo in formset.opcoes_equipamento],
+            ['---------', str(self.bota), str(self.luva)],
+        )
+
+        # Validar e renderizar de novo não consulta por linha
+        formset = self.formset((self.luva.id, 2), (self.bota.id, 1))
+        with self.assertNumQueries(0):
+            self.assertTrue(formset.is_valid())
+            str(formset.forms[0]['equipamento'])
+
+    def test_estoque_validado_no_banco_e_nao_no_cache(self):
+        # Reposição gravada por outro processo (o cache deste não sabe)
+        equipamentos_disponiveis()
+        Equipamento.objects.filter(pk=self.bota.pk).update(estoque_total=5, estoque_disponivel=5)
+        self.assertEqual(next(e for e in equipamentos_disponiveis() if e.pk == self.bota.pk).estoque_disponivel, 1)
+
+        self.assertTrue(self.formset((self.bota.id, 3)).is_valid())
+        formset = self.formset((self.bota.id, 6))
+        self.assertFalse(formset.is_valid())
+        self.assertIn('Disponível para', str(formset.forms[0].errors))
+
+    def test_estoque_zerado_invalida_a_linha(self):
+        Equipamento.objects.reservar(self.bota.pk, 1)
+        formset = self.formset((self.bota.id, 1))
+        self.assertFalse(formset.is_valid())
+        self.assertIn('equipamento', formset.forms[0].errors)
+
+@override_settings(EMPRESTIMOS_KPI_CONTADORES=True)
+class ContadoresKpiTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+        self.colaborador = Colaborador.objects.create(nome_completo='Maria Souza', matricula='100', funcao='Operadora')
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=10, estoque_disponivel=10)
+        reconstruir_contadores()
+
+    def emprestar(self):
+        self.client.post(reverse('novo_emprestimo'), {
+            'colaborador': self.colaborador.id,
+            'data_prevista_devolucao': (timezone.localdate() + timedelta(days=1)).isoformat(),
+            'itens-TOTAL_FORMS': 1, 'itens-INITIAL_FORMS': 0, 'itens-MIN_NUM_FORMS': 1, 'itens-MAX_NUM_FORMS': 1000,
+            'itens-0-equipamento': self.luva.id, 'itens-0-quantidade_emprestada': 2,
+        })
+        return Emprestimo.objects.latest('id')
+
+    def devolver(self, emprestimo):
+        item = emprestimo.itens_emprestados.get()
+        return self.client.post(reverse('devolver_item_parcial', args=[item.id]), {
+            f'item_{item.id}-quantidade_devolvida': 2, f'item_{item.id}-status_devolucao': 'DEVOLVIDO',
+        })
+
+    def assertContadoresBatem(self):
+        # Os contadores mantidos a cada mudança = recontagem do zero
+        mantidos = obter_kpis()
+        self.assertEqual(mantidos, reconstruir_contadores())
+        return mantidos
+
+    def test_emprestimo_e_devolucao(self):
+        emprestimo = self.emprestar()
+        self.assertEqual(self.assertContadoresBatem()['ATIVO'], 1)
+        self.devolver(emprestimo)
+        kpis = self.assertContadoresBatem()
+        self.assertEqual((kpis['ATIVO'], kpis['DEVOLVIDO']), (0, 1))
+
+    def test_varredura_entre_a_leitura_e_a_conclusao(self):
+        # A varredura de atrasos roda depois de a devolução ler o empréstimo
+        # (ATIVO) e antes de concluí-lo: sai do contador ATRASADO
+        emprestimo = self.emprestar()
+
+        def varrer_no_meio(item, quantidade):
+            marcar_emprestimos_atrasados(hoje=timezone.localdate() + timedelta(days=5))
+            return registrar_devolucao(item, quantidade)
+
+        with patch('emprestimos.views.registrar_devolucao', side_effect=varrer_no_meio):
+            self.devolver(emprestimo)
+        emprestimo.refresh_from_db()
+        self.assertEqual(emprestimo.status, 'DEVOLVIDO')
+        kpis = self.assertContadoresBatem()
+        self.assertEqual((kpis['ATIVO'], kpis['ATRASADO'], kpis['DEVOLVIDO']), (0, 0, 1))
+
+    def test_reconstruir_corrige_divergencia(self):
+        self.emprestar()
+        ContadorStatus.objects.filter(status='ATIVO').update(total=7)
+        self.assertEqual(reconstruir_contadores()['ATIVO'], 1)
+        self.assertEqual(obter_kpis(), contar_por_status())
+
+class ConsultasFixasEmprestimosTest(ConsultasFixasMixin, TestCase):
+    ##
+    ## O número de consultas das telas de empréstimo não pode depender
+    ## da quantidade de empréstimos nem de itens no carrinho.
+    ##
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+        self.colaborador = Colaborador.objects.create(
+            nome_completo='Maria Souza', matricula='100', funcao='Operadora'
+        )
+
+    def criar_equipamentos(self, quantidade):
+        inicio = Equipamento.objects.count()
+        return [
+            Equipamento.objects.create(
+                nome=f'EPI de teste {inicio + numero}', estoque_total=10, estoque_disponivel=10
+            )
+            for numero in range(quantidade)
+        ]
+
+    def criar_emprestimo(self, itens, concluidos=0):
+        # Empréstimo com 'itens' linhas; as 'concluidos' primeiras já devolvidas
+        emprestimo = Emprestimo.objects.create(
+            colaborador=self.colaborador, data_prevista_devolucao=timezone.localdate()
+        )
+        for numero, equipamento in enumerate(self.criar_equipamentos(itens)):
+            item = ItemEmprestado.objects.create(
+                emprestimo=emprestimo, equipamento=equipamento, quantidade_emprestada=2
+            )
+            HistoricoDevolucao.objects.create(
+                item_emprestado=item, quantidade_devolvida=2 if numero < concluidos else 1,
+                status_devolucao='DEVOLVIDO',
+            )
+            if numero < concluidos:
+                item.status_item = 'CONCLUIDO'
+                item.save()
+        return emprestimo
+
+    def test_lista_emprestimo(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            return (reverse('lista_emprestimo'),)
+        self.assertConsultasFixas(4, self.client.get, preparar)
+
+    def test_lista_emprestimo_filtrada(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            return (reverse('lista_emprestimo'), {'status': 'ATRASADO', 'q': 'Luva'})
+        self.assertConsultasFixas(4, self.client.get, preparar)
+
+    def test_detalhe_emprestimo(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            emprestimo = self.criar_emprestimo(itens=tamanho)
+            return (reverse('detalhe_emprestimo', args=[emprestimo.id]),)
+        self.assertConsultasFixas(5, self.client.get, preparar)
+
+    def test_novo_emprestimo_get(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho, equipamentos=tamanho)
+            return (reverse('novo_emprestimo'),)
+        # Sessão e usuário: sem transação (nem SAVEPOINT) e sem catálogo
+        self.assertConsultasFixas(2, self.client.get, preparar)
+
+    def test_novo_emprestimo_post(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            carrinho = self.criar_equipamentos(tamanho)
+            dados = {
+                'colaborador': self.colaborador.id,
+                'data_prevista_devolucao': (timezone.localdate() + timedelta(days=7)).isoformat(),
+                'itens-TOTAL_FORMS': len(carrinho),
+                'itens-INITIAL_FORMS': 0,
+                'itens-MIN_NUM_FORMS': 1,
+                'itens-MAX_NUM_FORMS': 1000,
+            }
+            for numero, equipamento in enumerate(carrinho):
+                dados[f'itens-{numero}-equipamento'] = equipamento.id
+                dados[f'itens-{numero}-quantidade_emprestada'] = 1
+            return (reverse('novo_emprestimo'), dados)
+
+        def enviar(url, dados):
+            resposta = self.client.post(url, dados)
+            self.assertEqual(resposta.status_code, 302)
+
+        self.assertConsultasFixas(15, enviar, preparar)
+
+    def test_devolver_item_parcial(self):
+        # O último item pendente é devolvido e o empréstimo é concluído
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            emprestimo = self.criar_emprestimo(itens=tamanho, concluidos=tamanho - 1)
+            item = emprestimo.itens_emprestados.get(status_item='PENDENTE')
+            dados = {
+                f'item_{item.id}-quantidade_devolvida': 1,
+                f'item_{item.id}-status_devolucao': 'DEVOLVIDO',
+            }
+            return (reverse('devolver_item_parcial', args=[item.id]), dados)
+
+        def enviar(url, dados):
+            resposta = self.client.post(url, dados)
+            self.assertEqual(resposta.status_code, 302)
+
+        # Inclui a trava da linha de posse antes de recalculá-la
+        self.assertConsultasFixas(19, enviar, preparar)
+
+    def test_exportar_emprestimos(self):
+        # Uma consulta só para o histórico inteiro, lida aos poucos
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho)
+            self.criar_emprestimo(itens=tamanho, concluidos=tamanho // 2)
+            return (reverse('exportar_emprestimos'), {'status': 'ATIVO'})
+
+        def baixar(url, dados):
+            resposta = self.client.get(url, dados)
+            self.assertTrue(resposta.streaming)
+            b''.join(resposta.streaming_content)
+
+        self.assertConsultasFixas(3, baixar, preparar)
+
+
+class ExportacaoHistoricoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('auditor', password='senha')
+        cls.maria = Colaborador.objects.create(nome_completo='Maria Souza', matricula='100', funcao='Operadora')
+        cls.joao = Colaborador.objects.create(nome_completo='João Lima', matricula='200', funcao='Soldador')
+        cls.luva = Equipamento.objects.create(nome='Luva', ca='12345', estoque_total=10, estoque_disponivel=10)
+        cls.bota = Equipamento.objects.create(nome='Bota', estoque_total=10, estoque_disponivel=10)
+
+        hoje = timezone.localdate()
+        cls.antigo = Emprestimo.objects.create(
+            colaborador=cls.maria, data_prevista_devolucao=hoje - timedelta(days=20), status='DEVOLVIDO'
+        )
+        Emprestimo.objects.filter(pk=cls.antigo.pk).update(data_emprestimo=timezone.now() - timedelta(days=30))
+        item = ItemEmprestado.objects.create(
+            emprestimo=cls.antigo, equipamento=cls.luva, quantidade_emprestada=3,
+        )
+        HistoricoDevolucao.objects.create(item_emprestado=item, quantidade_devolvida=2, status_devolucao='DEVOLVIDO')
+        HistoricoDevolucao.objects.create(item_emprestado=item, quantidade_devolvida=1, status_devolucao='PERDIDO')
+        ItemEmprestado.objects.filter(pk=item.pk).update(status_item='CONCLUIDO')
+
+        cls.recente = Emprestimo.objects.create(
+            colaborador=cls.joao, data_prevista_devolucao=hoje + timedelta(days=7)
+        )
+        ItemEmprestado.objects.create(emprestimo=cls.recente, equipamento=cls.bota, quantidade_emprestada=1)
+
+    def test_uma_linha_por_evento(self):
+        linhas = list(linhas_historico(filtrar_emprestimos()))
+        self.assertEqual(len(linhas), 3)
+        primeira, segunda, sem_evento = linhas
+        self.assertEqual(len(primeira), len(CABECALHO))
+        self.assertEqual(primeira[:1] + primeira[4:], (
+            self.antigo.id, 'Maria Souza', '100', 'Luva', '12345', 3, 3, 'Concluído', 'Devolvido', 2,
+            primeira[-1],
+        ))
+        self.assertEqual(segunda[11:13], ('Perdido', 1))
+        # Item sem devolução sai com o evento vazio
+        self.assertEqual(sem_evento[4:8], ('João Lima', '200', 'Bota', ''))
+        self.assertEqual(sem_evento[11:], ('', '', ''))
+
+    def test_texto_que_vira_formula_no_excel(self):
+        Colaborador.objects.filter(pk=self.joao.pk).update(nome_completo='=HYPERLINK("http://x","clique")')
+        Equipamento.objects.filter(pk=self.bota.pk).update(nome='@SUM(A1)', ca='-1+1')
+        sem_evento = list(linhas_historico(filtrar_emprestimos(colaborador=self.joao)))[0]
+        self.assertEqual(sem_evento[4:8], ('\'=HYPERLINK("http://x","clique")', '200', "'@SUM(A1)", "'-1+1"))
+
+        self.assertEqual([celula_segura(texto) for texto in ('+55 11', '\tx', '\rx', 'Luva', '')],
+                         ["'+55 11", "'\tx", "'\rx", 'Luva', ''])
+
+    def test_filtros(self):
+        hoje = timezone.localdate()
+        recentes = filtrar_emprestimos(data_inicio=hoje - timedelta(days=1), data_fim=hoje)
+        self.assertEqual(list(recentes), [self.recente])
+        self.assertEqual(list(filtrar_emprestimos(data_fim=hoje - timedelta(days=10))), [self.antigo])
+        self.assertEqual(list(filtrar_emprestimos(status='DEVOLVIDO')), [self.antigo])
+        self.assertEqual(list(filtrar_emprestimos(colaborador=self.joao)), [self.recente])
+
+    def test_download(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('exportar_emprestimos'), {'colaborador': self.maria.id})
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment;', resposta['Content-Disposition'])
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(conteudo[0].split(';'), CABECALHO)
+        self.assertEqual(len(conteudo), 3)
+
+    async def test_download_asgi(self):
+        # Pelo AsyncClient (requisição ASGI) as linhas vêm do ORM assíncrono
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('exportar_emprestimos'), {'colaborador': self.maria.id})
+        self.assertTrue(resposta.is_async)
+        conteudo = b''.join([parte async for parte in resposta.streaming_content])
+        linhas = conteudo.decode('utf-8-sig').splitlines()
+        self.assertEqual(linhas[0].split(';'), CABECALHO)
+        self.assertEqual(len(linhas), 3)
+
+    def test_filtro_invalido(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(
+            reverse('exportar_emprestimos'), {'data_inicio': '2026-02-01', 'data_fim': '2026-01-01'}
+        )
+        self.assertRedirects(resposta, reverse('lista_emprestimo'))
+
+
+class FichasEpiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.luva = Equipamento.objects.create(nome='Luva de Raspa', ca='12345', estoque_total=50, estoque_disponivel=50)
+        cls.colaboradores = [
+            Colaborador.objects.create(nome_completo=f'Colaborador {numero}', matricula=str(100 + numero), funcao='Operador')
+            for numero in range(3)
+        ]
+        Colaborador.objects.create(nome_completo='Inativo', matricula='900', funcao='Operador', status='Inativo')
+        emprestimo = Emprestimo.objects.create(
+            colaborador=cls.colaboradores[0], data_prevista_devolucao=timezone.localdate()
+        )
+        item = ItemEmprestado.objects.create(emprestimo=emprestimo, equipamento=cls.luva, quantidade_emprestada=2)
+        HistoricoDevolucao.objects.create(item_emprestado=item, quantidade_devolvida=1, status_devolucao='DANIFICADO')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def conteudo_pdf(self, dados):
+        inicio = dados.index(b'stream\n') + len(b'stream\n')
+        return zlib.decompress(dados[inicio:dados.index(b'\nendstream')]).decode('cp1252')
+
+    def test_geracao_completa(self):
+        geracao = executar_geracao(GeracaoFichas.objects.create(), processos=1)
+        self.assertEqual((geracao.status, geracao.total, geracao.processados), ('CONCLUIDO', 3, 3))
+        self.assertFalse(pasta_trabalho(geracao).exists())
+
+        with zipfile.ZipFile(geracao.arquivo.path) as arquivo:
+            self.assertEqual(arquivo.namelist(), ['ficha_100.pdf', 'ficha_101.pdf', 'ficha_102.pdf'])
+            texto = self.conteudo_pdf(arquivo.read('ficha_100.pdf'))
+        self.assertIn('(Colaborador: Colaborador 0)', texto)
+        self.assertIn('(Luva de Raspa)', texto)
+        self.assertIn('(12345)', texto)
+        self.assertIn('danificado em', texto)
+
+    def test_em_processos(self):
+        geracao = executar_geracao(GeracaoFichas.objects.create(incluir_inativos=True), processos=2)
+        with zipfile.ZipFile(geracao.arquivo.path) as arquivo:
+            self.assertEqual(len(arquivo.namelist()), 4)
+
+    def test_pool_sem_fork(self):
+        # Com spawn o filho não herda nada: o initializer configura o Django
+        pasta = Path(self.media)
+        ficha = dados_fichas([self.colaboradores[0].id], timezone.now())[0]
+        with criar_pool(1, metodo='spawn') as pool:
+            self.assertEqual(pool.submit(gravar_ficha, ficha, pasta, '01/01/2026').result(), '100')
+        self.assertTrue((pasta / 'ficha_100.pdf').read_bytes().startswith(b'%PDF'))
+
+    def test_retomada(self):
+        # Fichas já gravadas antes da interrupção não são geradas de novo
+        geracao = GeracaoFichas.objects.create(status='ERRO')
+        pasta = pasta_trabalho(geracao)
+        pasta.mkdir(parents=True)
+        (pasta / 'ficha_100.pdf').write_bytes(b'gerada antes')
+        (pasta / 'ficha_101.tmp').write_bytes(b'incompleta')
+
+        progresso = []
+        executar_geracao(geracao, processos=1, progresso=lambda g: progresso.append(g.processados))
+        self.assertEqual(progresso, [3])
+        with zipfile.ZipFile(geracao.arquivo.path) as arquivo:
+            self.assertEqual(arquivo.read('ficha_100.pdf'), b'gerada antes')
+            self.assertTrue(arquivo.read('ficha_101.pdf').startswith(b'%PDF'))
+
+    def test_consultas_por_lote(self):
+        # 2 consultas por lote, qualquer que seja o número de colaboradores e itens
+        for quantidade in (1, 3):
+            with self.subTest(quantidade=quantidade), self.assertNumQueries(2):
+                fichas = dados_fichas([c.id for c in self.colaboradores[:quantidade]], timezone.now())
+            self.assertEqual(len(fichas), quantidade)
+
+    def test_pagina_somente_staff(self):
+        usuario = User.objects.create_user('comum', password='senha')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse('fichas_epi')).status_code, 403)
+
+        usuario.is_staff = True
+        usuario.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            resposta = self.client.post(reverse('fichas_epi'), {'incluir_inativos': 'on'})
+        self.assertRedirects(resposta, reverse('fichas_epi'))
+        self.assertEqual(len(callbacks), 1)
+        geracao = GeracaoFichas.objects.get()
+        self.assertTrue(geracao.incluir_inativos)
+        self.assertEqual(self.client.get(reverse('fichas_epi_baixar', args=[geracao.id])).status_code, 404)
+
+        executar_geracao(geracao, processos=1)
+        resposta = self.client.get(reverse('fichas_epi_baixar', args=[geracao.id]))
+        self.assertEqual(resposta.status_code, 200)
+        # Consumir o conteúdo já fecha a resposta (e o arquivo)
+        self.assertTrue(b''.join(resposta.streaming_content).startswith(b'PK'))
+
+
+    def test_retomada_reservada_uma_vez(self):
+        self.client.force_login(User.objects.create_user('equipe', password='senha', is_staff=True))
+        geracao = GeracaoFichas.objects.create(status='ERRO')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('fichas_epi'), {'retomar': geracao.id})
+            # Segundo clique (ou outra aba): a geração já foi reservada
+            resposta = self.client.post(reverse('fichas_epi'), {'retomar': geracao.id}, follow=True)
+        self.assertEqual(len(callbacks), 1)
+        self.assertContains(resposta, 'não está interrompida')
+        geracao.refresh_from_db()
+        self.assertEqual(geracao.status, 'PENDENTE')
+
+        # Nem o comando retoma uma geração em andamento
+        with self.assertRaises(CommandError):
+            call_command('gerar_fichas_epi', retomar=geracao.id, stdout=io.StringIO())
+
+        # Parada há mais que TEMPO_SEM_PROGRESSO: pode ser retomada
+        GeracaoFichas.objects.filter(pk=geracao.pk).update(
+            atualizado_em=timezone.now() - GeracaoFichas.TEMPO_SEM_PROGRESSO - timedelta(minutes=1)
+        )
+        self.assertTrue(GeracaoFichas.objects.reservar_retomada(geracao.pk))
+
+    def test_retomar_com_id_invalido(self):
+        self.client.force_login(User.objects.create_user('equipe', password='senha', is_staff=True))
+        self.assertEqual(self.client.post(reverse('fichas_epi'), {'retomar': 'abc'}).status_code, 404)
+        self.assertEqual(self.client.post(reverse('fichas_epi'), {'retomar': '999'}).status_code, 404)
+
+
+class PosseEquipamentoTest(TestCase):
+    ##
+    ## A tabela de posse acompanha empréstimos e devoluções feitos pelas
+    ## views e sempre bate com o cálculo a partir dos itens.
+    ##
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('estoque', password='senha'))
+        self.colaborador = Colaborador.objects.create(nome_completo='Ana Lima', matricula='100', funcao='Pedreiro')
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=20, estoque_disponivel=20)
+        self.bota = Equipamento.objects.create(nome='Bota', estoque_total=20, estoque_disponivel=20)
+
+    def emprestar(self, dias, quantidades):
+        dados = {
+            'colaborador': self.colaborador.id,
+            'data_prevista_devolucao': (timezone.localdate() + timedelta(days=dias)).isoformat(),
+            'itens-TOTAL_FORMS': len(quantidades), 'itens-INITIAL_FORMS': 0,
+            'itens-MIN_NUM_FORMS': 1, 'itens-MAX_NUM_FORMS': 1000,
+        }
+        for numero, (equipamento, quantidade) in enumerate(quantidades.items()):
+            dados[f'itens-{numero}-equipamento'] = equipamento.id
+            dados[f'itens-{numero}-quantidade_emprestada'] = quantidade
+        self.client.post(reverse('novo_emprestimo'), dados)
+        return Emprestimo.objects.latest('id')
+
+    def devolver(self, emprestimo, equipamento, quantidade, status='DEVOLVIDO'):
+        item = emprestimo.itens_emprestados.get(equipamento=equipamento)
+        self.client.post(reverse('devolver_item_parcial', args=[item.id]), {
+            f'item_{item.id}-quantidade_devolvida': quantidade,
+            f'item_{item.id}-status_devolucao': status,
+        })
+
+    def posses(self):
+        self.assertEqual(divergencias(), set())
+        return {
+            nome: (quantidade, (data - timezone.localdate()).days)
+            for nome, quantidade, data in PosseEquipamento.objects.values_list(
+                'equipamento__nome', 'quantidade', 'devolucao_mais_antiga'
+            )
+        }
+
+    def test_emprestimos_e_devolucoes(self):
+        primeiro = self.emprestar(5, {self.luva: 3, self.bota: 1})
+        self.assertEqual(self.posses(), {'Luva': (3, 5), 'Bota': (1, 5)})
+
+        segundo = self.emprestar(2, {self.luva: 2})
+        self.assertEqual(self.posses(), {'Luva': (5, 2), 'Bota': (1, 5)})
+
+        # Devolução parcial: só a quantidade muda
+        self.devolver(segundo, self.luva, 1)
+        self.assertEqual(self.posses(), {'Luva': (4, 2), 'Bota': (1, 5)})
+
+        # O item que vencia antes termina: a data passa a ser a do outro
+        self.devolver(segundo, self.luva, 1, 'PERDIDO')
+        self.assertEqual(self.posses(), {'Luva': (3, 5), 'Bota': (1, 5)})
+
+        # Nada mais em mãos: a linha some
+        self.devolver(primeiro, self.bota, 1, 'DANIFICADO')
+        self.assertEqual(self.posses(), {'Luva': (3, 5)})
+
+    def test_devolucao_com_posse_divergente_recalcula_o_par(self):
+        emprestimo = self.emprestar(5, {self.luva: 3})
+        self.emprestar(2, {self.luva: 2})
+
+        # Linha menor do que a devolução: o UPDATE condicional não acha nada
+        PosseEquipamento.objects.update(quantidade=1)
+        self.devolver(emprestimo, self.luva, 2)
+        self.assertEqual(self.posses(), {'Luva': (3, 2)})
+
+        # Linha apagada por fora: volta a existir
+        PosseEquipamento.objects.all().delete()
+        self.devolver(emprestimo, self.luva, 1)
+        self.assertEqual(self.posses(), {'Luva': (2, 2)})
+
+    def test_reconstruir(self):
+        self.emprestar(5, {self.luva: 3})
+        PosseEquipamento.objects.update(quantidade=99)
+        self.assertEqual(len(divergencias()), 1)
+        self.assertEqual(reconstruir_posses(), 1)
+        self.assertEqual(self.posses(), {'Luva': (3, 5)})
+
+
+class ConcorrenciaBancoTest(TransactionTestCase):
+    ##
+    ## Empréstimos e devoluções em várias threads ao mesmo tempo (como um
+    ## servidor com vários workers) sem "database is locked": no SQLite,
+    ## WAL + busy_timeout + transação IMMEDIATE (ver core/banco.py).
+    ##
+    THREADS = 8
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=100, estoque_disponivel=100)
+        self.colaboradores = [
+            Colaborador.objects.create(nome_completo=f'Colaborador {numero}', matricula=str(100 + numero), funcao='Operador')
+            for numero in range(self.THREADS)
+        ]
+
+    def emprestar_e_devolver(self, colaborador):
+        cliente = Client(raise_request_exception=True)
+        cliente.force_login(self.usuario)
+        try:
+            resposta = cliente.post(reverse('novo_emprestimo'), {
+                'colaborador': colaborador.id,
+                'data_prevista_devolucao': (timezone.localdate() + timedelta(days=7)).isoformat(),
+                'itens-TOTAL_FORMS': 1, 'itens-INITIAL_FORMS': 0,
+                'itens-MIN_NUM_FORMS': 1, 'itens-MAX_NUM_FORMS': 1000,
+                'itens-0-equipamento': self.luva.id, 'itens-0-quantidade_emprestada': 3,
+            })
+            self.assertEqual(resposta.status_code, 302)
+            item = ItemEmprestado.objects.get(emprestimo__colaborador=colaborador)
+            resposta = cliente.post(reverse('devolver_item_parcial', args=[item.id]), {
+                f'item_{item.id}-quantidade_devolvida': 3,
+                f'item_{item.id}-status_devolucao': 'DEVOLVIDO',
+            })
+            self.assertEqual(resposta.status_code, 302)
+        finally:
+            # Cada thread tem a sua conexão
+            connection.close()
+
+    def test_emprestimos_e_devolucoes_em_paralelo(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            # list() repassa a exceção de qualquer thread
+            list(pool.map(self.emprestar_e_devolver, self.colaboradores))
+
+        self.luva.refresh_from_db()
+        self.assertEqual(self.luva.estoque_disponivel, 100)
+        self.assertEqual(Emprestimo.objects.filter(status='DEVOLVIDO').count(), self.THREADS)
+        self.assertEqual(HistoricoDevolucao.objects.count(), self.THREADS)
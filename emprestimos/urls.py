@@ -7,6 +7,14 @@ urlpatterns = [
     # ex: /sistema/emprestimos/
     path('', views.lista_emprestimo, name='lista_emprestimo'),
     
+    # Exportação do histórico em CSV (aceita os filtros da lista e datas)
+    # ex: /sistema/emprestimos/exportar/?status=ATRASADO&data_inicio=2026-01-01
+    path('exportar/', views.exportar_emprestimos, name='exportar_emprestimos'),
+
+    # Fichas de EPI em lote (somente staff) e download do .zip gerado
+    path('fichas/', views.fichas_epi, name='fichas_epi'),
+    path('fichas/<int:id>/baixar/', views.fichas_epi_baixar, name='fichas_epi_baixar'),
+
     # Rota para o formulário de novo empréstimo
     # ex: /sistema/emprestimos/novo/
     path('novo/', views.novo_emprestimo, name='novo_emprestimo'),
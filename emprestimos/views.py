@@ -1,91 +1,202 @@
 # emprestimos/views.py
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction 
-from django.db.models import Q
+from django.db.models import Prefetch
 from django.utils import timezone
-from .models import Emprestimo, ItemEmprestado, HistoricoDevolucao
-from .forms import EmprestimoForm, ItemEmprestadoFormSet, DevolucaoParcialForm
+from django.core.exceptions import ValidationError
+from .models import Emprestimo, ItemEmprestado, HistoricoDevolucao, GeracaoFichas
+from equipamentos.models import Equipamento, EstoqueInsuficiente
+from .forms import EmprestimoForm, ItemEmprestadoFormSet, DevolucaoParcialForm, FiltroExportacaoForm
+from .exportacao import agerar_csv, filtrar_emprestimos, gerar_csv, linhas_historico
+from .fichas import iniciar_em_segundo_plano
+from .posse import registrar_devolucao, registrar_entrega
+from .paginacao import paginar_por_cursor
+from .kpis import obter_kpis, registrar_transicao
+from core import cache
+from core.busca import TIPO_EMPRESTIMO, filtrar_por_busca
+from core.assincrono import servido_por_asgi, view_assincrona
+from core.condicional import pagina_condicional
 # Importação necessária para corrigir erros no Codespace
 from django.views.decorators.csrf import csrf_exempt 
 
+# Quantidade de empréstimos exibidos por página no histórico
+TAMANHO_PAGINA = 25
+
 @login_required
+@pagina_condicional(cache.EMPRESTIMOS, cache.COLABORADORES, diaria=True)
 def lista_emprestimo(request):
     query = request.GET.get('q', '')
     status_filter = request.GET.get('status', '')
 
-    emprestimos = Emprestimo.objects.select_related('colaborador').all().order_by('-data_emprestimo')
+    emprestimos = Emprestimo.objects.select_related('colaborador').all()
 
     if query:
-        emprestimos = emprestimos.filter(
-            Q(colaborador__nome_completo__icontains=query) |
-            Q(id__icontains=query) |
-            Q(itens_emprestados__equipamento__nome__icontains=query) 
-        ).distinct()
+        emprestimos = filtrar_por_busca(
+            emprestimos, TIPO_EMPRESTIMO, query,
+            campos=['colaborador__nome_completo', 'id', 'itens_emprestados__equipamento__nome'],
+        )
 
-    if status_filter:
-        emprestimos = emprestimos.filter(status=status_filter)
-        
     hoje = timezone.now().date()
-    Emprestimo.objects.filter(
-        status='ATIVO', 
-        data_prevista_devolucao__lt=hoje
-    ).update(status='ATRASADO')
-    
-    kpi_ativos = Emprestimo.objects.filter(status='ATIVO').count()
-    kpi_atrasados = Emprestimo.objects.filter(status='ATRASADO').count()
-    kpi_devolvidos = Emprestimo.objects.filter(status='DEVOLVIDO').count()
+
+    if status_filter:
+        emprestimos = emprestimos.filtrar_status(status_filter, hoje)
+
+    pagina = paginar_por_cursor(
+        emprestimos,
+        apos=request.GET.get('apos'),
+        antes=request.GET.get('antes'),
+        tamanho=TAMANHO_PAGINA,
+    )
+
+    # A página é somente leitura: a gravação de ATRASADO é feita pelo
+    # comando agendado 'marcar_atrasados'. Aqui o atraso é calculado
+    # pela data prevista no momento da consulta.
+    kpis = obter_kpis(hoje)
 
     context = {
-        'lista_emprestimos': emprestimos,
+        'lista_emprestimos': pagina,
+        'pagina': pagina,
         'search_query': query,
         'status_filter': status_filter,
-        'kpi_ativos': kpi_ativos,
-        'kpi_atrasados': kpi_atrasados,
-        'kpi_devolvidos': kpi_devolvidos,
+        'kpi_ativos': kpis['ATIVO'],
+        'kpi_atrasados': kpis['ATRASADO'],
+        'kpi_devolvidos': kpis['DEVOLVIDO'],
+        # A exportação já vem com os filtros da lista
+        'form_exportacao': FiltroExportacaoForm(initial={'status': status_filter, 'q': query}),
     }
     return render(request, 'lista_emprestimo.html', context)
 
 
+@view_assincrona
+@login_required
+async def exportar_emprestimos(request):
+    ##
+    ## Histórico de empréstimos e devoluções em CSV, para auditoria.
+    ## A resposta é enviada aos poucos (StreamingHttpResponse): o download
+    ## começa na hora e a memória não cresce com o tamanho do histórico.
+    ## No ASGI o CSV sai de um gerador assíncrono: entre um bloco e outro
+    ## o servidor atende outras requisições.
+    ##
+    form = FiltroExportacaoForm(request.GET)
+    # A validação consulta o colaborador escolhido
+    if not await sync_to_async(form.is_valid)():
+        erro = list(form.errors.values())[0][0]
+        messages.error(request, f"Filtro de exportação inválido: {erro}")
+        return redirect('lista_emprestimo')
+
+    filtros = form.cleaned_data
+    emprestimos = await sync_to_async(filtrar_emprestimos)(
+        data_inicio=filtros['data_inicio'],
+        data_fim=filtros['data_fim'],
+        status=filtros['status'],
+        colaborador=filtros['colaborador'],
+        busca=filtros['q'],
+    )
+    linhas = linhas_historico(emprestimos)
+    # No WSGI a resposta é lida por uma thread do servidor: gerador comum
+    conteudo = agerar_csv(linhas) if servido_por_asgi(request) else gerar_csv(linhas)
+    resposta = StreamingHttpResponse(conteudo, content_type='text/csv; charset=utf-8')
+    nome_arquivo = f"historico_emprestimos_{timezone.localdate():%Y%m%d}.csv"
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
+
+
+@login_required
+def fichas_epi(request):
+    ##
+    ## Página da equipe (staff) para gerar as fichas de EPI de todos os
+    ## colaboradores em lote (um .zip com um PDF por colaborador).
+    ## A geração roda em segundo plano; a página mostra o progresso e
+    ## permite retomar uma geração interrompida.
+    ##
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    if request.method == 'POST':
+        if 'retomar' in request.POST:
+            try:
+                pk = int(request.POST['retomar'])
+            except ValueError:
+                raise Http404("Geração inválida.")
+            geracao = get_object_or_404(GeracaoFichas, pk=pk)
+            # Só uma retomada "ganha" a linha (outra aba, ou o comando rodando)
+            if not GeracaoFichas.objects.reservar_retomada(pk):
+                messages.error(request, f'A geração #{geracao.id} não está interrompida.')
+                return redirect('fichas_epi')
+            messages.success(request, f'Geração #{geracao.id} retomada.')
+        else:
+            geracao = GeracaoFichas.objects.create(
+                solicitante=request.user, incluir_inativos='incluir_inativos' in request.POST
+            )
+            messages.success(request, f'Geração #{geracao.id} iniciada. Acompanhe o progresso abaixo.')
+        transaction.on_commit(lambda: iniciar_em_segundo_plano(geracao.id))
+        return redirect('fichas_epi')
+
+    geracoes = GeracaoFichas.objects.select_related('solicitante')[:20]
+    context = {
+        'geracoes': geracoes,
+        # Recarrega a página enquanto houver geração em andamento
+        'em_andamento': any(g.status in ('PENDENTE', 'EXECUTANDO') for g in geracoes),
+        'titulo_pagina': 'Fichas de EPI',
+    }
+    return render(request, 'fichas_epi.html', context)
+
+
+@login_required
+def fichas_epi_baixar(request, id):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    geracao = get_object_or_404(GeracaoFichas, pk=id, status='CONCLUIDO')
+    try:
+        arquivo = geracao.arquivo.open('rb')
+    except FileNotFoundError:
+        raise Http404("Arquivo da geração não encontrado.")
+    return FileResponse(arquivo, as_attachment=True, filename=f'fichas_epi_{geracao.id}.zip')
+
+
 @csrf_exempt # <--- CORREÇÃO APLICADA AQUI
 @login_required
-@transaction.atomic 
 def novo_emprestimo(request):
     if request.method == 'POST':
         form = EmprestimoForm(request.POST)
         formset = ItemEmprestadoFormSet(request.POST, prefix='itens')
 
         if form.is_valid() and formset.is_valid():
-            emprestimo = form.save()
+            # O formset já validou o carrinho inteiro (estoque e duplicados)
             itens = formset.save(commit=False)
-            
-            equipamentos_no_carrinho = []
-
-            for item in itens:
-                # Validação: Item duplicado
-                if item.equipamento in equipamentos_no_carrinho:
-                    messages.error(request, f"Erro: O equipamento '{item.equipamento.nome}' foi adicionado mais de uma vez.")
-                    return render(request, 'novo_emprestimo.html', {'form': form, 'formset': formset, 'titulo_pagina': 'Novo Empréstimo'})
-                
-                equipamentos_no_carrinho.append(item.equipamento)
-                equipamento = item.equipamento
-                
-                # Validação: Estoque
-                if item.quantidade_emprestada > equipamento.estoque_disponivel:
-                    messages.error(request, f"Erro no estoque de '{equipamento.nome}'. Disponível: {equipamento.estoque_disponivel}")
-                    return render(request, 'novo_emprestimo.html', {'form': form, 'formset': formset, 'titulo_pagina': 'Novo Empréstimo'})
-                
-                # Baixa no estoque
-                equipamento.estoque_disponivel -= item.quantidade_emprestada
-                equipamento.save()
-                
-                item.emprestimo = emprestimo
-                item.save()
+
+            try:
+                # Só a gravação fica na transação: com o modo IMMEDIATE,
+                # abrir uma já pega o lock de escrita do banco, e o GET e a
+                # validação só leem. Se alguma reserva falhar, desfaz o
+                # empréstimo e os itens já gravados.
+                with transaction.atomic():
+                    emprestimo = form.save()
+                    registrar_transicao(None, emprestimo.status)
+
+                    # Baixa no estoque de todo o carrinho em um UPDATE só
+                    # (só acontece se ainda houver saldo no banco)
+                    quantidades = {item.equipamento_id: item.quantidade_emprestada for item in itens}
+                    Equipamento.objects.reservar_lote(quantidades, referencia=f"Empréstimo #{emprestimo.id}")
+
+                    for item in itens:
+                        item.emprestimo = emprestimo
+                    ItemEmprestado.objects.bulk_create(itens)
+                    registrar_entrega(emprestimo.colaborador_id, emprestimo.data_prevista_devolucao, quantidades)
+            except EstoqueInsuficiente as erro:
+                messages.error(request, str(erro))
+                return render(request, 'novo_emprestimo.html', {'form': form, 'formset': formset, 'titulo_pagina': 'Novo Empréstimo'})
 
             messages.success(request, f"Empréstimo #{emprestimo.id} registrado com sucesso!")
             return redirect('novo_emprestimo')
+        elif formset.non_form_errors():
+            messages.error(request, formset.non_form_errors()[0])
         else:
             messages.error(request, "Formulário inválido. Verifique os erros abaixo.")
 
@@ -102,15 +213,27 @@ def novo_emprestimo(request):
     
 
 @login_required
+@pagina_condicional(cache.EMPRESTIMOS, cache.COLABORADORES, cache.EQUIPAMENTOS, diaria=True)
 def detalhe_emprestimo(request, id):
-    emprestimo = get_object_or_404(Emprestimo.objects.prefetch_related('itens_emprestados__equipamento'), id=id)
-    
-    itens_emprestados = emprestimo.itens_emprestados.prefetch_related('historico_devolucoes').all()
+    # Tudo em número fixo de consultas: empréstimo + colaborador,
+    # itens + equipamento e o histórico já ordenado (Prefetch).
+    historico_ordenado = Prefetch(
+        'historico_devolucoes',
+        queryset=HistoricoDevolucao.objects.order_by('-data_devolucao')
+    )
+    itens_com_historico = Prefetch(
+        'itens_emprestados',
+        queryset=ItemEmprestado.objects.select_related('equipamento').prefetch_related(historico_ordenado)
+    )
+    emprestimo = get_object_or_404(
+        Emprestimo.objects.select_related('colaborador').prefetch_related(itens_com_historico),
+        id=id
+    )
     
     itens_com_contexto = []
-    for item in itens_emprestados:
+    for item in emprestimo.itens_emprestados.all():
         form_devolucao = None
-        historico_item = item.historico_devolucoes.all().order_by('-data_devolucao')
+        historico_item = item.historico_devolucoes.all()
         
         if item.status_item == 'PENDENTE':
             form_devolucao = DevolucaoParcialForm(
@@ -134,36 +257,57 @@ def devolver_item_parcial(request, item_id):
     if request.method != 'POST':
         return redirect('lista_emprestimo') 
 
-    item = get_object_or_404(ItemEmprestado, id=item_id)
+    # Trava o item (nos bancos que suportam) para que duas devoluções
+    # simultâneas não passem da quantidade pendente
+    item = get_object_or_404(
+        ItemEmprestado.objects.select_for_update(of=('self',)).select_related('equipamento', 'emprestimo'),
+        id=item_id
+    )
     form = DevolucaoParcialForm(request.POST, prefix=f'item_{item.id}', item_emprestado_instance=item)
 
     if form.is_valid():
         nova_devolucao = form.save(commit=False)
         nova_devolucao.item_emprestado = item
-        nova_devolucao.save()
+        try:
+            with transaction.atomic():
+                nova_devolucao.save()
+        except ValidationError as erro:
+            messages.error(request, f"Erro ao processar devolução: {erro.messages[0]}")
+            return redirect('detalhe_emprestimo', id=item.emprestimo.id)
 
         equipamento = item.equipamento
         status = nova_devolucao.status_devolucao
         qtd_devolvida = nova_devolucao.quantidade_devolvida
         
+        referencia = f"Empréstimo #{item.emprestimo_id}"
         if status in ['DEVOLVIDO', 'DANIFICADO']:
-            equipamento.estoque_disponivel += qtd_devolvida
-            equipamento.save()
+            Equipamento.objects.repor(equipamento.pk, qtd_devolvida, referencia)
             messages.success(request, f"'{equipamento.nome}' (Qtde: {qtd_devolvida}) devolvido ao estoque.")
         
         elif status == 'PERDIDO':
+            # Não volta ao disponível e sai do estoque total (baixa por perda)
+            Equipamento.objects.baixar_perda(equipamento.pk, qtd_devolvida, referencia)
             messages.warning(request, f"'{equipamento.nome}' (Qtde: {qtd_devolvida}) registrado como Perdido.")
 
         if item.get_quantidade_pendente() == 0:
             item.status_item = 'CONCLUIDO'
-            item.save()
+            item.save(update_fields=['status_item'])
+        registrar_devolucao(item, qtd_devolvida)
 
         emprestimo = item.emprestimo
         status_dos_itens = emprestimo.itens_emprestados.values_list('status_item', flat=True)
         
         if 'PENDENTE' not in status_dos_itens:
+            # UPDATE condicional pelo status lido: só conclui (e conta no KPI)
+            # uma vez, saindo do contador certo
+            anterior = emprestimo.status
+            while anterior in ('ATIVO', 'ATRASADO'):
+                if Emprestimo.objects.filter(pk=emprestimo.pk, status=anterior).update(status='DEVOLVIDO'):
+                    registrar_transicao(anterior, 'DEVOLVIDO')
+                    break
+                # O status mudou no meio (ex: varredura de atrasos): relê
+                anterior = Emprestimo.objects.values_list('status', flat=True).get(pk=emprestimo.pk)
             emprestimo.status = 'DEVOLVIDO' 
-            emprestimo.save()
             messages.info(request, f"Todos os itens do Empréstimo #{emprestimo.id} foram processados. Empréstimo concluído.")
 
     else:
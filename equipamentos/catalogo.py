@@ -0,0 +1,36 @@
+from core import cache
+
+from .models import Equipamento
+
+
+def invalidar_catalogo():
+    ##
+    ## Incrementa a versão dos equipamentos no cache. Chamado sempre que
+    ## o estoque ou o cadastro de algum Equipamento muda.
+    ##
+    cache.invalidar(cache.EQUIPAMENTOS)
+
+
+def invalidar_catalogo_ao_confirmar():
+    # Invalida de novo depois do COMMIT, para que outra requisição não
+    # deixe no cache um estoque que ainda não tinha sido gravado.
+    cache.invalidar_ao_confirmar(cache.EQUIPAMENTOS)
+
+
+def equipamentos_disponiveis():
+    ##
+    ## Lista dos equipamentos com estoque, ordenada por nome.
+    ## Vem do cache enquanto a versão dos equipamentos não mudar.
+    ##
+    return cache.obter(
+        'equipamentos:disponiveis', [cache.EQUIPAMENTOS],
+        lambda: list(Equipamento.objects.filter(estoque_disponivel__gt=0).order_by('nome')),
+    )
+
+
+def equipamentos_cadastrados():
+    # Lista completa (tela de equipamentos), também do cache
+    return cache.obter(
+        'equipamentos:lista', [cache.EQUIPAMENTOS],
+        lambda: list(Equipamento.objects.order_by('nome')),
+    )
@@ -0,0 +1,96 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Equipamento, MovimentacaoEstoque, SaldoEstoque
+
+Saldo = namedtuple('Saldo', ['estoque_total', 'estoque_disponivel'])
+
+# O fechamento só soma movimentações com alguns minutos de idade: assim
+# uma transação que ainda não fez COMMIT (gravou a data antes) não fica
+# de fora do saldo fechado.
+MARGEM_FECHAMENTO = timedelta(minutes=5)
+
+
+def ultimo_fechamento(momento):
+    # Data do último fechamento até 'momento' (ou None se não houver)
+    return SaldoEstoque.objects.filter(data__lte=momento).aggregate(data=Max('data'))['data']
+
+
+def saldos_em(momento, equipamentos=None):
+    ##
+    ## Saldo (total e disponível) de cada equipamento em 'momento':
+    ## o último fechamento até a data + as movimentações depois dele.
+    ## Sem fechamento, soma o livro inteiro até a data.
+    ## 'equipamentos' limita a consulta a alguns IDs.
+    ## Retorna {id do equipamento: Saldo}; quem não tinha movimentação
+    ## até a data não aparece.
+    ##
+    fechamento = ultimo_fechamento(momento)
+    saldos = {}
+
+    if fechamento:
+        base = SaldoEstoque.objects.filter(data=fechamento)
+        if equipamentos is not None:
+            base = base.filter(equipamento_id__in=equipamentos)
+        for pk, total, disponivel in base.values_list('equipamento_id', 'estoque_total', 'estoque_disponivel'):
+            saldos[pk] = [total, disponivel]
+
+    movimentacoes = MovimentacaoEstoque.objects.filter(data__lte=momento)
+    if fechamento:
+        movimentacoes = movimentacoes.filter(data__gt=fechamento)
+    if equipamentos is not None:
+        movimentacoes = movimentacoes.filter(equipamento_id__in=equipamentos)
+    somas = movimentacoes.values('equipamento_id').annotate(
+        total=Sum('variacao_total'), disponivel=Sum('variacao_disponivel')
+    ).values_list('equipamento_id', 'total', 'disponivel').order_by()
+    for pk, total, disponivel in somas:
+        saldo = saldos.setdefault(pk, [0, 0])
+        saldo[0] += total
+        saldo[1] += disponivel
+
+    return {pk: Saldo(*valores) for pk, valores in saldos.items()}
+
+
+def saldo_em(equipamento_id, momento):
+    # Saldo de um equipamento só (Saldo(0, 0) se ainda não existia)
+    return saldos_em(momento, [equipamento_id]).get(equipamento_id, Saldo(0, 0))
+
+
+@transaction.atomic
+def fechar_saldos(agora=None):
+    ##
+    ## Grava um fechamento com o saldo de todos os equipamentos em
+    ## 'agora - MARGEM_FECHAMENTO'. Rodar periodicamente (ex: todo dia)
+    ## mantém curta a parte do livro que as consultas precisam somar.
+    ## Retorna (data do fechamento, quantidade de saldos gravados) ou
+    ## (None, 0) se já houver fechamento mais recente.
+    ##
+    data = (agora or timezone.now()) - MARGEM_FECHAMENTO
+    anterior = SaldoEstoque.objects.aggregate(data=Max('data'))['data']
+    if anterior and anterior >= data:
+        return None, 0
+
+    saldos = SaldoEstoque.objects.bulk_create([
+        SaldoEstoque(equipamento_id=pk, data=data, estoque_total=total, estoque_disponivel=disponivel)
+        for pk, (total, disponivel) in saldos_em(data).items()
+    ])
+    return data, len(saldos)
+
+
+def divergencias():
+    ##
+    ## Compara o saldo do livro com os campos do Equipamento.
+    ## Retorna [(equipamento, saldo do livro)] dos que não batem
+    ## (ex: estoque alterado por fora, pelo admin ou direto no banco).
+    ##
+    saldos = saldos_em(timezone.now())
+    diferentes = []
+    for equipamento in Equipamento.objects.only('id', 'nome', 'estoque_total', 'estoque_disponivel'):
+        saldo = saldos.get(equipamento.pk, Saldo(0, 0))
+        if saldo != (equipamento.estoque_total, equipamento.estoque_disponivel):
+            diferentes.append((equipamento, saldo))
+    return diferentes
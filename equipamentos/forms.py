@@ -1,4 +1,5 @@
 from django import forms
+from django.db import transaction
 from .models import Equipamento
 
 class EquipamentoForm(forms.ModelForm):
@@ -55,6 +56,8 @@ class EquipamentoForm(forms.ModelForm):
         
         if self.instance and self.instance.pk:
             self.fields['estoque_disponivel'].disabled = True
+            # Valor antes da edição: a diferença vira um AJUSTE no estoque
+            self.estoque_total_anterior = self.instance.estoque_total
 
     def clean_ca(self):
         ca = self.cleaned_data.get('ca')
@@ -67,6 +70,13 @@ class EquipamentoForm(forms.ModelForm):
         total = self.cleaned_data.get('estoque_total', 0)
         if total <= 0:
             raise forms.ValidationError("O estoque total deve ser pelo menos 1.")
+        if self.instance.pk:
+            # Unidades emprestadas continuam no total: não dá para baixar abaixo delas
+            emprestadas = self.estoque_total_anterior - self.instance.estoque_disponivel
+            if total < emprestadas:
+                raise forms.ValidationError(
+                    f"Há {emprestadas} unidade(s) emprestada(s); o estoque total não pode ser menor que isso."
+                )
         return total
 
     def clean_estoque_disponivel(self):
@@ -89,4 +99,25 @@ class EquipamentoForm(forms.ModelForm):
             total = cleaned_data.get('estoque_total')
             cleaned_data['estoque_disponivel'] = total
             
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+    def save(self, commit=True):
+        equipamento = super().save(commit=False)
+        if commit:
+            if equipamento.pk:
+                # Na edição NÃO regrava o estoque: ele é movimentado pelos
+                # empréstimos/devoluções e pode ter mudado desde que o
+                # formulário foi aberto. A mudança no total vira um AJUSTE
+                # (UPDATE com F() + livro de estoque), no total e no disponível.
+                campos = [f for f in self.Meta.fields if not f.startswith('estoque_')]
+                with transaction.atomic():
+                    equipamento.save(update_fields=campos + ['data_ultima_atualizacao'])
+                    Equipamento.objects.ajustar_total(
+                        equipamento.pk, equipamento.estoque_total - self.estoque_total_anterior,
+                        referencia='Edição do cadastro',
+                    )
+                equipamento.refresh_from_db(fields=['estoque_total', 'estoque_disponivel'])
+            else:
+                equipamento.save()
+            self._save_m2m()
+        return equipamento
\ No newline at end of file
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from equipamentos.estoque import divergencias, fechar_saldos
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava o fechamento do livro de estoque (saldo de cada equipamento). "
+        "Agende para rodar periodicamente, ex: uma vez por dia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help="Também compara o saldo do livro com o estoque atual dos equipamentos.",
+        )
+
+    def handle(self, *args, **options):
+        data, quantidade = fechar_saldos()
+        if data is None:
+            self.stdout.write("Já existe um fechamento mais recente; nada a fazer.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Fechamento de {data:%d/%m/%Y %H:%M}: {quantidade} saldo(s) gravado(s)."
+            ))
+
+        if options['verificar']:
+            diferentes = divergencias()
+            for equipamento, saldo in diferentes:
+                self.stdout.write(self.style.WARNING(
+                    f"{equipamento.nome}: livro {saldo.estoque_total}/{saldo.estoque_disponivel}, "
+                    f"cadastro {equipamento.estoque_total}/{equipamento.estoque_disponivel} (total/disponível)"
+                ))
+            if not diferentes:
+                self.stdout.write("Livro de estoque confere com o cadastro.")
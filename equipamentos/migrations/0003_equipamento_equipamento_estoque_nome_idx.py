@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipamentos", "0002_alter_equipamento_estoque_total_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="equipamento",
+            index=models.Index(
+                fields=["estoque_disponivel", "nome"],
+                name="equipamento_estoque_nome_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def abrir_livro(apps, schema_editor):
+    # Saldo de abertura: uma ENTRADA com o estoque atual de cada equipamento
+    # (o histórico anterior ao livro não existe)
+    Equipamento = apps.get_model("equipamentos", "Equipamento")
+    MovimentacaoEstoque = apps.get_model("equipamentos", "MovimentacaoEstoque")
+    MovimentacaoEstoque.objects.bulk_create(
+        [
+            MovimentacaoEstoque(
+                equipamento_id=pk,
+                tipo="ENTRADA",
+                variacao_total=total,
+                variacao_disponivel=disponivel,
+                referencia="Saldo inicial",
+            )
+            for pk, total, disponivel in Equipamento.objects.values_list(
+                "id", "estoque_total", "estoque_disponivel"
+            ).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipamentos", "0003_equipamento_equipamento_estoque_nome_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovimentacaoEstoque",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("ENTRADA", "Entrada"),
+                            ("SAIDA", "Saída (Empréstimo)"),
+                            ("DEVOLUCAO", "Devolução"),
+                            ("PERDA", "Perda"),
+                            ("AJUSTE", "Ajuste"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("variacao_total", models.IntegerField(default=0)),
+                ("variacao_disponivel", models.IntegerField(default=0)),
+                (
+                    "referencia",
+                    models.CharField(
+                        blank=True, help_text="Ex: Empréstimo #12", max_length=100
+                    ),
+                ),
+                ("data", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "equipamento",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movimentacoes",
+                        to="equipamentos.equipamento",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["equipamento", "data"],
+                        name="movimentacao_equip_data_idx",
+                    ),
+                    models.Index(fields=["data"], name="movimentacao_data_idx"),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SaldoEstoque",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.DateTimeField()),
+                ("estoque_total", models.IntegerField()),
+                ("estoque_disponivel", models.IntegerField()),
+                (
+                    "equipamento",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="saldos",
+                        to="equipamentos.equipamento",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("data", "equipamento"),
+                        name="saldo_data_equipamento_unico",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(abrir_livro, migrations.RunPython.noop),
+    ]
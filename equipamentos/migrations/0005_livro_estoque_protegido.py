@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipamentos", "0004_livro_estoque"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="movimentacaoestoque",
+            name="equipamento",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="movimentacoes",
+                to="equipamentos.equipamento",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="saldoestoque",
+            name="equipamento",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="saldos",
+                to="equipamentos.equipamento",
+            ),
+        ),
+    ]
@@ -1,6 +1,139 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, When
 from django.utils import timezone
 
+
+class EstoqueInsuficiente(Exception):
+    ##
+    ## Levantada quando uma reserva de estoque não pode ser feita
+    ## (outro empréstimo consumiu o saldo antes).
+    ##
+    pass
+
+
+class EquipamentoQuerySet(models.QuerySet):
+    ##
+    ## Movimentações de estoque feitas direto no banco, com UPDATE atômico.
+    ## Nada de ler o saldo, alterar no Python e salvar: dois almoxarifes
+    ## emprestando o mesmo item ao mesmo tempo não conseguem passar do estoque.
+    ##
+    ## Toda movimentação também grava o livro de estoque
+    ## (MovimentacaoEstoque) na mesma transação do UPDATE.
+
+    def reservar(self, pk, quantidade, referencia=''):
+        ##
+        ## Baixa 'quantidade' do estoque disponível, SOMENTE se houver saldo.
+        ## Retorna o número de linhas afetadas (1) ou levanta EstoqueInsuficiente.
+        ##
+        return self.reservar_lote({pk: quantidade}, referencia)
+
+    def reservar_lote(self, quantidades, referencia=''):
+        ##
+        ## Baixa várias quantidades ({pk: quantidade}) em UM único UPDATE.
+        ## Cada linha só é alterada se tiver saldo; se alguma faltar,
+        ## nada é gravado e levanta EstoqueInsuficiente.
+        ##
+        if not quantidades:
+            return 0
+
+        try:
+            with transaction.atomic(using=self.db):
+                # Trava as linhas nos bancos que suportam (no SQLite não há
+                # SELECT ... FOR UPDATE: o UPDATE condicional já garante a consistência)
+                if connections[self.db].features.has_select_for_update:
+                    list(self.select_for_update().filter(pk__in=quantidades).values_list('pk', flat=True))
+
+                com_saldo = Q()
+                nova_quantidade = []
+                for pk, quantidade in quantidades.items():
+                    com_saldo |= Q(pk=pk, estoque_disponivel__gte=quantidade)
+                    nova_quantidade.append(When(pk=pk, then=F('estoque_disponivel') - quantidade))
+
+                atualizados = self.filter(com_saldo).update(
+                    estoque_disponivel=Case(
+                        *nova_quantidade,
+                        default=F('estoque_disponivel'),
+                        output_field=models.PositiveIntegerField(),
+                    ),
+                    data_ultima_atualizacao=timezone.now(),
+                )
+                if atualizados != len(quantidades):
+                    # Desfaz as baixas que deram certo
+                    raise EstoqueInsuficiente()
+
+                MovimentacaoEstoque.objects.using(self.db).bulk_create([
+                    MovimentacaoEstoque(
+                        equipamento_id=pk, tipo=MovimentacaoEstoque.SAIDA,
+                        variacao_disponivel=-quantidade, referencia=referencia,
+                    )
+                    for pk, quantidade in quantidades.items()
+                ])
+
+                # UPDATE não dispara post_save: invalida o catálogo aqui
+                from .catalogo import invalidar_catalogo_ao_confirmar
+                invalidar_catalogo_ao_confirmar()
+        except EstoqueInsuficiente:
+            # Com a transação desfeita, descobre qual item ficou sem saldo
+            saldos = self.filter(pk__in=quantidades).values_list('pk', 'nome', 'estoque_disponivel')
+            for pk, nome, disponivel in saldos:
+                if disponivel < quantidades[pk]:
+                    raise EstoqueInsuficiente(
+                        f"Erro no estoque de '{nome}'. Disponível: {disponivel}"
+                    )
+            raise EstoqueInsuficiente("Erro no estoque: equipamento não encontrado.")
+        return atualizados
+
+    def repor(self, pk, quantidade, referencia=''):
+        ##
+        ## Devolve 'quantidade' ao estoque disponível (UPDATE com F()).
+        ## Retorna o número de linhas afetadas.
+        ##
+        return self._movimentar(pk, MovimentacaoEstoque.DEVOLUCAO, referencia, disponivel=quantidade)
+
+    def baixar_perda(self, pk, quantidade, referencia=''):
+        ##
+        ## Item emprestado que não volta (PERDIDO): sai do estoque total.
+        ## O disponível não muda, porque a unidade já estava fora dele.
+        ##
+        return self._movimentar(pk, MovimentacaoEstoque.PERDA, referencia, total=-quantidade)
+
+    def ajustar_total(self, pk, variacao, referencia=''):
+        ##
+        ## Compra (variacao > 0) ou baixa (variacao < 0) de unidades em
+        ## estoque: muda o total e o disponível juntos. A baixa só acontece
+        ## se houver essa quantidade disponível; senão levanta EstoqueInsuficiente.
+        ##
+        if not variacao:
+            return 0
+        return self._movimentar(
+            pk, MovimentacaoEstoque.AJUSTE, referencia, total=variacao, disponivel=variacao
+        )
+
+    def _movimentar(self, pk, tipo, referencia, total=0, disponivel=0):
+        from .catalogo import invalidar_catalogo_ao_confirmar
+
+        # Sem savepoint: um erro aqui desfaz a transação de quem chamou
+        with transaction.atomic(using=self.db, savepoint=False):
+            linhas = self.filter(pk=pk)
+            if disponivel < 0:
+                linhas = linhas.filter(estoque_disponivel__gte=-disponivel)
+            atualizados = linhas.update(
+                estoque_total=F('estoque_total') + total,
+                estoque_disponivel=F('estoque_disponivel') + disponivel,
+                data_ultima_atualizacao=timezone.now(),
+            )
+            if not atualizados:
+                if disponivel < 0 and self.filter(pk=pk).exists():
+                    raise EstoqueInsuficiente("Não há unidades disponíveis suficientes para a baixa.")
+                return 0
+            MovimentacaoEstoque.objects.using(self.db).create(
+                equipamento_id=pk, tipo=tipo, variacao_total=total,
+                variacao_disponivel=disponivel, referencia=referencia,
+            )
+            invalidar_catalogo_ao_confirmar()
+        return atualizados
+
+
 class Equipamento(models.Model):
     ##
     ## Modelo para cadastrar os Equipamentos de Proteção Individual (EPIs).
@@ -48,6 +181,14 @@ class Equipamento(models.Model):
     # --- Campos de Controle ---
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name="Data de Cadastro")
     data_ultima_atualizacao = models.DateTimeField(auto_now=True, verbose_name="Última Atualização")
+
+    objects = EquipamentoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Seletor de equipamentos disponíveis (estoque > 0, ordem por nome)
+            models.Index(fields=['estoque_disponivel', 'nome'], name='equipamento_estoque_nome_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome} (C.A.: {self.ca or 'N/A'})"
@@ -55,6 +196,89 @@ class Equipamento(models.Model):
     def save(self, *args, **kwargs):
         # Garante que, ao criar um novo equipamento (sem ID),
         # o estoque disponível seja igual ao estoque total.
-        if not self.id:
-            self.estoque_disponivel = self.estoque_total
-        super(Equipamento, self).save(*args, **kwargs)
\ No newline at end of file
+        if self.id:
+            return super(Equipamento, self).save(*args, **kwargs)
+
+        self.estoque_disponivel = self.estoque_total
+        with transaction.atomic(using=kwargs.get('using')):
+            super(Equipamento, self).save(*args, **kwargs)
+            # A entrada inicial abre o livro de estoque do equipamento
+            MovimentacaoEstoque.objects.create(
+                equipamento=self, tipo=MovimentacaoEstoque.ENTRADA,
+                variacao_total=self.estoque_total, variacao_disponivel=self.estoque_disponivel,
+                referencia='Cadastro',
+            )
+
+
+class MovimentacaoEstoque(models.Model):
+    ##
+    ## Livro de estoque: cada mudança no estoque de um equipamento vira
+    ## uma linha, gravada na mesma transação da mudança. As linhas nunca
+    ## são alteradas; o saldo em uma data é a soma das variações até ela
+    ## (ver equipamentos/estoque.py).
+    ##
+    ENTRADA = 'ENTRADA'
+    SAIDA = 'SAIDA'
+    DEVOLUCAO = 'DEVOLUCAO'
+    PERDA = 'PERDA'
+    AJUSTE = 'AJUSTE'
+    TIPOS_CHOICES = [
+        (ENTRADA, 'Entrada'),
+        (SAIDA, 'Saída (Empréstimo)'),
+        (DEVOLUCAO, 'Devolução'),
+        (PERDA, 'Perda'),
+        (AJUSTE, 'Ajuste'),
+    ]
+
+    # PROTECT: excluir o equipamento não pode apagar o histórico do livro
+    equipamento = models.ForeignKey(
+        Equipamento, on_delete=models.PROTECT, related_name='movimentacoes',
+        db_index=False # Coberto pelo índice (equipamento, data) do Meta
+    )
+    tipo = models.CharField(max_length=10, choices=TIPOS_CHOICES)
+    # Quanto o estoque total e o disponível mudaram (negativo = saiu)
+    variacao_total = models.IntegerField(default=0)
+    variacao_disponivel = models.IntegerField(default=0)
+    referencia = models.CharField(max_length=100, blank=True, help_text="Ex: Empréstimo #12")
+    data = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Saldo de um equipamento em uma data e a lista de movimentações
+            models.Index(fields=['equipamento', 'data'], name='movimentacao_equip_data_idx'),
+            # Saldos de todos os equipamentos a partir de um fechamento
+            models.Index(fields=['data'], name='movimentacao_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.equipamento_id} em {self.data:%d/%m/%Y %H:%M}"
+
+    def save(self, *args, **kwargs):
+        # Livro só de inserção: corrigir = lançar um AJUSTE
+        if not self._state.adding:
+            raise ValueError("Movimentações de estoque não podem ser alteradas.")
+        super().save(*args, **kwargs)
+
+
+class SaldoEstoque(models.Model):
+    ##
+    ## Fechamento periódico do livro de estoque: o saldo de cada
+    ## equipamento em 'data'. Uma consulta de saldo lê o último fechamento
+    ## antes da data pedida e soma só as movimentações depois dele.
+    ## Gerado pelo comando 'fechar_saldos_estoque'.
+    ##
+    equipamento = models.ForeignKey(
+        Equipamento, on_delete=models.PROTECT, related_name='saldos',
+        db_index=False # Coberto pela restrição única (data, equipamento)
+    )
+    data = models.DateTimeField()
+    estoque_total = models.IntegerField()
+    estoque_disponivel = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'equipamento'], name='saldo_data_equipamento_unico'),
+        ]
+
+    def __str__(self):
+        return f"Saldo de {self.equipamento_id} em {self.data:%d/%m/%Y %H:%M}"
\ No newline at end of file
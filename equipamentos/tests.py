@@ -1,3 +1,187 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.busca import reconstruir_indice
+from core.testes_util import ConsultasFixasMixin, PlanoConsultaMixin
+from .catalogo import equipamentos_disponiveis
+from .estoque import Saldo, divergencias, fechar_saldos, saldo_em, saldos_em
+from .forms import EquipamentoForm
+from .models import Equipamento, EstoqueInsuficiente, MovimentacaoEstoque, SaldoEstoque
+
+
+class PlanoConsultasEquipamentosTest(PlanoConsultaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for numero in range(20):
+            Equipamento.objects.create(
+                nome=f'Equipamento {numero}',
+                ca=str(1000 + numero),
+                estoque_total=10,
+                estoque_disponivel=numero % 3,
+            )
+
+    def test_catalogo_de_equipamentos_disponiveis(self):
+        cache.clear()
+        self.assertSemVarreduraCompleta(equipamentos_disponiveis, {'equipamentos_equipamento'})
+
+
+class ConsultasFixasEquipamentosTest(ConsultasFixasMixin, TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoque', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_equipamento_lista(self):
+        def preparar(tamanho):
+            self.semear(emprestimos=tamanho, equipamentos=tamanho)
+            return (reverse('equipamento_lista'),)
+        self.assertConsultasFixas(3, self.client.get, preparar)
+
+
+class AutocompleteEquipamentoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('estoque', password='senha')
+        for nome, ca, disponivel in [('Luva de Raspa', '12345', 4), ('Protetor Auricular', '123', 2), ('Luva Nitrílica', '999', 0)]:
+            equipamento = Equipamento.objects.create(nome=nome, ca=ca, estoque_total=10)
+            Equipamento.objects.filter(pk=equipamento.pk).update(estoque_disponivel=disponivel)
+        reconstruir_indice()
+
+    def buscar(self, termo):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('equipamento_autocomplete'), {'q': termo})
+        return [(resultado['texto'], resultado['disponivel']) for resultado in resposta.json()['resultados']]
+
+    def test_somente_com_estoque(self):
+        # A luva sem estoque não aparece
+        self.assertEqual(self.buscar('luva'), [('Luva de Raspa (C.A.: 12345)', 4)])
+
+    def test_ca_exato_primeiro(self):
+        self.assertEqual(
+            [texto for texto, _ in self.buscar('123')],
+            ['Protetor Auricular (C.A.: 123)', 'Luva de Raspa (C.A.: 12345)'],
+        )
+
+class ReservaEstoqueTest(TestCase):
+
+    def setUp(self):
+        self.luva = Equipamento.objects.create(nome='Luva', estoque_total=10, estoque_disponivel=10)
+        self.bota = Equipamento.objects.create(nome='Bota', estoque_total=3, estoque_disponivel=3)
+
+    def disponiveis(self):
+        return dict(Equipamento.objects.values_list('nome', 'estoque_disponivel'))
+
+    def test_reserva_do_carrinho_inteiro(self):
+        self.assertEqual(Equipamento.objects.reservar_lote({self.luva.pk: 4, self.bota.pk: 3}, 'Empréstimo #1'), 2)
+        self.assertEqual(self.disponiveis(), {'Luva': 6, 'Bota': 0})
+        self.assertEqual(MovimentacaoEstoque.objects.filter(tipo=MovimentacaoEstoque.SAIDA).count(), 2)
+
+    def test_falta_de_saldo_nao_grava_nada(self):
+        # A luva tem saldo, a bota não: nenhuma das duas é baixada
+        with self.assertRaisesMessage(EstoqueInsuficiente, "Erro no estoque de 'Bota'. Disponível: 3"):
+            Equipamento.objects.reservar_lote({self.luva.pk: 4, self.bota.pk: 5}, 'Empréstimo #1')
+        self.assertEqual(self.disponiveis(), {'Luva': 10, 'Bota': 3})
+        self.assertFalse(MovimentacaoEstoque.objects.filter(tipo=MovimentacaoEstoque.SAIDA).exists())
+
+    def test_reposicao_e_baixa_de_ajuste(self):
+        Equipamento.objects.reservar(self.bota.pk, 2)
+        Equipamento.objects.repor(self.bota.pk, 1)
+        self.assertEqual(self.disponiveis()['Bota'], 2)
+        # Baixa maior que o disponível: recusada, estoque intacto (sem
+        # savepoint próprio, o erro desfaz a transação de quem chamou)
+        with self.assertRaises(EstoqueInsuficiente), transaction.atomic():
+            Equipamento.objects.ajustar_total(self.bota.pk, -3)
+        self.bota.refresh_from_db()
+        self.assertEqual((self.bota.estoque_total, self.bota.estoque_disponivel), (3, 2))
+
+class LivroEstoqueTest(PlanoConsultaMixin, TestCase):
+
+    def setUp(self):
+        self.luva = Equipamento.objects.create(nome='Luva', ca='123', estoque_total=10)
+
+    def movimentar(self, dia, variacao_total=0, variacao_disponivel=0):
+        # Movimentação com data fixa (dia de janeiro de 2026)
+        return MovimentacaoEstoque.objects.create(
+            equipamento=self.luva, tipo=MovimentacaoEstoque.AJUSTE, variacao_total=variacao_total,
+            variacao_disponivel=variacao_disponivel, data=timezone.make_aware(datetime(2026, 1, dia)),
+        )
+
+    def test_movimentacoes_acompanham_o_estoque(self):
+        Equipamento.objects.reservar_lote({self.luva.pk: 4}, referencia='Empréstimo #1')
+        Equipamento.objects.repor(self.luva.pk, 1, 'Empréstimo #1')
+        Equipamento.objects.baixar_perda(self.luva.pk, 2, 'Empréstimo #1')
+
+        self.luva.refresh_from_db()
+        self.assertEqual((self.luva.estoque_total, self.luva.estoque_disponivel), (8, 7))
+        self.assertEqual(
+            list(self.luva.movimentacoes.order_by('id').values_list('tipo', 'variacao_total', 'variacao_disponivel')),
+            [('ENTRADA', 10, 10), ('SAIDA', 0, -4), ('DEVOLUCAO', 0, 1), ('PERDA', -2, 0)],
+        )
+        self.assertEqual(divergencias(), [])
+
+    def test_excluir_equipamento_nao_apaga_o_livro(self):
+        self.client.force_login(User.objects.create_user('estoque', password='senha'))
+        fechar_saldos(agora=timezone.now() + timedelta(days=1))
+
+        resposta = self.client.post(reverse('equipamento_excluir', args=[self.luva.id]), follow=True)
+        self.assertContains(resposta, 'movimentações de estoque registradas')
+        self.assertTrue(Equipamento.objects.filter(pk=self.luva.pk).exists())
+        self.assertEqual(self.luva.movimentacoes.count(), 1)
+        self.assertEqual(self.luva.saldos.count(), 1)
+
+    def test_saldo_em_uma_data_com_e_sem_fechamento(self):
+        MovimentacaoEstoque.objects.filter(equipamento=self.luva).update(
+            data=timezone.make_aware(datetime(2026, 1, 1))
+        )
+        self.movimentar(5, variacao_disponivel=-3)
+        self.movimentar(10, variacao_total=-1)
+        self.movimentar(20, variacao_disponivel=2)
+        datas = [timezone.make_aware(datetime(2026, 1, dia, 12)) for dia in (1, 5, 15, 25)]
+        esperados = [Saldo(10, 10), Saldo(10, 7), Saldo(9, 7), Saldo(9, 9)]
+
+        self.assertEqual([saldo_em(self.luva.pk, data) for data in datas], esperados)
+
+        fechar_saldos(agora=timezone.make_aware(datetime(2026, 1, 12)))
+        self.assertEqual(SaldoEstoque.objects.get().estoque_disponivel, 7)
+        self.assertEqual([saldo_em(self.luva.pk, data) for data in datas], esperados)
+        self.assertEqual(saldo_em(self.luva.pk, datas[0] - timedelta(days=1)), Saldo(0, 0))
+
+    def test_saldo_depois_do_fechamento_le_so_o_fim_do_livro(self):
+        for dia in range(2, 28):
+            self.movimentar(dia, variacao_disponivel=-1 if dia % 2 else 1)
+        fechar_saldos(agora=timezone.make_aware(datetime(2026, 1, 20)))
+        momento = timezone.make_aware(datetime(2026, 1, 25))
+
+        self.assertSemVarreduraCompleta(
+            lambda: saldos_em(momento), {'equipamentos_movimentacaoestoque', 'equipamentos_saldoestoque'}
+        )
+        self.assertSemVarreduraCompleta(
+            lambda: saldo_em(self.luva.pk, momento), {'equipamentos_movimentacaoestoque'}
+        )
+
+    def test_edicao_do_total_vira_ajuste(self):
+        Equipamento.objects.reservar(self.luva.pk, 6)
+        self.luva.refresh_from_db()
+        dados = {'nome': 'Luva', 'categoria': 'OUTRO', 'ca': '123'}
+
+        form = EquipamentoForm({**dados, 'estoque_total': 5}, instance=self.luva)
+        self.assertIn('estoque_total', form.errors)
+
+        form = EquipamentoForm({**dados, 'estoque_total': 15}, instance=self.luva)
+        equipamento = form.save()
+        self.assertEqual((equipamento.estoque_total, equipamento.estoque_disponivel), (15, 9))
+        self.assertEqual(self.luva.movimentacoes.latest('id').tipo, MovimentacaoEstoque.AJUSTE)
 
-# Create your tests here.
+    def test_movimentacao_nao_pode_ser_alterada(self):
+        movimentacao = self.luva.movimentacoes.get()
+        movimentacao.variacao_total = 99
+        with self.assertRaises(ValueError):
+            movimentacao.save()
@@ -18,4 +18,12 @@ urlpatterns = [
     # Rota para excluir um equipamento específico (será chamada pelo modal)
     # ex: /sistema/equipamentos/excluir/5/
     path('excluir/<int:id>/', views.equipamento_excluir, name='equipamento_excluir'),
+
+    # Livro de estoque (movimentações e saldo em uma data)
+    # ex: /sistema/equipamentos/movimentacoes/5/?data=2026-01-31
+    path('movimentacoes/<int:id>/', views.equipamento_movimentacoes, name='equipamento_movimentacoes'),
+
+    # Busca JSON para o seletor de equipamento do carrinho (autocomplete)
+    # ex: /sistema/equipamentos/buscar/?q=luva
+    path('buscar/', views.equipamento_autocomplete, name='equipamento_autocomplete'),
 ]
\ No newline at end of file
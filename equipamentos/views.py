@@ -1,25 +1,46 @@
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from .models import Equipamento
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import JsonResponse
+from .models import EstoqueInsuficiente, Equipamento
+from .catalogo import equipamentos_cadastrados
+from .estoque import saldo_em
 from .forms import EquipamentoForm
+from core import cache
+from core.assincrono import view_assincrona
+from core.busca import TIPO_EQUIPAMENTO, filtrar_por_busca
+from core.condicional import pagina_condicional
 from django.db.models import ProtectedError
 # Importação necessária para corrigir o erro de CSRF
 from django.views.decorators.csrf import csrf_exempt 
 
+# Quantidade máxima de resultados devolvidos pelo autocomplete
+LIMITE_AUTOCOMPLETE = 20
+
+# Movimentações mostradas na tela do livro de estoque
+LIMITE_MOVIMENTACOES = 100
+
+@view_assincrona
 @login_required
-def equipamento_lista(request):
+@pagina_condicional(cache.EQUIPAMENTOS)
+async def equipamento_lista(request):
     query = request.GET.get('q', '')
     
     if query:
-        equipamentos = Equipamento.objects.filter(
-            Q(nome__icontains=query) |
-            Q(ca__icontains=query) |
-            Q(categoria__icontains=query)
-        ).order_by('nome')
+        # A busca pode consultar o índice (FTS) antes de montar o filtro
+        equipamentos = await sync_to_async(lambda: list(filtrar_por_busca(
+            Equipamento.objects.all(), TIPO_EQUIPAMENTO, query,
+            campos=['nome', 'ca', 'categoria'],
+        ).order_by('nome')))()
     else:
-        equipamentos = Equipamento.objects.all().order_by('nome')
+        # Lista completa: do cache enquanto nenhum equipamento mudar
+        equipamentos = await sync_to_async(equipamentos_cadastrados)()
 
     context = {
         'equipamentos_lista': equipamentos,
@@ -63,9 +84,14 @@ def equipamento_editar(request, id):
     if request.method == 'POST':
         form = EquipamentoForm(request.POST, instance=equipamento)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Equipamento atualizado com sucesso!')
-            return redirect('equipamento_lista')
+            try:
+                form.save()
+            except EstoqueInsuficiente as erro:
+                # Um empréstimo levou as unidades enquanto o formulário estava aberto
+                messages.error(request, f'Erro: {erro}')
+            else:
+                messages.success(request, 'Equipamento atualizado com sucesso!')
+                return redirect('equipamento_lista')
     else:
         form = EquipamentoForm(instance=equipamento)
 
@@ -86,8 +112,75 @@ def equipamento_excluir(request, id):
         if equipamento.estoque_disponivel < equipamento.estoque_total:
             messages.error(request, f'ERRO: O equipamento "{equipamento.nome}" não pode ser excluído pois há itens emprestados.')
         else:
-            nome_equipamento = equipamento.nome
-            equipamento.delete()
-            messages.success(request, f'Equipamento "{nome_equipamento}" foi excluído com sucesso.')
+            try:
+                nome_equipamento = equipamento.nome
+                equipamento.delete()
+                messages.success(request, f'Equipamento "{nome_equipamento}" foi excluído com sucesso.')
+            except ProtectedError:
+                # O livro de estoque (e os empréstimos) guardam o histórico
+                messages.error(request, f'ERRO: O equipamento "{equipamento.nome}" tem movimentações de estoque registradas e não pode ser excluído.')
     
-    return redirect('equipamento_lista')
\ No newline at end of file
+    return redirect('equipamento_lista')
+
+
+@login_required
+def equipamento_movimentacoes(request, id):
+    ##
+    ## Livro de estoque de um equipamento: as últimas movimentações e o
+    ## saldo em uma data escolhida (?data=AAAA-MM-DD, fim do dia).
+    ##
+    equipamento = get_object_or_404(Equipamento, id=id)
+    movimentacoes = equipamento.movimentacoes.order_by('-data', '-id')
+
+    data_consulta = parse_date(request.GET.get('data', '') or '')
+    saldo = None
+    if data_consulta:
+        fim_do_dia = timezone.make_aware(datetime.combine(data_consulta, time.max))
+        saldo = saldo_em(equipamento.id, fim_do_dia)
+        movimentacoes = movimentacoes.filter(data__lte=fim_do_dia)
+
+    context = {
+        'equipamento': equipamento,
+        'movimentacoes': movimentacoes[:LIMITE_MOVIMENTACOES],
+        'data_consulta': data_consulta,
+        'saldo': saldo,
+    }
+    return render(request, 'equipamento_movimentacoes.html', context)
+
+
+@view_assincrona
+@login_required
+async def equipamento_autocomplete(request):
+    ##
+    ## Busca JSON para o seletor de equipamento do carrinho
+    ## (somente itens com estoque). Busca por nome ou C.A.;
+    ## quem começa com o termo aparece primeiro.
+    ##
+    termo = request.GET.get('q', '').strip()
+    equipamentos = Equipamento.objects.filter(estoque_disponivel__gt=0)
+
+    if termo:
+        # Índice de busca (nome, C.A. e categoria, por prefixo)
+        equipamentos = await sync_to_async(filtrar_por_busca)(
+            equipamentos, TIPO_EQUIPAMENTO, termo, campos=['nome', 'ca'],
+        )
+        equipamentos = equipamentos.annotate(
+            relevancia=Case(
+                When(ca=termo, then=Value(0)),
+                When(Q(nome__istartswith=termo) | Q(ca__startswith=termo), then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        ).order_by('relevancia', 'nome')
+    else:
+        equipamentos = equipamentos.order_by('nome')
+
+    resultados = [
+        {
+            'id': e.id,
+            'texto': str(e),
+            'disponivel': e.estoque_disponivel,
+        }
+        async for e in equipamentos.only('id', 'nome', 'ca', 'estoque_disponivel')[:LIMITE_AUTOCOMPLETE]
+    ]
+    return JsonResponse({'resultados': resultados})
\ No newline at end of file
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "setup.settings")
+# No ASGI cada requisição usa uma thread nova para o banco: conexões
+# persistentes ficariam presas a threads que não voltam (ver DATABASES)
+os.environ.setdefault("EPI_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -32,6 +32,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista: mede a requisição inteira (Server-Timing)
+    "core.middleware.DiagnosticoMiddleware",
+    # Antes dos demais: comprime a resposta já pronta (ver core/middleware.py)
+    "core.middleware.CompressaoMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -45,7 +49,8 @@ ROOT_URLCONF = "setup.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Backend padrão do Django + medição do tempo de renderização
+        "BACKEND": "core.diagnostico.DjangoTemplatesMedidos",
         "DIRS": [os.path.join(BASE_DIR, 'templates')],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -60,13 +65,85 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "setup.wsgi.application"
 
-# Database - SQLite
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# Banco de dados: perfil escolhido por EPI_BANCO ('sqlite', o padrão, ou
+# 'postgresql'). Os dois mantêm a conexão entre requisições e conferem se
+# ela ainda responde antes de reaproveitar (CONN_HEALTH_CHECKS).
+EPI_BANCO = os.environ.get('EPI_BANCO', 'sqlite')
+
+if EPI_BANCO == 'postgresql':
+    # Pool de conexões do psycopg 3 (pip install "psycopg[pool]"): cada
+    # worker guarda até EPI_DB_POOL conexões abertas. Com o pool, a
+    # conexão volta para ele no fim da requisição (CONN_MAX_AGE = 0).
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get('EPI_DB_NOME', 'projetic_epi'),
+            "USER": os.environ.get('EPI_DB_USUARIO', 'projetic_epi'),
+            "PASSWORD": os.environ.get('EPI_DB_SENHA', ''),
+            "HOST": os.environ.get('EPI_DB_HOST', 'localhost'),
+            "PORT": os.environ.get('EPI_DB_PORTA', '5432'),
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "pool": {
+                    "min_size": 2,
+                    "max_size": int(os.environ.get('EPI_DB_POOL', '10')),
+                    "timeout": 10,
+                },
+            },
+        }
     }
-}
+elif EPI_BANCO == 'sqlite':
+    # SQLite em WAL (PRAGMAs em core/banco.py). Transação IMMEDIATE: quem
+    # vai gravar pega o lock logo no início e espera a vez (busy_timeout),
+    # em vez de falhar com "database is locked" ao passar de leitura para
+    # escrita. No ASGI o setup/asgi.py desliga a conexão persistente.
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get('EPI_DB_NOME') or BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": int(os.environ.get('EPI_CONN_MAX_AGE', '600')),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+            # Testes em arquivo (e não na memória): WAL e locks de verdade
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+else:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(f"EPI_BANCO='{EPI_BANCO}': use 'sqlite' ou 'postgresql'.")
+
+# Cache (catálogos, sugestões, busca de colaboradores e KPIs; ver core/cache.py)
+# O padrão (LocMem) fica na memória de cada processo: com vários workers,
+# cada um tem o seu cache e pode ver um dado antigo por até
+# core.cache.TEMPO_PADRAO. Nesse caso, defina EPI_CACHE_DIR (cache em
+# arquivos, compartilhado) ou troque o BACKEND por Redis/Memcached.
+# As respostas 304 (ETag, core/condicional.py) só são ligadas com um
+# cache compartilhado.
+if os.environ.get('EPI_CACHE_DIR'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ['EPI_CACHE_DIR'],
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "projetic-epi",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+
+# Sessões: lidas do cache e gravadas também no banco (sobrevivem a um
+# cache limpo ou reiniciado). Com o cache em memória de cada processo, a
+# sessão só vem do banco na primeira requisição de cada worker.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Autenticação: o ModelBackend padrão, trazendo o perfil junto com o usuário
+AUTHENTICATION_BACKENDS = ["core.autenticacao.PerfilModelBackend"]
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -95,11 +172,33 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# Destino do 'python manage.py collectstatic' (nomes com hash, CSS/JS
+# minificados e versões .gz/.br; ver core/estaticos.py)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.estaticos.ArmazenamentoEstatico"},
+}
+
+# Com DEBUG=False o Django não serve os estáticos. Sem um servidor web
+# na frente (nginx), EPI_SERVIR_ESTATICOS=1 faz o próprio sistema servir
+# o STATIC_ROOT, com compressão e cache imutável.
+SERVIR_ESTATICOS = os.environ.get('EPI_SERVIR_ESTATICOS') == '1'
 
 # Media Files (Upload de imagens)
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# KPIs de empréstimos: com True, o painel lê a tabela de contadores
+# (ContadorStatus), mantida a cada mudança de status. Depois de ligar,
+# rode 'python manage.py reconstruir_contadores_kpi' uma vez.
+EMPRESTIMOS_KPI_CONTADORES = False
+
+# Diagnóstico de desempenho: quantas requisições recentes de cada
+# view ficam em memória para calcular p50/p95/p99 (/sistema/diagnostico/)
+DIAGNOSTICO_TAMANHO_BUFFER = 200
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -1,8 +1,12 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings # Importação necessária
 from django.conf.urls.static import static # Importação necessária para arquivos de mídia
 
+from core.estaticos import servir_estatico
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
@@ -13,4 +17,9 @@ urlpatterns = [
 
 # Adiciona suporte a arquivos de mídia no modo DEBUG
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Estáticos do collectstatic servidos pelo próprio Django (sem nginx)
+elif settings.SERVIR_ESTATICOS:
+    urlpatterns += [
+        re_path(r'^%s(?P<caminho>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), servir_estatico),
+    ]
\ No newline at end of file
@@ -6,6 +6,7 @@ document.addEventListener("DOMContentLoaded", function() {
     setupDeleteModal();
     setupFeedbackModal(); // Nossa correção está aqui
     setupEmprestimoFormset();
+    setupAutocomplete(document);
 
     if (typeof feather !== 'undefined') {
         feather.replace();
@@ -152,8 +153,112 @@ function setupEmprestimoFormset() {
         const newFormHtml = template.innerHTML.replace(/__prefix__/g, formCount);
         const newElement = document.createElement('div');
         newElement.innerHTML = newFormHtml;
-        container.appendChild(newElement.firstElementChild); 
+        const novoItem = newElement.firstElementChild;
+        container.appendChild(novoItem); 
+        setupAutocomplete(novoItem);
         formCount++;
         totalFormsInput.value = formCount;
     });
+}
+
+/**
+ * AUTOCOMPLETE (colaborador e equipamento)
+ * Troca o <select> por um campo de busca que consulta o endpoint JSON
+ * (data-autocomplete-url) com debounce, em vez de carregar a lista inteira.
+ */
+function setupAutocomplete(raiz) {
+    const selects = raiz.querySelectorAll('select[data-autocomplete-url]');
+
+    selects.forEach(select => {
+        // O modelo do formset é só texto para clonar: não mexe nele
+        if (select.closest('#empty-form-template') || select.dataset.autocompleteAtivo) {
+            return;
+        }
+        select.dataset.autocompleteAtivo = '1';
+
+        const url = select.dataset.autocompleteUrl;
+        const wrapper = document.createElement('div');
+        wrapper.className = 'autocomplete';
+        const input = document.createElement('input');
+        input.type = 'text';
+        input.className = 'autocomplete-input';
+        input.placeholder = 'Digite para buscar...';
+        input.autocomplete = 'off';
+        const lista = document.createElement('ul');
+        lista.className = 'autocomplete-resultados';
+
+        const selecionada = select.options[select.selectedIndex];
+        if (selecionada && selecionada.value) {
+            input.value = selecionada.textContent;
+        }
+
+        select.style.display = 'none';
+        select.parentNode.insertBefore(wrapper, select);
+        wrapper.appendChild(input);
+        wrapper.appendChild(lista);
+
+        let temporizador = null;
+        let controlador = null;
+
+        const fecharLista = () => {
+            lista.innerHTML = '';
+            lista.classList.remove('show');
+        };
+
+        const escolher = (resultado) => {
+            select.innerHTML = '';
+            const opcao = new Option(resultado.texto, resultado.id, true, true);
+            select.appendChild(opcao);
+            input.value = resultado.texto;
+            fecharLista();
+        };
+
+        const buscar = (termo) => {
+            // Cancela a busca anterior que ainda não respondeu
+            if (controlador) {
+                controlador.abort();
+            }
+            controlador = new AbortController();
+
+            fetch(`${url}?q=${encodeURIComponent(termo)}`, { signal: controlador.signal })
+                .then(resposta => resposta.json())
+                .then(dados => {
+                    lista.innerHTML = '';
+                    if (!dados.resultados.length) {
+                        const vazio = document.createElement('li');
+                        vazio.className = 'autocomplete-vazio';
+                        vazio.textContent = 'Nenhum resultado encontrado.';
+                        lista.appendChild(vazio);
+                    }
+                    dados.resultados.forEach(resultado => {
+                        const item = document.createElement('li');
+                        item.textContent = resultado.texto;
+                        item.addEventListener('mousedown', function(e) {
+                            e.preventDefault();
+                            escolher(resultado);
+                        });
+                        lista.appendChild(item);
+                    });
+                    lista.classList.add('show');
+                })
+                .catch(erro => {
+                    if (erro.name !== 'AbortError') {
+                        fecharLista();
+                    }
+                });
+        };
+
+        input.addEventListener('input', function() {
+            // Digitou de novo: a escolha anterior deixa de valer
+            select.value = '';
+            clearTimeout(temporizador);
+            temporizador = setTimeout(() => buscar(input.value.trim()), 250);
+        });
+        input.addEventListener('focus', function() {
+            if (!select.value) {
+                buscar(input.value.trim());
+            }
+        });
+        input.addEventListener('blur', fecharLista);
+    });
 }
\ No newline at end of file